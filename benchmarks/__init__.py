@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# Benchmarks run against a scratch database of their own, never the real one.
+# This has to happen before anything imports the models.
+def setup_django():
+	if 'SUPERLISTS_DB_NAME' not in os.environ:
+		scratch = tempfile.mkdtemp(prefix='superlists-bench-')
+		os.environ['SUPERLISTS_DB_NAME'] = os.path.join(scratch, 'db.sqlite3')
+	os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'superlists.settings')
+
+	from django.conf import settings
+	from django.core.management import call_command
+	# measure what production would do, and don't pile up connection.queries
+	settings.DEBUG = False
+	settings.TEMPLATE_DEBUG = False
+	settings.ALLOWED_HOSTS = ['*']
+	for alias in settings.DATABASES: # the default database and any list shards
+		call_command('syncdb', database=alias, interactive=False, verbosity=0)
\ No newline at end of file
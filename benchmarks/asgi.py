@@ -0,0 +1,91 @@
+# The ASGI entry point against a thread-per-connection WSGI server, with the
+# same number of worker threads, when clients are slow:
+#
+#   python -m benchmarks.asgi --clients 500 --threads 8 --client-delay 0.2
+#
+# Each client takes --client-delay seconds to send its request and as long
+# again to read the response, and asks for a list page. The WSGI side models
+# a synchronous server, where a worker thread is stuck with a connection for
+# all of that; the ASGI side waits on clients from the event loop and only
+# takes a thread to run Django.
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.endpoints import percentile
+
+def run_wsgi(args, path):
+	from superlists.wsgi import application
+
+	# every client connects at once, so latency includes waiting for a thread
+	connected = time.perf_counter()
+
+	def handle(_):
+		time.sleep(args.client_delay) # reading the request off the socket
+		environ = {'PATH_INFO': path}
+		setup_testing_defaults(environ)
+		result = application(environ, lambda status, headers, exc_info=None: None)
+		b''.join(result)
+		result.close()
+		time.sleep(args.client_delay) # writing the response back out
+		return time.perf_counter() - connected
+
+	with ThreadPoolExecutor(args.threads) as pool:
+		return list(pool.map(handle, range(args.clients)))
+
+def run_asgi(args, path):
+	from superlists import asgi
+	asgi.executor = ThreadPoolExecutor(args.threads)
+
+	connected = time.perf_counter()
+
+	@asyncio.coroutine
+	def handle():
+		@asyncio.coroutine
+		def receive():
+			yield from asyncio.sleep(args.client_delay)
+			return {'type': 'http.request', 'body': b''}
+		@asyncio.coroutine
+		def send(message):
+			if message['type'] == 'http.response.body' and not message.get('more_body'):
+				yield from asyncio.sleep(args.client_delay)
+		scope = {
+			'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+			'headers': [(b'host', b'localhost')], 'server': ('localhost', 80),
+		}
+		yield from asgi.application(scope, receive, send)
+		return time.perf_counter() - connected
+
+	loop = asyncio.get_event_loop()
+	return loop.run_until_complete(asyncio.gather(*[handle() for _ in range(args.clients)]))
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--clients', type=int, default=500, help='concurrent slow clients')
+	parser.add_argument('--threads', type=int, default=8, help='worker threads for both servers')
+	parser.add_argument('--client-delay', type=float, default=0.2,
+		help='seconds a client takes to send its request, and again to read the response')
+	parser.add_argument('--items', type=int, default=50)
+	args = parser.parse_args()
+
+	from benchmarks import setup_django
+	setup_django()
+	from lists.models import List
+	list_ = List.objects.create()
+	list_.add_items(['item %d' % (i,) for i in range(args.items)])
+	path = list_.get_absolute_url()
+
+	print('%-6s %10s %10s %10s' % ('server', 'req/sec', 'p50 ms', 'p99 ms'))
+	for name, run in (('wsgi', run_wsgi), ('asgi', run_asgi)):
+		started = time.perf_counter()
+		latencies = sorted(seconds * 1000 for seconds in run(args, path))
+		elapsed = time.perf_counter() - started
+		print('%-6s %10.1f %10.1f %10.1f' % (
+			name, len(latencies) / elapsed,
+			percentile(latencies, 0.5), percentile(latencies, 0.99),
+		))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
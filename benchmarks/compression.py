@@ -0,0 +1,72 @@
+# Bytes on the wire and CPU per response for a list page and the streamed
+# JSON export, sent as they were before (no minifying, no compression), with
+# the HTML minified, and then gzipped and brotlied on top:
+#
+#   python -m benchmarks.compression --sizes 10 100 1000 --requests 50
+import argparse
+import time
+
+def seed(sizes):
+	from lists.models import List
+	lists = []
+	for size in sizes:
+		list_ = List.objects.create()
+		list_.add_items(['item number %d, with a bit of text' % (i,) for i in range(size)])
+		lists.append(list_)
+	return lists
+
+def measure(client, path, accept_encoding, requests):
+	from lists.cache import fragments
+
+	sizes = []
+	started = time.process_time()
+	for _ in range(requests):
+		fragments.clear() # time rendering the page, not fetching it from cache
+		response = client.get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+		if getattr(response, 'streaming', False):
+			sizes.append(sum(len(chunk) for chunk in response.streaming_content))
+		else:
+			sizes.append(len(response.content))
+	cpu = (time.process_time() - started) / requests
+	return sizes[-1], cpu
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+	parser.add_argument('--requests', type=int, default=50, help='requests per measurement')
+	args = parser.parse_args()
+
+	from benchmarks import setup_django
+	setup_django()
+	from django.conf import settings
+	from django.test import Client
+	from superlists import compression
+
+	modes = [
+		('plain', False, ''),
+		('minified', True, ''),
+		('gzip', True, 'gzip'),
+	]
+	if compression.brotli is not None:
+		modes.append(('br', True, 'br'))
+	else:
+		print('(brotli is not installed, so only gzip is measured)')
+
+	client = Client()
+	print('%-28s %-10s %12s %8s %10s' % ('response', 'mode', 'bytes', 'ratio', 'cpu ms'))
+	for list_ in seed(args.sizes):
+		pages = [
+			('list page, %d items' % (list_.item_count,), list_.get_absolute_url()),
+			('JSON stream, %d items' % (list_.item_count,), '/api/lists/%d/items/stream' % (list_.id,)),
+		]
+		for name, path in pages:
+			baseline = None
+			for mode, minify, accept_encoding in modes:
+				settings.HTML_MINIFY = minify
+				size, cpu = measure(client, path, accept_encoding, args.requests)
+				baseline = baseline or size
+				print('%-28s %-10s %12d %7.1f%% %10.3f' % (
+					name, mode, size, 100.0 * size / baseline, cpu * 1000))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
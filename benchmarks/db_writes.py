@@ -0,0 +1,101 @@
+# Item write throughput for each database profile, under concurrent writers
+# and readers:
+#
+#   python -m benchmarks.db_writes
+#   python -m benchmarks.db_writes --profiles sqlite sqlite-wal --threads 16
+#   python -m benchmarks.db_writes --profiles sqlite-wal --shards 1 2 4
+#
+# Every profile (and shard count) runs in a subprocess of its own, on a fresh
+# scratch database.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+def run_profile(args):
+	from benchmarks import setup_django
+	setup_django()
+	from django.db import connections, OperationalError
+	from lists import shards
+	from lists.models import Item
+
+	results = {'writes': 0, 'reads': 0, 'locked': 0}
+	lock = threading.Lock()
+	deadline = time.time() + args.seconds
+
+	def count(key):
+		with lock:
+			results[key] += 1
+
+	def close_connections():
+		for conn in connections.all():
+			conn.close()
+
+	def writer(n):
+		list_ = shards.create_list()
+		i = 0
+		while time.time() < deadline:
+			try:
+				Item.objects.create(list=list_, text='writer %d item %d' % (n, i))
+				count('writes')
+			except OperationalError:
+				count('locked')
+			i += 1
+		close_connections()
+
+	def reader():
+		while time.time() < deadline:
+			try:
+				for db in shards.databases():
+					list(Item.objects.using(db).order_by('-id')[:20])
+				count('reads')
+			except OperationalError:
+				count('locked')
+		close_connections()
+
+	threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.threads)]
+	threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+	started = time.time()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.time() - started
+
+	results['writes_per_sec'] = results['writes'] / elapsed
+	results['reads_per_sec'] = results['reads'] / elapsed
+	print(json.dumps(results))
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--profiles', nargs='+', default=['sqlite', 'sqlite-wal'])
+	parser.add_argument('--threads', type=int, default=8, help='concurrent writers')
+	parser.add_argument('--readers', type=int, default=4, help='concurrent readers')
+	parser.add_argument('--seconds', type=float, default=5)
+	parser.add_argument('--shards', type=int, nargs='+', default=[0],
+		help='shard counts to try; 0 for no sharding')
+	parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run:
+		return run_profile(args)
+
+	print('%-12s %6s %12s %12s %8s' % ('profile', 'shards', 'writes/sec', 'reads/sec', 'locked'))
+	for profile in args.profiles:
+		for shard_count in args.shards:
+			env = dict(os.environ, SUPERLISTS_DB_PROFILE=profile, SUPERLISTS_LIST_SHARDS=str(shard_count))
+			env.pop('SUPERLISTS_DB_NAME', None)
+			output = subprocess.check_output(
+				[sys.executable, '-m', 'benchmarks.db_writes', '--run'] + sys.argv[1:],
+				env=env
+			)
+			result = json.loads(output.decode().splitlines()[-1])
+			print('%-12s %6d %12.1f %12.1f %8d' % (
+				profile, shard_count, result['writes_per_sec'], result['reads_per_sec'], result['locked']
+			))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,305 @@
+# Load test for the lists endpoints. Seeds lists of the given sizes, then
+# drives a mixed read/write workload from several threads (and optionally
+# processes) and reports latency percentiles, requests/sec and SQL queries per
+# endpoint:
+#
+#   python -m benchmarks.endpoints --sizes 10 1000 10000 --output bench.json
+#   python -m benchmarks.endpoints --url http://localhost:8000 --threads 16
+#
+# By default requests go straight through superlists.wsgi.application, in
+# process, against a scratch database; --url points it at a running server
+# instead, and query counts then come from its Server-Timing headers. Diff the
+# JSON output of two commits to spot regressions.
+import argparse
+from collections import defaultdict
+import http.client
+from io import BytesIO
+import json
+import multiprocessing
+import random
+import re
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+CSRF_TOKEN = re.compile(r"name='csrfmiddlewaretoken' value='([^']+)'")
+TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Response:
+	def __init__(self, status, headers, body):
+		self.status = status
+		self.headers = headers
+		self.body = body
+
+	@property
+	def location(self):
+		return urlsplit(self.headers.get('location', '')).path
+
+
+# Shared by both clients: keeps the CSRF cookie and token a browser would
+class BaseClient:
+	def __init__(self):
+		self.cookies = {}
+		self.csrf_token = None
+
+	def get(self, path):
+		return self.request('GET', path)
+
+	def post(self, path, data):
+		if self.csrf_token is None:
+			self.csrf_token = CSRF_TOKEN.search(self.get('/').body.decode()).group(1)
+		data = dict(data, csrfmiddlewaretoken=self.csrf_token)
+		return self.request('POST', path, urlencode(data).encode())
+
+	def request(self, method, path, body=b''):
+		headers = {}
+		if self.cookies:
+			headers['Cookie'] = '; '.join('%s=%s' % item for item in self.cookies.items())
+		if method == 'POST':
+			headers['Content-Type'] = 'application/x-www-form-urlencoded'
+		response = self.send(method, path, body, headers)
+		for header in response.headers.get('set-cookie', '').split('\n'):
+			name, _, value = header.partition(';')[0].partition('=')
+			if value:
+				self.cookies[name.strip()] = value
+		return response
+
+
+class WSGIClient(BaseClient):
+	def __init__(self, application):
+		super().__init__()
+		self.application = application
+		self.queries = 0
+
+	def send(self, method, path, body, headers):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		path, _, query = path.partition('?')
+		environ = {
+			'REQUEST_METHOD': method,
+			'PATH_INFO': path,
+			'QUERY_STRING': query,
+			'CONTENT_LENGTH': str(len(body)),
+			'wsgi.input': BytesIO(body),
+		}
+		for name, value in headers.items():
+			if name == 'Content-Type':
+				environ['CONTENT_TYPE'] = value
+			else:
+				environ['HTTP_' + name.upper().replace('-', '_')] = value
+		setup_testing_defaults(environ)
+
+		started = []
+		def start_response(status, response_headers, exc_info=None):
+			started.append((status, response_headers))
+
+		with CaptureQueriesContext(connection) as queries:
+			result = self.application(environ, start_response)
+			try:
+				content = b''.join(result)
+			finally:
+				if hasattr(result, 'close'):
+					result.close()
+		self.queries = len(queries)
+
+		status, response_headers = started[0]
+		headers = defaultdict(str)
+		for name, value in response_headers:
+			name = name.lower()
+			headers[name] = value if not headers[name] else headers[name] + '\n' + value
+		return Response(int(status.split()[0]), headers, content)
+
+
+class HTTPClient(BaseClient):
+	def __init__(self, url):
+		super().__init__()
+		self.netloc = urlsplit(url).netloc
+		self.connection = http.client.HTTPConnection(self.netloc)
+		self.queries = None
+
+	def send(self, method, path, body, headers):
+		try:
+			self.connection.request(method, path, body, headers)
+			response = self.connection.getresponse()
+		except (http.client.HTTPException, OSError):
+			# the server dropped the keep-alive connection - retry once
+			self.connection = http.client.HTTPConnection(self.netloc)
+			self.connection.request(method, path, body, headers)
+			response = self.connection.getresponse()
+		content = response.read()
+		headers = defaultdict(str)
+		for name, value in response.getheaders():
+			name = name.lower()
+			headers[name] = value if not headers[name] else headers[name] + '\n' + value
+		# only sampled requests report their queries in Server-Timing
+		match = TIMING_QUERIES.search(headers['server-timing'])
+		self.queries = int(match.group(1)) if match else None
+		return Response(response.status, headers, content)
+
+
+def make_client(args):
+	if args.url:
+		return HTTPClient(args.url)
+	from superlists.wsgi import application
+	return WSGIClient(application)
+
+def seed(client, sizes):
+	list_urls = []
+	for size in sizes:
+		response = client.post('/lists/new', {'text': 'item 0'})
+		list_url = response.location
+		texts = ['item %d' % (i,) for i in range(1, size)]
+		for start in range(0, len(texts), 5000):
+			client.post(list_url + 'items/bulk', {'items': '\n'.join(texts[start:start + 5000])})
+		list_urls.append(list_url)
+	return list_urls
+
+# One worker's share of the workload: returns {endpoint: [(seconds, queries)]}
+def run_worker(args, list_urls, worker):
+	rng = random.Random(args.seed + worker)
+	client = make_client(args)
+	samples = defaultdict(list)
+	for i in range(args.requests):
+		roll = rng.random()
+		if roll < args.write_ratio / 2:
+			endpoint, call = 'new_list', lambda: client.post(
+				'/lists/new', {'text': 'new list %d-%d' % (worker, i)})
+		elif roll < args.write_ratio:
+			list_url = rng.choice(list_urls)
+			endpoint, call = 'add_item', lambda: client.post(
+				list_url, {'text': 'added %d-%d' % (worker, i)})
+		elif roll < args.write_ratio + (1 - args.write_ratio) * args.home_ratio:
+			endpoint, call = 'home_page', lambda: client.get('/')
+		else:
+			list_url = rng.choice(list_urls)
+			endpoint, call = 'view_list', lambda: client.get(list_url)
+
+		started = time.perf_counter()
+		response = call()
+		elapsed = time.perf_counter() - started
+		if response.status >= 400:
+			endpoint += ' (error %d)' % (response.status,)
+		samples[endpoint].append((elapsed, client.queries))
+
+	if not args.url:
+		from django.db import connection
+		connection.close()
+	return samples
+
+def run_threads(args, list_urls, process=0):
+	samples = defaultdict(list)
+	lock = threading.Lock()
+
+	def work(worker):
+		result = run_worker(args, list_urls, worker)
+		with lock:
+			for endpoint, values in result.items():
+				samples[endpoint].extend(values)
+
+	threads = [
+		threading.Thread(target=work, args=(process * args.threads + n,))
+		for n in range(args.threads)
+	]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return dict(samples)
+
+def _run_process(job):
+	return run_threads(*job)
+
+def percentile(sorted_values, fraction):
+	index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+	return sorted_values[index]
+
+def summarise(samples, elapsed):
+	report = {}
+	for endpoint, values in sorted(samples.items()):
+		latencies = sorted(seconds * 1000 for seconds, _ in values)
+		queries = [count for _, count in values if count is not None]
+		report[endpoint] = {
+			'requests': len(values),
+			'requests_per_sec': len(values) / elapsed,
+			'p50_ms': percentile(latencies, 0.50),
+			'p95_ms': percentile(latencies, 0.95),
+			'p99_ms': percentile(latencies, 0.99),
+			'queries_per_request': sum(queries) / len(queries) if queries else None,
+		}
+	return report
+
+def git_commit():
+	try:
+		return subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+		).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--url', help='benchmark a running server instead of in process')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000],
+		help='number of items on each seeded list')
+	parser.add_argument('--threads', type=int, default=4, help='threads per process')
+	parser.add_argument('--processes', type=int, default=1)
+	parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+	parser.add_argument('--write-ratio', type=float, default=0.1)
+	parser.add_argument('--home-ratio', type=float, default=0.2,
+		help='share of the reads that go to the home page')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', help='write the results to this JSON file')
+	args = parser.parse_args()
+
+	if not args.url:
+		from benchmarks import setup_django
+		setup_django()
+
+	list_urls = seed(make_client(args), args.sizes)
+	if not args.url:
+		# forked workers must not share the parent's connection
+		from django.db import connection
+		connection.close()
+
+	started = time.perf_counter()
+	if args.processes > 1:
+		with multiprocessing.Pool(args.processes) as pool:
+			results = pool.map(_run_process, [
+				(args, list_urls, process) for process in range(args.processes)
+			])
+	else:
+		results = [run_threads(args, list_urls)]
+	elapsed = time.perf_counter() - started
+
+	samples = defaultdict(list)
+	for result in results:
+		for endpoint, values in result.items():
+			samples[endpoint].extend(values)
+	report = summarise(samples, elapsed)
+
+	print('%-24s %8s %10s %9s %9s %9s %8s' % (
+		'endpoint', 'requests', 'req/sec', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+	for endpoint, row in report.items():
+		queries = row['queries_per_request']
+		print('%-24s %8d %10.1f %9.2f %9.2f %9.2f %8s' % (
+			endpoint, row['requests'], row['requests_per_sec'],
+			row['p50_ms'], row['p95_ms'], row['p99_ms'],
+			'-' if queries is None else '%.1f' % (queries,),
+		))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'commit': git_commit(),
+				'timestamp': time.time(),
+				'config': vars(args),
+				'elapsed_sec': elapsed,
+				'endpoints': report,
+			}, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,92 @@
+# Search through the inverted index against the LIKE scan it replaces:
+#
+#   python -m benchmarks.search --items 1000000
+#
+# Seeds a scratch database with items made of random words, times building
+# the index with the rebuild_search_index command, then times the same
+# queries both ways.
+import argparse
+import random
+import time
+
+WORDS = [
+	'buy', 'milk', 'make', 'tea', 'call', 'mum', 'fix', 'bike', 'book', 'flights',
+	'water', 'plants', 'pay', 'rent', 'walk', 'dog', 'clean', 'kitchen', 'peacock',
+	'feathers', 'write', 'letter', 'bake', 'bread', 'read', 'paper', 'order',
+	'pizza', 'renew', 'passport',
+]
+# one item in RARE_EVERY gets one of these, which is where a LIKE scan hurts
+RARE_WORDS = ['zebra', 'zeppelin', 'zucchini']
+RARE_EVERY = 10000
+ITEMS_PER_LIST = 1000
+
+def item_text(i, rng):
+	words = [rng.choice(WORDS) for _ in range(3)]
+	if rng.randrange(RARE_EVERY) == 0:
+		words[rng.randrange(3)] = rng.choice(RARE_WORDS)
+	return '%s #%d' % (' '.join(words), i)
+
+def seed(count, rng):
+	from django.conf import settings
+	from django.db import transaction
+	from lists.models import hash_text, Item, List, POSITION_GAP
+
+	lists = -(-count // ITEMS_PER_LIST)
+	List.objects.bulk_create([List() for _ in range(lists)], batch_size=settings.BULK_BATCH_SIZE)
+	list_ids = list(List.objects.values_list('id', flat=True))
+	for start in range(0, count, 10000):
+		with transaction.atomic():
+			texts = [item_text(i, rng) for i in range(start, min(start + 10000, count))]
+			Item.objects.bulk_create([
+				Item(list_id=list_ids[i // ITEMS_PER_LIST], text=text, text_hash=hash_text(text),
+					position=(i % ITEMS_PER_LIST + 1) * POSITION_GAP)
+				for i, text in enumerate(texts, start)
+			], batch_size=settings.BULK_BATCH_SIZE)
+	return list_ids
+
+def timed(function, repeat):
+	started = time.perf_counter()
+	for _ in range(repeat):
+		function()
+	return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--items', type=int, default=1000000)
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	from benchmarks import setup_django
+	setup_django()
+	from django.core.management import call_command
+	from lists.models import Item, ItemTerm, List
+
+	rng = random.Random(args.seed)
+	started = time.perf_counter()
+	list_ids = seed(args.items, rng)
+	print('Seeded %d items in %.1fs' % (args.items, time.perf_counter() - started))
+
+	started = time.perf_counter()
+	call_command('rebuild_search_index')
+	print('Built the index in %.1fs' % (time.perf_counter() - started,))
+
+	list_ = List.objects.get(id=list_ids[len(list_ids) // 2])
+	# newest first, like the ranked search, so the scan can't stop early
+	def like(text, items=Item.objects, page=1):
+		matches = items.filter(text__icontains=text).order_by('-id')
+		return lambda: list(matches[(page - 1) * 20:page * 20])
+
+	queries = [
+		('common word', like('peacock'), lambda: ItemTerm.search('peacock')),
+		('rare word', like('zebra'), lambda: ItemTerm.search('zebra')),
+		('rare prefix', like('zep'), lambda: ItemTerm.search('zep*')),
+		('one list', like('peacock', list_.item_set), lambda: ItemTerm.search('peacock', list_=list_)),
+		('page 10', like('peacock', page=10), lambda: ItemTerm.search('peacock', page=10)),
+	]
+	print('%-14s %12s %12s' % ('query', 'LIKE ms', 'index ms'))
+	for name, like, index in queries:
+		print('%-14s %12.2f %12.2f' % (name, timed(like, args.repeat), timed(index, args.repeat)))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+# Cold start of a worker under each settings module, with and without
+# preloading: how long importing the WSGI app takes, how long its first
+# request takes after that, how many modules it has loaded and the most
+# memory the process has held. Every run is a fresh interpreter:
+#
+#   python -m benchmarks.startup --runs 5
+#   python -m benchmarks.startup --settings superlists.settings_production --path /lists/
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in the child: times the import and a first GET of the page, in process
+PROBE = '''
+import json, resource, sys, time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+started = time.perf_counter()
+from superlists.wsgi import application
+imported = time.perf_counter()
+environ = {'PATH_INFO': sys.argv[1], 'wsgi.input': BytesIO()}
+setup_testing_defaults(environ)
+status = []
+b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+served = time.perf_counter()
+print(json.dumps({
+	'status': status[0],
+	'import_ms': (imported - started) * 1000,
+	'first_request_ms': (served - imported) * 1000,
+	'modules': len(sys.modules),
+	'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+def cold_start(settings_module, preload, path):
+	env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, SUPERLISTS_PRELOAD='1' if preload else '0')
+	output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', PROBE, path], env=env)
+	return json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--settings', nargs='+',
+		default=['superlists.settings', 'superlists.settings_production'])
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--path', default='/')
+	args = parser.parse_args()
+
+	# a scratch database, as the other benchmarks use; syncdb'd by a first
+	# process so the children find their tables
+	if 'SUPERLISTS_DB_NAME' not in os.environ:
+		scratch = tempfile.mkdtemp(prefix='superlists-bench-')
+		os.environ['SUPERLISTS_DB_NAME'] = os.path.join(scratch, 'db.sqlite3')
+	subprocess.check_call([sys.executable, '-W', 'ignore', '-c',
+		'from benchmarks import setup_django; setup_django()'])
+	# without debug the pipeline wants collectstatic's manifest, which a
+	# checkout doesn't have
+	os.environ.setdefault('SUPERLISTS_STATIC_PIPELINE', '0')
+
+	print('%-32s %-8s %10s %14s %8s %10s' % (
+		'settings', 'preload', 'import ms', 'first req ms', 'modules', 'max RSS KB'))
+	for settings_module in args.settings:
+		for preload in (False, True):
+			runs = [cold_start(settings_module, preload, args.path) for _ in range(args.runs)]
+			if runs[0]['status'][:3] != '200':
+				print('%s: GET %s gave %s' % (settings_module, args.path, runs[0]['status']))
+			print('%-32s %-8s %10.1f %14.1f %8d %10d' % (
+				settings_module, 'on' if preload else 'off',
+				statistics.median(run['import_ms'] for run in runs),
+				statistics.median(run['first_request_ms'] for run in runs),
+				runs[0]['modules'],
+				statistics.median(run['max_rss_kb'] for run in runs),
+			))
+
+if __name__ == '__main__':
+	main()
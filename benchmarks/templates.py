@@ -0,0 +1,62 @@
+# Per-request template rendering cost, with templates found and compiled on
+# every render (the development setup) and with the cached loader:
+#
+#   python -m benchmarks.templates --items 100 --renders 500
+import argparse
+import time
+
+def render_page(request, list_, items):
+	from django.template import RequestContext
+	from django.template.loader import render_to_string
+	from lists.forms import ExistingListItemForm
+
+	table = render_to_string('list_table.html', {'items': items, 'start': 0})
+	render_to_string('list.html', RequestContext(request, {
+		'list': list_,
+		'form': ExistingListItemForm(for_list=list_),
+		'table': table,
+	}))
+
+def time_renders(loaders, renders, request, list_, items):
+	from django.conf import settings
+	from django.template import loader
+	settings.TEMPLATE_LOADERS = loaders
+	loader.template_source_loaders = None # picks the new loaders up
+
+	# the first render is what a worker pays once, at boot
+	started = time.perf_counter()
+	render_page(request, list_, items)
+	first = time.perf_counter() - started
+
+	started = time.perf_counter()
+	for _ in range(renders):
+		render_page(request, list_, items)
+	return first, (time.perf_counter() - started) / renders
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--items', type=int, default=100)
+	parser.add_argument('--renders', type=int, default=500)
+	args = parser.parse_args()
+
+	from benchmarks import setup_django
+	setup_django()
+	from django.conf import settings
+	from django.test.client import RequestFactory
+	from lists.models import Item, List
+
+	request = RequestFactory().get('/lists/1/')
+	list_ = List(id=1)
+	items = [Item(id=i, list=list_, text='item %d' % (i,)) for i in range(args.items)]
+
+	modes = [
+		('uncached', settings.SOURCE_TEMPLATE_LOADERS),
+		('cached', (('django.template.loaders.cached.Loader', settings.SOURCE_TEMPLATE_LOADERS),)),
+	]
+	print('%-10s %14s %14s' % ('loaders', 'first ms', 'per render ms'))
+	for name, loaders in modes:
+		first, per_render = time_renders(loaders, args.renders, request, list_, items)
+		print('%-10s %14.3f %14.3f' % (name, first * 1000, per_render * 1000))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
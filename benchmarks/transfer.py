@@ -0,0 +1,47 @@
+# Export and import throughput, in rows a second:
+#
+#   python -m benchmarks.transfer --items 1000000
+#
+# Seeds a scratch database, exports it in each format with export_lists and
+# imports each export back in with import_lists.
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.search import seed
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--items', type=int, default=1000000)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	from benchmarks import setup_django
+	setup_django()
+	from django.core.management import call_command
+	from lists.models import Item, List
+
+	started = time.perf_counter()
+	seed(args.items, random.Random(args.seed))
+	rows = List.objects.count() + Item.objects.count()
+	print('Seeded %d items in %.1fs' % (args.items, time.perf_counter() - started))
+
+	scratch = tempfile.mkdtemp(prefix='superlists-transfer-')
+	print('%-8s %10s %14s %14s' % ('format', 'MB', 'export rows/s', 'import rows/s'))
+	for format in ('ndjson', 'csv'):
+		path = os.path.join(scratch, 'lists.%s' % (format,))
+		started = time.perf_counter()
+		call_command('export_lists', output=path)
+		exported = time.perf_counter() - started
+
+		started = time.perf_counter()
+		call_command('import_lists', path, stdout=open(os.devnull, 'w'))
+		imported = time.perf_counter() - started
+
+		print('%-8s %10.1f %14.0f %14.0f' % (
+			format, os.path.getsize(path) / 1e6, rows / exported, rows / imported))
+
+if __name__ == '__main__':
+	main()
@@ -1,31 +1,66 @@
 from django.test import LiveServerTestCase
-from selenium import webdriver
+from lists.cache import fragments
+from .drivers import driver_name, start_driver
+import atexit
 import sys
 
+# One browser per test process, shared by every FT in it and reset between
+# them, rather than starting one for each test. Which kind comes from
+# FT_DRIVER - see drivers.py
+_browsers = {}
+
+def get_browser(name, server_url):
+	if name not in _browsers:
+		_browsers[name] = start_driver(name, server_url)
+		atexit.register(_browsers[name].quit)
+	return _browsers[name]
+
 class FunctionalTest(LiveServerTestCase):
 
 	# Hack the inbuilt stuff to allow us to point the FT suite at a different server
 	# python3 manage.py test functional_tests --liveserver=superlists-staging.ottg.eu
 	@classmethod
 	def setUpClass(cls):
+		cls.started_live_server = False
 		for arg in sys.argv:
 			if 'liveserver' in arg:
 				cls.server_url = 'http://' + arg.split('=')[1]
+				cls.driver = driver_name(remote=True)
 				return
+		cls.driver = driver_name()
+		if cls.driver == 'client':
+			# requests go straight into Django, so there's no server to start
+			super(LiveServerTestCase, cls).setUpClass()
+			cls.server_url = 'http://testserver'
+			return
 		LiveServerTestCase.setUpClass()
+		cls.started_live_server = True
 		cls.server_url = cls.live_server_url
 
 	@classmethod
 	def tearDownClass(cls):
-		if cls.server_url == cls.live_server_url:
+		if cls.started_live_server:
 			LiveServerTestCase.tearDownClass()
+		elif cls.driver == 'client':
+			super(LiveServerTestCase, cls).tearDownClass()
 
 	def setUp(self):
-		self.browser = webdriver.Firefox()
-		self.browser.implicitly_wait(3)
+		# the database is emptied between FTs, so list ids come round again
+		fragments.clear()
+		self.browser = get_browser(self.driver, self.server_url)
 
 	def tearDown(self):
-		self.browser.quit()
+		self.reset_browser()
+
+	# Back to a blank page with no cookies, as good as a new browser for our
+	# purposes
+	def reset_browser(self):
+		self.browser.delete_all_cookies()
+		self.browser.get('about:blank')
+
+	def skip_unless_layout(self):
+		if not getattr(self.browser, 'renders_layout', True):
+			self.skipTest('needs a real browser for layout - run with FT_DRIVER=selenium')
 
 	# Helper Methods
 	def check_for_row_in_list_table(self, row_text):
@@ -34,4 +69,4 @@ class FunctionalTest(LiveServerTestCase):
 		self.assertIn(row_text, [row.text for row in rows])
 
 	def get_item_input_box(self):
-		return self.browser.find_element_by_id('id_text')
+		return self.browser.find_element_by_id('id_text')
\ No newline at end of file
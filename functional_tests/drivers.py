@@ -0,0 +1,330 @@
+# Browsers for the functional tests, picked with FT_DRIVER:
+#
+#   client   - (the default) parses the HTML of pages fetched through the
+#              Django test client, in process - no server, no browser
+#   http     - the same, over real HTTP with urllib. Used automatically when
+#              the FTs are pointed at another server with --liveserver
+#   selenium - a real (headless) Firefox, for anything that needs CSS or
+#              JavaScript to have run
+#
+# The HTML drivers only do what our FTs need of a browser: fetching pages,
+# finding elements by id, tag or simple CSS selectors, reading their text and
+# attributes, and typing into inputs - where Enter submits the form.
+from html.parser import HTMLParser
+from http.cookiejar import CookieJar
+import os
+import re
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin, urlsplit
+from urllib.request import build_opener, HTTPCookieProcessor
+
+try:
+	from selenium.webdriver.common.keys import Keys
+except ImportError:
+	class Keys:
+		RETURN = '\ue006'
+		ENTER = '\ue007'
+
+BLANK_PAGE = 'about:blank'
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+# Tags whose text starts on a line of its own
+BLOCK_TAGS = {
+	'body', 'br', 'div', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'ol',
+	'p', 'table', 'td', 'th', 'tr', 'ul',
+}
+HIDDEN_TAGS = {'head', 'script', 'style', 'template'}
+# Tags a browser closes for you when the next one opens, and the tags that
+# stop it looking any further out: <tr><td>a<tr><td>b is two rows
+IMPLIED_END_TAGS = {
+	'tr': ({'tr', 'td', 'th'}, {'table', 'tbody', 'thead', 'tfoot'}),
+	'td': ({'td', 'th'}, {'tr', 'table'}),
+	'th': ({'td', 'th'}, {'tr', 'table'}),
+	'li': ({'li'}, {'ul', 'ol'}),
+	'option': ({'option'}, {'select', 'datalist'}),
+	'p': ({'p'}, {'div', 'body'}),
+}
+SUBMIT_KEYS = re.compile('[\n\r%s%s]' % (Keys.ENTER, Keys.RETURN))
+# tag, then any number of .class and #id parts
+SIMPLE_SELECTOR = re.compile(r'^([a-zA-Z0-9]*)((?:[.#][-\w]+)*)$')
+
+
+class NoSuchElementException(Exception):
+	pass
+
+
+class Element:
+	def __init__(self, driver, tag, attrs, parent=None):
+		self.driver = driver
+		self.tag_name = tag
+		self.attrs = dict((name, value if value is not None else '') for name, value in attrs)
+		self.parent = parent
+		self.children = []
+
+	def get_attribute(self, name):
+		return self.attrs.get(name)
+
+	@property
+	def text(self):
+		if self.tag_name in HIDDEN_TAGS:
+			return ''
+		lines = ' '.join(self._text_parts()).split('\n')
+		return '\n'.join(filter(None, (' '.join(line.split()) for line in lines)))
+
+	def _text_parts(self):
+		block = self.tag_name in BLOCK_TAGS
+		if block:
+			yield '\n'
+		for child in self.children:
+			if isinstance(child, str):
+				yield child
+			elif child.tag_name not in HIDDEN_TAGS:
+				yield from child._text_parts()
+		if block:
+			yield '\n'
+
+	def iter(self):
+		for child in self.children:
+			if isinstance(child, Element):
+				yield child
+				yield from child.iter()
+
+	def find_elements_by_css_selector(self, selector):
+		match = SIMPLE_SELECTOR.match(selector.strip())
+		if not match:
+			raise NotImplementedError('Selector too fancy for the HTML driver: %s' % (selector,))
+		tag, parts = match.group(1), re.findall(r'([.#])([-\w]+)', match.group(2))
+		return [
+			element for element in self.iter()
+			if (not tag or element.tag_name == tag) and all(
+				value in element.attrs.get('class', '').split() if kind == '.'
+				else element.attrs.get('id') == value
+				for kind, value in parts
+			)
+		]
+
+	def find_element_by_css_selector(self, selector):
+		elements = self.find_elements_by_css_selector(selector)
+		if not elements:
+			raise NoSuchElementException('No element matches %s' % (selector,))
+		return elements[0]
+
+	def find_elements_by_tag_name(self, tag):
+		return [element for element in self.iter() if element.tag_name == tag]
+
+	def find_element_by_tag_name(self, tag):
+		return self.find_element_by_css_selector(tag)
+
+	def find_element_by_id(self, id_):
+		return self.find_element_by_css_selector('#' + id_)
+
+	# Typing into an input: Enter submits its form, as a browser would
+	def send_keys(self, keys):
+		for index, chunk in enumerate(SUBMIT_KEYS.split(keys)):
+			if index:
+				self.submit()
+			self.attrs['value'] = self.attrs.get('value', '') + chunk
+
+	def clear(self):
+		self.attrs['value'] = ''
+
+	def submit(self):
+		form = self
+		while form is not None and form.tag_name != 'form':
+			form = form.parent
+		if form is None:
+			raise NoSuchElementException('%s is not in a form' % (self.tag_name,))
+		self.driver._submit(form)
+
+	def __repr__(self):
+		return '<%s %r>' % (self.tag_name, self.attrs)
+
+
+class _TreeBuilder(HTMLParser):
+	def __init__(self, driver):
+		super().__init__(convert_charrefs=True)
+		self.root = self.current = Element(driver, 'document', [])
+
+	def handle_starttag(self, tag, attrs):
+		if tag in IMPLIED_END_TAGS:
+			closes, scope = IMPLIED_END_TAGS[tag]
+			element = self.current
+			while element is not self.root and element.tag_name not in scope:
+				if element.tag_name in closes:
+					self.current = element.parent
+				element = element.parent
+		element = Element(self.root.driver, tag, attrs, parent=self.current)
+		self.current.children.append(element)
+		if tag not in VOID_TAGS:
+			self.current = element
+
+	def handle_startendtag(self, tag, attrs):
+		self.current.children.append(Element(self.root.driver, tag, attrs, parent=self.current))
+
+	def handle_endtag(self, tag):
+		# close back up to the matching tag, forgiving anything left open
+		element = self.current
+		while element is not self.root and element.tag_name != tag:
+			element = element.parent
+		if element is not self.root:
+			self.current = element.parent
+
+	def handle_data(self, data):
+		self.current.children.append(data)
+
+
+# The part of the Selenium WebDriver API our FTs use, over parsed HTML
+class HTMLDriver:
+	renders_layout = False
+
+	def __init__(self, transport):
+		self.transport = transport
+		self._load(BLANK_PAGE, '')
+
+	def get(self, url):
+		if url == BLANK_PAGE:
+			self._load(BLANK_PAGE, '')
+		else:
+			self._load(*self.transport.request('GET', urljoin(self.current_url, url)))
+
+	@property
+	def title(self):
+		titles = self.document.find_elements_by_tag_name('title')
+		return ' '.join(''.join(titles[0].children).split()) if titles else ''
+
+	@property
+	def page_source(self):
+		return self.source
+
+	def find_element_by_id(self, id_):
+		return self.document.find_element_by_id(id_)
+
+	def find_element_by_tag_name(self, tag):
+		return self.document.find_element_by_tag_name(tag)
+
+	def find_elements_by_tag_name(self, tag):
+		return self.document.find_elements_by_tag_name(tag)
+
+	def find_element_by_css_selector(self, selector):
+		return self.document.find_element_by_css_selector(selector)
+
+	def find_elements_by_css_selector(self, selector):
+		return self.document.find_elements_by_css_selector(selector)
+
+	def delete_all_cookies(self):
+		self.transport.clear_cookies()
+
+	def implicitly_wait(self, seconds):
+		pass # pages are complete as soon as they're loaded
+
+	def set_window_size(self, width, height):
+		pass
+
+	def quit(self):
+		pass
+
+	def _load(self, url, source):
+		self.current_url = url
+		self.source = source
+		builder = _TreeBuilder(self)
+		builder.feed(source)
+		builder.close()
+		self.document = builder.root
+
+	def _submit(self, form):
+		data = []
+		for element in form.iter():
+			name = element.attrs.get('name')
+			if not name or 'disabled' in element.attrs:
+				continue
+			if element.tag_name == 'textarea':
+				data.append((name, ''.join(child for child in element.children if isinstance(child, str))))
+			elif element.tag_name == 'input':
+				kind = element.attrs.get('type', 'text').lower()
+				if kind in ('submit', 'button', 'image', 'reset', 'file'):
+					continue
+				if kind in ('checkbox', 'radio') and 'checked' not in element.attrs:
+					continue
+				data.append((name, element.attrs.get('value', '')))
+
+		method = form.attrs.get('method', 'GET').upper()
+		url = urljoin(self.current_url, form.attrs.get('action') or self.current_url)
+		if method == 'POST':
+			self._load(*self.transport.request('POST', url, urlencode(data)))
+		else:
+			self._load(*self.transport.request('GET', url.split('?')[0] + '?' + urlencode(data)))
+
+
+# Requests go straight into Django through its test client, CSRF checks and
+# all. Returns the URL and the HTML of the page it ended up on
+class ClientTransport:
+	def __init__(self, server_url):
+		from django.test import Client
+		self.server_url = server_url
+		self.client = Client(enforce_csrf_checks=True)
+
+	def request(self, method, url, body=None):
+		parts = urlsplit(url)
+		path = parts.path + ('?' + parts.query if parts.query else '')
+		if method == 'POST':
+			response = self.client.post(
+				path, body, content_type='application/x-www-form-urlencoded', follow=True)
+		else:
+			response = self.client.get(path, follow=True)
+		if response.redirect_chain:
+			path = urlsplit(response.redirect_chain[-1][0]).path
+		return urljoin(self.server_url, path), response.content.decode(response._charset or 'utf-8')
+
+	def clear_cookies(self):
+		self.client.cookies.clear()
+
+
+class HTTPTransport:
+	def __init__(self, server_url):
+		self.cookies = CookieJar()
+		self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+	def request(self, method, url, body=None):
+		data = body.encode('utf-8') if body is not None else None
+		try:
+			response = self.opener.open(url, data)
+		except HTTPError as error:
+			response = error # error pages are still pages
+		with response:
+			charset = response.headers.get_content_charset() or 'utf-8'
+			return response.geturl(), response.read().decode(charset)
+
+	def clear_cookies(self):
+		self.cookies.clear()
+
+
+def selenium_driver(server_url):
+	from selenium import webdriver
+	if os.environ.get('FT_HEADLESS') != '0':
+		os.environ.setdefault('MOZ_HEADLESS', '1')
+	browser = webdriver.Firefox()
+	browser.implicitly_wait(3)
+	return browser
+
+def html_driver(server_url):
+	return HTMLDriver(ClientTransport(server_url))
+
+def http_driver(server_url):
+	return HTMLDriver(HTTPTransport(server_url))
+
+DRIVERS = {
+	'client': html_driver,
+	'http': http_driver,
+	'selenium': selenium_driver,
+}
+
+def driver_name(remote=False):
+	name = os.environ.get('FT_DRIVER', 'client')
+	if remote and name == 'client':
+		return 'http' # the test client can only reach this process
+	return name
+
+def start_driver(name, server_url):
+	try:
+		return DRIVERS[name](server_url)
+	except KeyError:
+		raise ValueError('Unknown FT_DRIVER %r, expected one of %s' % (name, ', '.join(sorted(DRIVERS))))
@@ -0,0 +1,59 @@
+from unittest import TestCase
+from .drivers import HTMLDriver, Keys, NoSuchElementException
+
+class FakeTransport:
+	def __init__(self, pages):
+		self.pages = pages
+		self.requests = []
+
+	def request(self, method, url, body=None):
+		self.requests.append((method, url, body))
+		return url, self.pages.get(url, '')
+
+	def clear_cookies(self):
+		pass
+
+PAGE = '''<html><head><title> A  page </title><script>var x = "<b>";</script></head>
+<body>
+	<h1>Header</h1>
+	<table id="id_table"><tr><td>1: one<tr><td>2: two &amp; more</table>
+	<div class="form-group has-error"><span>Bad   input</span></div>
+	<form method="POST" action="/submit">
+		<input id="id_text" name="text" placeholder="Type here">
+		<input type="hidden" name="token" value="abc">
+		<input type="submit" name="go" value="Go">
+	</form>
+</body></html>'''
+
+
+class HTMLDriverTest(TestCase):
+
+	def setUp(self):
+		self.transport = FakeTransport({'http://testserver/': PAGE})
+		self.driver = HTMLDriver(self.transport)
+		self.driver.get('http://testserver/')
+
+	def test_title_and_text(self):
+		self.assertEqual(self.driver.title, 'A page')
+		self.assertEqual(self.driver.find_element_by_css_selector('.has-error').text, 'Bad input')
+		self.assertNotIn('var x', self.driver.find_element_by_tag_name('html').text)
+
+	def test_rows_without_end_tags_are_closed_like_a_browser_would(self):
+		rows = self.driver.find_element_by_id('id_table').find_elements_by_tag_name('tr')
+		self.assertEqual([row.text for row in rows], ['1: one', '2: two & more'])
+
+	def test_missing_element_raises(self):
+		with self.assertRaises(NoSuchElementException):
+			self.driver.find_element_by_id('id_nothing')
+
+	def test_enter_submits_the_form(self):
+		inputbox = self.driver.find_element_by_id('id_text')
+		self.assertEqual(inputbox.get_attribute('placeholder'), 'Type here')
+		inputbox.send_keys('hello')
+		inputbox.send_keys(Keys.ENTER)
+
+		self.assertEqual(
+			self.transport.requests[-1],
+			('POST', 'http://testserver/submit', 'text=hello&token=abc')
+		)
+		self.assertEqual(self.driver.current_url, 'http://testserver/submit')
\ No newline at end of file
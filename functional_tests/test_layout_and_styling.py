@@ -2,6 +2,8 @@ from .base import FunctionalTest
 
 class LayoutAndStylingTest(FunctionalTest):	
 	def test_layout_and_styling(self):
+		self.skip_unless_layout()
+
 		# Edith goes to the homepage
 		self.browser.get(self.server_url)
 		self.browser.set_window_size(1024,768)
@@ -1,6 +1,5 @@
 from .base import FunctionalTest
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
+from .drivers import Keys
 
 class NewVisitorTest(FunctionalTest):
 	def test_can_start_a_list_and_retrieve_it_later(self):	
@@ -46,10 +45,9 @@ class NewVisitorTest(FunctionalTest):
 		self.check_for_row_in_list_table('1: Buy peacock feathers')
 
 		# now a new user, Francis, comes along to the site - 
-		## kill Edith's browser to make
-		## sure that none of her state, cookies etc. is involved
-		self.browser.quit()
-		self.browser = webdriver.Firefox()
+		## clear out Edith's cookies to make
+		## sure that none of her state is involved
+		self.reset_browser()
 
 		# Francis visits the home page. There is no sign of Edith's list
 		self.browser.get(self.server_url)
@@ -0,0 +1,212 @@
+from functools import wraps
+import json
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from lists import archive, shards, transfer
+from lists.models import format_cursor, items_after, parse_cursor, ItemTerm, List
+
+# Rows serialised per chunk of a streamed response
+STREAM_CHUNK_SIZE = 200
+
+
+def json_response(data, status=200):
+	return HttpResponse(json.dumps(data), status=status, content_type='application/json')
+
+def _error(message, status=400):
+	return json_response({'error': message}, status=status)
+
+def _added_report(items, rejected):
+	return {
+		'added': len(items),
+		'rejected': [
+			{'index': index, 'text': text, 'error': error}
+			for index, text, error in rejected
+		],
+	}
+
+# A batch of texts from a JSON body: {"items": [...]}, {"text": "..."} or just
+# a bare array. Returns None if the body isn't one of those
+def _texts_from_json(request):
+	try:
+		data = json.loads(request.body.decode('utf-8'))
+	except ValueError:
+		return None
+	if isinstance(data, dict):
+		if 'items' in data:
+			data = data['items']
+		elif 'text' in data:
+			data = [data['text']]
+	if not isinstance(data, list) or not all(isinstance(text, str) for text in data):
+		return None
+	return data
+
+def _is_json(request):
+	return request.META.get('CONTENT_TYPE', '').startswith('application/json')
+
+# For the views that take JSON without a CSRF token. Another site's form can
+# post a body that parses as JSON - enctype="text/plain" does it, with no
+# preflight - but it can't label it application/json without one, so POSTs
+# labelled as anything else are turned away
+def json_posts_only(view):
+	@wraps(view)
+	def wrapped(request, *args, **kwargs):
+		if request.method == 'POST' and not _is_json(request):
+			return _error('Expected Content-Type: application/json', status=415)
+		return view(request, *args, **kwargs)
+	return wrapped
+
+def _int_param(request, name, default):
+	try:
+		return max(int(request.GET.get(name, default)), 0)
+	except ValueError:
+		return default
+
+
+# Creates a list from a batch of items. Like the home page form, a list that
+# would have no items at all isn't created
+@csrf_exempt
+@require_POST
+@json_posts_only
+def create_list(request):
+	texts = _texts_from_json(request)
+	if texts is None:
+		return _error('Expected {"items": [...]} or {"text": "..."}')
+
+	list_id, db = shards.shard_map.allocate()
+	with transaction.atomic(using=db):
+		list_ = List.objects.using(db).create(id=list_id)
+		items, rejected = list_.add_items(texts)
+		if not items:
+			transaction.set_rollback(True)
+
+	report = _added_report(items, rejected)
+	if not items:
+		return json_response(report, status=400)
+	report.update(id=list_.id, url=list_.get_absolute_url())
+	return json_response(report, status=201)
+
+# GET pages through a list's items with the same keyset cursor as the list
+# page; POST appends a batch of items to it
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@json_posts_only
+def list_items(request, list_id):
+	list_ = archive.get_list_or_404(list_id)
+
+	if request.method == 'POST':
+		texts = _texts_from_json(request)
+		if texts is None:
+			return _error('Expected {"items": [...]} or {"text": "..."}')
+		items, rejected = list_.add_items(texts)
+		return json_response(_added_report(items, rejected), status=200 if items else 400)
+
+	limit = min(_int_param(request, 'limit', settings.LIST_PAGE_SIZE), settings.LIST_PAGE_SIZE)
+	items, has_more = list_.items_page(after=parse_cursor(request.GET.get('after')), limit=limit)
+	return json_response({
+		'list': list_.id,
+		'items': [{'id': item.id, 'text': item.text} for item in items],
+		'next': format_cursor((items[-1].position, items[-1].id)) if has_more else None,
+	})
+
+# Moves an item to just before or after another item on the same list:
+# {"before": <item id>} or {"after": <item id>}
+@csrf_exempt
+@require_POST
+@json_posts_only
+def move_item(request, list_id, item_id):
+	list_ = archive.get_list_or_404(list_id)
+	item = get_object_or_404(list_.item_set, id=item_id)
+	try:
+		data = json.loads(request.body.decode('utf-8'))
+		where, target_id = next((key, int(data[key])) for key in ('before', 'after') if key in data)
+	except (ValueError, TypeError, AttributeError, StopIteration):
+		return _error('Expected {"before": <item id>} or {"after": <item id>}')
+	target = get_object_or_404(list_.item_set, id=target_id)
+	if target.id != item.id:
+		item.move(**{where: target})
+	return json_response({'id': item.id, 'position': item.position})
+
+# The whole of a list in one response, however long it is. Rows are fetched
+# a chunk at a time with a keyset cursor over the (list, position) index, as
+# the export does, and each chunk goes out before the next is read - so only
+# one chunk of rows is ever held in memory. (A queryset iterator wouldn't do:
+# on SQLite Django fetches every row up front.)
+@require_GET
+def stream_items(request, list_id):
+	list_ = archive.get_list_or_404(list_id)
+	# bytes, not text, so the compression middleware can take the chunks
+	return StreamingHttpResponse(
+		(chunk.encode('utf-8') for chunk in _stream_items(list_)), content_type='application/json')
+
+def _stream_items(list_):
+	yield '{"list": %d, "items": [' % (list_.id,)
+	items = list_.item_set.values_list('id', 'text', 'position')
+	separator, chunk = '', items
+	while True:
+		rows = list(chunk[:STREAM_CHUNK_SIZE])
+		if rows:
+			yield separator + ','.join(json.dumps({'id': item_id, 'text': text}) for item_id, text, _ in rows)
+			separator = ','
+		if len(rows) < STREAM_CHUNK_SIZE:
+			break
+		chunk = items_after(items, (rows[-1][2], rows[-1][0]))
+	yield ']}'
+
+# Every list and item, as NDJSON or (with ?format=csv) CSV, streamed out a
+# chunk at a time - see lists.transfer
+@require_GET
+def export(request):
+	format = request.GET.get('format', 'ndjson')
+	if format not in transfer.FORMATS:
+		return _error('format must be one of %s' % (', '.join(transfer.FORMATS),))
+	response = StreamingHttpResponse(
+		(chunk.encode('utf-8') for chunk in transfer.export_chunks(format)),
+		content_type=transfer.CONTENT_TYPES[format])
+	response['Content-Disposition'] = 'attachment; filename="lists.%s"' % (format,)
+	return response
+
+# Ranked search over every list's items, or just one list's with ?list=<id>.
+# Words ending in * match as prefixes
+@require_GET
+def search(request):
+	query = request.GET.get('q', '')
+	list_ = None
+	if 'list' in request.GET:
+		list_ = archive.get_list_or_404(_int_param(request, 'list', 0))
+	page = max(_int_param(request, 'page', 1), 1)
+
+	results, has_more = ItemTerm.search(query, list_=list_, page=page)
+	return json_response({
+		'query': query,
+		'page': page,
+		'results': [
+			{'id': item.id, 'list': item.list_id, 'text': item.text, 'score': score}
+			for item, score in results
+		],
+		'next_page': page + 1 if has_more else None,
+	})
+
+# Takes either a JSON array of texts or a form-encoded 'items' field with one
+# text per line, and reports back every row it rejected
+@csrf_exempt
+@require_POST
+def bulk_add_items(request, list_id):
+	list_ = archive.get_list_or_404(list_id)
+	if not _is_json(request):
+		return _bulk_add_form(request, list_)
+	texts = _texts_from_json(request)
+	if texts is None:
+		return _error('Expected a JSON array of strings')
+	items, rejected = list_.add_items(texts)
+	return json_response(_added_report(items, rejected))
+
+# Any other site can post a plain HTML form here, but can't label a body as
+# JSON without a CORS preflight - so form posts still need the CSRF token
+@csrf_protect
+def _bulk_add_form(request, list_):
+	items, rejected = list_.add_items(request.POST.get('items', '').splitlines())
+	return json_response(_added_report(items, rejected))
@@ -0,0 +1,10 @@
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('',
+    url(r'^$', 'lists.api.create_list', name='api_create_list'),
+    url(r'^export$', 'lists.api.export', name='api_export'),
+    url(r'^search$', 'lists.api.search', name='api_search'),
+    url(r'^(\d+)/items$', 'lists.api.list_items', name='api_list_items'),
+    url(r'^(\d+)/items/(\d+)/move$', 'lists.api.move_item', name='api_move_item'),
+    url(r'^(\d+)/items/stream$', 'lists.api.stream_items', name='api_stream_items'),
+)
@@ -0,0 +1,150 @@
+# Archiving of lists nobody looks at any more. The archive_lists command
+# packs the items of every list idle for ARCHIVE_AFTER_DAYS into a single
+# compressed ArchivedList row, and deletes them and their search terms from
+# the hot tables. The list row itself stays where it is, flagged as archived,
+# so its URL, its place on the recent lists page and its preview are all
+# unchanged. The next time anything asks for the list through get_list() the
+# items are unpacked back into place first.
+#
+# Archived items don't turn up in search across every list until their list
+# has been brought back.
+import threading
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.http import Http404
+from django.utils import timezone
+from lists import shards
+from lists.models import hash_text, ArchivedList, Item, ItemTerm, List
+
+_stats = {'archived': 0, 'rehydrated': 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome, count=1):
+	with _stats_lock:
+		_stats[outcome] += count
+
+# A list for a view to work with: never archived, and with its last access noted
+def get_list(list_id):
+	return prepare(shards.get_list(list_id))
+
+# The same for a list already fetched - for views that can answer some
+# requests without it
+def prepare(list_):
+	if list_.archived:
+		rehydrate(list_)
+	list_.mark_accessed()
+	return list_
+
+def get_list_or_404(list_id):
+	try:
+		return get_list(list_id)
+	except List.DoesNotExist:
+		raise Http404('No such list')
+
+
+# Up to `limit` ids of lists on the database not looked at since `cutoff`,
+# longest idle first - a range scan over the last_accessed index
+def idle_lists(db, cutoff, limit):
+	return list(List.objects.using(db).filter(
+		archived=False, last_accessed__lt=cutoff
+	).order_by('last_accessed').values_list('id', flat=True)[:limit])
+
+# Archives a batch of lists on one database in a single transaction, in a
+# handful of statements whatever the size of the batch. Lists looked at since
+# they were picked out are left alone. Returns how many lists and items were
+# archived
+def archive_lists(db, list_ids, cutoff):
+	with transaction.atomic(using=db):
+		# Flagged first, so nothing can be added to them between reading their
+		# items and deleting them: every write to a list's items ends with
+		# List.touch(), which leaves archived lists alone and rolls the write
+		# back instead. On SQLite the flag takes the database's write lock as
+		# well, so other writers wait for the batch; elsewhere it only locks
+		# these lists' rows, and writers to them wait at touch()
+		candidates = List.objects.using(db).filter(
+			id__in=list_ids, last_accessed__lt=cutoff, archivedlist=None)
+		candidates.filter(archived=False).update(archived=True)
+		ids = list(candidates.filter(archived=True).values_list('id', flat=True))
+		if not ids:
+			return 0, 0
+
+		rows = dict((list_id, []) for list_id in ids)
+		items = Item.objects.using(db).filter(list__in=ids).order_by('list', 'position', 'id').values_list(
+			'list_id', 'id', 'text', 'position')
+		for list_id, item_id, text, position in items.iterator():
+			rows[list_id].append([item_id, text, position])
+		ArchivedList.objects.using(db).bulk_create([
+			ArchivedList(list_id=list_id, data=ArchivedList.pack(list_rows))
+			for list_id, list_rows in rows.items()
+		], batch_size=settings.BULK_BATCH_SIZE)
+
+		_delete_rows(db, ItemTerm, ids)
+		_delete_rows(db, Item, ids)
+
+	item_count = sum(len(list_rows) for list_rows in rows.values())
+	_record('archived', len(ids))
+	return len(ids), item_count
+
+# Plain DELETEs of the lists' rows in a table, a batch of lists at a time.
+# QuerySet.delete() would fetch every item and term first, to send signals
+# and cascade - and nothing hangs off either
+def _delete_rows(db, model, list_ids):
+	connection = connections[db]
+	cursor = connection.cursor()
+	quote = connection.ops.quote_name
+	for start in range(0, len(list_ids), settings.BULK_BATCH_SIZE):
+		batch = list_ids[start:start + settings.BULK_BATCH_SIZE]
+		cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+			quote(model._meta.db_table), quote('list_id'), ', '.join(['%s'] * len(batch))), batch)
+
+# Puts an archived list's items back, under new ids. Whoever clears the flag
+# does the unpacking; anyone else asking at the same time waits on the lock
+# and then finds the items already there. The version is bumped either way,
+# so nothing cached from before the list was archived is served
+def rehydrate(list_):
+	db = list_._state.db
+	with transaction.atomic(using=db):
+		claimed = List.objects.using(db).filter(pk=list_.pk, archived=True).update(
+			archived=False, version=models.F('version') + 1, last_accessed=timezone.now())
+		if claimed:
+			entry = ArchivedList.objects.using(db).get(pk=list_.pk)
+			items = [
+				Item(list=list_, text=text, text_hash=hash_text(text), position=position)
+				for _, text, position in entry.unpack()
+			]
+			Item.objects.using(db).bulk_create(items, batch_size=settings.BULK_BATCH_SIZE)
+			list_._fill_in_ids(items)
+			ItemTerm.index_items(items, using=db)
+			ArchivedList.objects.using(db).filter(pk=list_.pk).delete()
+
+	fresh = List.objects.using(db).get(pk=list_.pk)
+	list_.archived, list_.version, list_.last_accessed = fresh.archived, fresh.version, fresh.last_accessed
+	if claimed:
+		_record('rehydrated')
+	return list_
+
+
+# The size of the hot tables and of the archive on each database, plus how
+# many lists this process has archived and brought back. Counting the items
+# is a scan of the table, so this is for the command and for monitoring, not
+# for pages
+def stats():
+	with _stats_lock:
+		result = dict(_stats)
+	for db in shards.databases():
+		result[db] = {
+			'lists': List.objects.using(db).filter(archived=False).count(),
+			'items': Item.objects.using(db).count(),
+			'archived_lists': ArchivedList.objects.using(db).count(),
+			'archived_bytes': _archived_bytes(db),
+		}
+	return result
+
+def _archived_bytes(db):
+	connection = connections[db]
+	cursor = connection.cursor()
+	cursor.execute('SELECT COALESCE(SUM(LENGTH(%s)), 0) FROM %s' % (
+		connection.ops.quote_name('data'), connection.ops.quote_name(ArchivedList._meta.db_table)))
+	return int(cursor.fetchone()[0])
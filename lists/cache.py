@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.core.cache import get_cache
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.utils.safestring import mark_safe
+
+# Global in-process stores, keyed by cache name like LocMemCache does, so every
+# get_cache() call for the same alias sees the same entries
+_caches = {}
+_locks = {}
+
+
+# In-process cache that evicts the least recently used entry once MAX_ENTRIES
+# is reached, on top of the usual per-entry TIMEOUT
+class LRUCache(BaseCache):
+	def __init__(self, name, params):
+		super().__init__(params)
+		self._cache = _caches.setdefault(name, OrderedDict())
+		self._lock = _locks.setdefault(name, threading.Lock())
+
+	def _expiry(self, timeout):
+		if timeout == DEFAULT_TIMEOUT:
+			timeout = self.default_timeout
+		return None if timeout is None else time.time() + timeout
+
+	def _live_entry(self, key):
+		try:
+			expiry, value = self._cache[key]
+		except KeyError:
+			return None
+		if expiry is not None and expiry <= time.time():
+			del self._cache[key]
+			return None
+		self._cache.move_to_end(key)
+		return (value,)
+
+	def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		with self._lock:
+			if self._live_entry(key) is not None:
+				return False
+			self._set(key, value, timeout)
+			return True
+
+	def get(self, key, default=None, version=None):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		with self._lock:
+			entry = self._live_entry(key)
+		return default if entry is None else entry[0]
+
+	def _set(self, key, value, timeout):
+		self._cache.pop(key, None)
+		while len(self._cache) >= self._max_entries:
+			self._cache.popitem(last=False)
+		self._cache[key] = (self._expiry(timeout), value)
+
+	def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		with self._lock:
+			self._set(key, value, timeout)
+
+	def delete(self, key, version=None):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		with self._lock:
+			self._cache.pop(key, None)
+
+	def has_key(self, key, version=None):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		with self._lock:
+			return self._live_entry(key) is not None
+
+	def clear(self):
+		with self._lock:
+			self._cache.clear()
+
+
+# Rendered fragments live in their own cache alias so they can be sized, and
+# shared between workers, independently of anything else we cache
+fragments = get_cache('lists')
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def stats():
+	with _stats_lock:
+		return dict(_stats)
+
+def _record(outcome):
+	with _stats_lock:
+		_stats[outcome] += 1
+
+# The list's version is part of the key, so bumping it on every write makes
+# the old fragments unreachable - no explicit invalidation needed
+def list_table_key(list_, *page):
+	parts = (list_.id, list_.version) + page
+	return 'list-table:' + ':'.join(str(part) for part in parts)
+
+def cached_fragment(key, render):
+	fragment = fragments.get(key)
+	if fragment is None:
+		_record('misses')
+		fragment = render()
+		fragments.set(key, fragment)
+	else:
+		_record('hits')
+	return mark_safe(fragment)
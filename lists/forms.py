@@ -1,9 +1,8 @@
 from django import forms
-from lists.models import Item
+from django.conf import settings
+from lists.models import Item, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR
 from django.core.exceptions import ValidationError
-
-EMPTY_LIST_ERROR = "You can't have an empty list item"
-DUPLICATE_ITEM_ERROR = "You've already got this in your list"
+from lists.writebehind import get_queue
 
 
 class ItemForm(forms.models.ModelForm):
@@ -33,11 +32,25 @@ class ExistingListItemForm(ItemForm):
 		self.instance.list = for_list
 
 	def validate_unique(self):
+		if settings.LISTS_FAST_WRITES or settings.LISTS_WRITE_BEHIND:
+			return # the database (or the queue) checks for us when we save
 		try:
-			self.instance.validate_unique()
+			self.instance.validate_unique() # one lookup on the (list, text_hash) index
 		except ValidationError as e:
-			e.error_dict = {'text': [DUPLICATE_ITEM_ERROR]}
 			self._update_errors(e)
 
+	# Returns None, with the error on the form, if the database turned the
+	# item away as a duplicate
 	def save(self):
-		return forms.models.ModelForm.save(self)
\ No newline at end of file
+		try:
+			return forms.models.ModelForm.save(self)
+		except ValidationError as e:
+			self._update_errors(e)
+
+	# Write-behind version of save(): queues the item and returns the ticket
+	# to wait on before reading it back, or None with the error on the form
+	def enqueue(self):
+		try:
+			return get_queue().enqueue(self.instance.list, self.cleaned_data['text'])
+		except ValidationError as e:
+			self._update_errors(e)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import threading
+import time
+from django.conf import settings
+from django.utils.module_loading import import_by_path
+
+
+# Fans writes out to the live streams in this process. A stream takes a
+# marker for its list, checks the database, then waits for the marker to
+# change - so nothing published in between is missed.
+class LocalHub:
+	def __init__(self):
+		self._condition = threading.Condition()
+		self._markers = {}
+
+	def marker(self, list_id):
+		with self._condition:
+			return self._markers.get(list_id, 0)
+
+	def publish(self, list_id):
+		with self._condition:
+			self._markers[list_id] = self._markers.get(list_id, 0) + 1
+			self._condition.notify_all()
+
+	def wait(self, list_id, marker, timeout):
+		with self._condition:
+			self._condition.wait_for(lambda: self._markers.get(list_id, 0) != marker, timeout)
+			return self._markers.get(list_id, 0)
+
+
+# For running several workers: the list's version in the database is the
+# marker, so a write made by any worker wakes every stream - at the cost of a
+# single-row query per stream every LIVE_POLL_SECONDS
+class PollingHub:
+	def marker(self, list_id):
+		from lists import shards
+		db = shards.shard_map.db_for_list(list_id)
+		version = self._version(db, list_id)
+		if version is None and shards.enabled():
+			# moved since this process looked it up
+			shards.shard_map.forget(list_id)
+			if shards.shard_map.db_for_list(list_id) != db:
+				version = self._version(shards.shard_map.db_for_list(list_id), list_id)
+		return version
+
+	# None once the list is gone
+	def _version(self, db, list_id):
+		from lists.models import List
+		return List.objects.using(db).filter(id=list_id).values_list('version', flat=True).first()
+
+	def publish(self, list_id):
+		pass # the write itself bumped the version
+
+	def wait(self, list_id, marker, timeout):
+		deadline = time.time() + timeout
+		while True:
+			current = self.marker(list_id)
+			remaining = deadline - time.time()
+			if current != marker or remaining <= 0:
+				return current
+			time.sleep(min(settings.LIVE_POLL_SECONDS, remaining))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_hub():
+	global _hub
+	with _hub_lock:
+		if _hub is None:
+			_hub = import_by_path(settings.LIVE_HUB)()
+		return _hub
+
+# Call once the items are committed, or a stream could look for them too soon
+def publish(list_id):
+	get_hub().publish(list_id)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+from django.utils import timezone
+from lists import archive, shards
+
+
+class Command(NoArgsCommand):
+	help = ('Packs the items of lists nobody has looked at for a while into the archive, '
+		'a batch of lists per transaction, then reports how big the hot tables are.')
+	option_list = NoArgsCommand.option_list + (
+		make_option('--days', type='int', default=None,
+			help='Archive lists idle for this many days (default ARCHIVE_AFTER_DAYS)'),
+		make_option('--batch-size', type='int', default=100,
+			help='Lists archived per transaction'),
+	)
+
+	def handle_noargs(self, days, batch_size, **options):
+		if days is None:
+			days = settings.ARCHIVE_AFTER_DAYS
+		cutoff = timezone.now() - timedelta(days=days)
+		verbose = int(options.get('verbosity', 1)) > 1
+		lists = items = 0
+		for db in shards.databases():
+			while True:
+				ids = archive.idle_lists(db, cutoff, batch_size)
+				if not ids:
+					break
+				archived, archived_items = archive.archive_lists(db, ids, cutoff)
+				if not archived:
+					break # the rest were all looked at since
+				lists += archived
+				items += archived_items
+				if verbose:
+					self.stdout.write('Archived %d lists on %s' % (archived, db))
+
+		self.stdout.write('Archived %d lists (%d items)' % (lists, items))
+		stats = archive.stats()
+		for db in shards.databases():
+			self.stdout.write('%s: %d lists and %d items hot, %d lists archived in %d bytes' % (
+				db, stats[db]['lists'], stats[db]['items'], stats[db]['archived_lists'], stats[db]['archived_bytes']))
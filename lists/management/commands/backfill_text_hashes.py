@@ -0,0 +1,142 @@
+from optparse import make_option
+from django.core.management.base import CommandError, NoArgsCommand
+from django.core.management.color import no_style
+from django.db import connections, IntegrityError, transaction
+from django.db.models import Count
+from lists import shards
+from lists.models import hash_text, Item
+
+UNIQUE_INDEX = 'lists_item_list_id_text_hash_uniq'
+
+
+class Command(NoArgsCommand):
+	help = ('Adds the text_hash column to a database made before it existed, fills it in '
+		'for every item a batch at a time, and puts the unique (list, text_hash) index on '
+		'it in place of the old unique (list, text) one. Run it again after changing '
+		'ITEM_TEXT_FOLDING to rehash the items.')
+	option_list = NoArgsCommand.option_list + (
+		make_option('--batch-size', type='int', default=1000,
+			help='Items hashed per transaction'),
+	)
+
+	def handle_noargs(self, batch_size, **options):
+		checked = updated = 0
+		for db in shards.databases():
+			counts = self.backfill(db, batch_size, **options)
+			checked, updated = checked + counts[0], updated + counts[1]
+		self.stdout.write('Checked %d items, updated %d' % (checked, updated))
+
+	def backfill(self, db, batch_size, **options):
+		connection = connections[db]
+		table = Item._meta.db_table
+		quote = connection.ops.quote_name
+		cursor = connection.cursor()
+		columns = [column[0] for column in connection.introspection.get_table_description(cursor, table)]
+		if 'text_hash' not in columns:
+			field = Item._meta.get_field('text_hash')
+			cursor.execute("ALTER TABLE %s ADD COLUMN %s %s NOT NULL DEFAULT ''" % (
+				quote(table), quote(field.column), field.db_type(connection)))
+			self.stdout.write('Added the text_hash column on %s' % (db,))
+
+		checked, updated, conflicts, last_id = 0, 0, 0, 0
+		items = Item.objects.using(db)
+		while True:
+			batch = list(items.filter(id__gt=last_id).order_by('id').values_list(
+				'id', 'text', 'text_hash')[:batch_size])
+			if not batch:
+				break
+			with transaction.atomic(using=db):
+				for item_id, text, stored in batch:
+					digest = hash_text(text)
+					if digest == stored:
+						continue
+					try:
+						with transaction.atomic(using=db):
+							items.filter(pk=item_id).update(text_hash=digest)
+						updated += 1
+					except IntegrityError:
+						conflicts += 1 # a duplicate of another item, now the texts are folded
+			checked += len(batch)
+			last_id = batch[-1][0]
+			if int(options.get('verbosity', 1)) > 1:
+				self.stdout.write('Checked %d items on %s' % (checked, db))
+
+		duplicates = items.values('list', 'text_hash').annotate(
+			count=Count('id')).filter(count__gt=1).count()
+		if conflicts or duplicates:
+			raise CommandError(
+				'Some items duplicate others on their list under the current ITEM_TEXT_FOLDING '
+				'(%d couldn\'t be rehashed, %d clashes stored). Remove them and run this again'
+				% (conflicts, duplicates))
+		self.replace_unique_text_index(db)
+		return checked, updated
+
+	# Databases made before text_hash existed have a unique (list_id, text)
+	# constraint from syncdb, which holds a copy of every whole text. Postgres
+	# can drop it. SQLite can't drop the index behind a constraint declared in
+	# CREATE TABLE, so there the table is made again, as syncdb would make it
+	# now - (list_id, text_hash) constraint included - and the items copied over
+	def replace_unique_text_index(self, db):
+		connection = connections[db]
+		table = Item._meta.db_table
+		quote = connection.ops.quote_name
+		cursor = connection.cursor()
+		indexes = self.unique_indexes(connection, table)
+		if indexes is None:
+			self.stdout.write("Can't look for a unique (list_id, text) index on %s: drop it by hand" % (db,))
+			cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS %s ON %s (%s, %s)' % (
+				quote(UNIQUE_INDEX), quote(table), quote('list_id'), quote('text_hash')))
+			return
+		with transaction.atomic(using=db):
+			for name, columns, constraint in indexes:
+				if columns != ('list_id', 'text'):
+					continue
+				if connection.vendor == 'sqlite' and name.startswith('sqlite_autoindex_'):
+					self.rebuild_table(connection)
+					self.stdout.write('Rebuilt %s on %s without its unique (list_id, text) index' % (table, db))
+					return
+				if constraint:
+					cursor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (quote(table), quote(constraint)))
+				else:
+					cursor.execute('DROP INDEX %s' % (quote(name),))
+				self.stdout.write('Dropped the unique (list_id, text) index on %s' % (db,))
+			if not any(columns == ('list_id', 'text_hash') for _, columns, _ in indexes):
+				cursor.execute('CREATE UNIQUE INDEX %s ON %s (%s, %s)' % (
+					quote(UNIQUE_INDEX), quote(table), quote('list_id'), quote('text_hash')))
+
+	# (name, columns, constraint name or None) for each unique index on the
+	# table, other than its primary key - or None on a database we can't ask
+	def unique_indexes(self, connection, table):
+		cursor = connection.cursor()
+		if connection.vendor == 'sqlite':
+			cursor.execute('PRAGMA index_list(%s)' % (connection.ops.quote_name(table),))
+			names = [row[1] for row in cursor.fetchall() if row[2]]
+			indexes = []
+			for name in names:
+				cursor.execute('PRAGMA index_info(%s)' % (connection.ops.quote_name(name),))
+				indexes.append((name, tuple(row[2] for row in sorted(cursor.fetchall())), None))
+			return indexes
+		if connection.vendor == 'postgresql':
+			cursor.execute(
+				'SELECT i.relname, ARRAY(SELECT a.attname FROM unnest(x.indkey) WITH ORDINALITY AS k(attnum, n) '
+				'JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum ORDER BY k.n), c.conname '
+				'FROM pg_index x JOIN pg_class t ON t.oid = x.indrelid JOIN pg_class i ON i.oid = x.indexrelid '
+				'LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid '
+				'WHERE t.relname = %s AND x.indisunique AND NOT x.indisprimary', [table])
+			return [(name, tuple(columns), constraint) for name, columns, constraint in cursor.fetchall()]
+		return None
+
+	def rebuild_table(self, connection):
+		table = Item._meta.db_table
+		quote = connection.ops.quote_name
+		cursor = connection.cursor()
+		new_table = table + '__new'
+		create, _ = connection.creation.sql_create_model(Item, no_style(), set())
+		columns = ', '.join(quote(field.column) for field in Item._meta.local_fields)
+		cursor.execute(create[0].rstrip(';').replace(
+			'CREATE TABLE %s' % (quote(table),), 'CREATE TABLE %s' % (quote(new_table),), 1))
+		cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (quote(new_table), columns, columns, quote(table)))
+		cursor.execute('DROP TABLE %s' % (quote(table),))
+		cursor.execute('ALTER TABLE %s RENAME TO %s' % (quote(new_table), quote(table)))
+		for statement in connection.creation.sql_indexes_for_model(Item, no_style()):
+			cursor.execute(statement.rstrip(';'))
@@ -0,0 +1,26 @@
+from optparse import make_option
+import sys
+from django.core.management.base import NoArgsCommand
+from lists import transfer
+
+
+class Command(NoArgsCommand):
+	help = 'Writes every list and item out as NDJSON or CSV.'
+	option_list = NoArgsCommand.option_list + (
+		make_option('--format', choices=transfer.FORMATS, default=None,
+			help='ndjson or csv - by default, whatever --output ends in, else ndjson'),
+		make_option('--output', default=None,
+			help='File to write to, rather than stdout'),
+		make_option('--chunk-size', type='int', default=None,
+			help='Rows fetched per query'),
+	)
+
+	def handle_noargs(self, format, output, chunk_size, **options):
+		format = format or transfer.format_for(output or '')
+		f = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+		try:
+			for chunk in transfer.export_chunks(format, chunk_size):
+				f.write(chunk)
+		finally:
+			if output:
+				f.close()
@@ -0,0 +1,41 @@
+from optparse import make_option
+import os
+from django.core.management.base import BaseCommand, CommandError
+from lists import transfer
+
+
+class Command(BaseCommand):
+	args = '<file>'
+	help = 'Imports lists and items written by export_lists, as new lists.'
+	option_list = BaseCommand.option_list + (
+		make_option('--format', choices=transfer.FORMATS, default=None,
+			help='ndjson or csv - by default, whatever the file ends in'),
+		make_option('--batch-size', type='int', default=None,
+			help='Records imported per transaction'),
+		make_option('--checkpoint', default=None,
+			help='Progress file, for resuming an interrupted import (default: <file>.checkpoint)'),
+		make_option('--restart', action='store_true', default=False,
+			help='Ignore any checkpoint and import from the start'),
+	)
+
+	def handle(self, *args, **options):
+		if len(args) != 1:
+			raise CommandError('Give the file to import')
+		path = args[0]
+		format = options['format'] or transfer.format_for(path)
+		checkpoint = options['checkpoint'] or path + '.checkpoint'
+		importer = transfer.Importer(checkpoint=checkpoint, batch_size=options['batch_size'])
+		if options['restart']:
+			importer.forget()
+			if os.path.exists(checkpoint):
+				os.remove(checkpoint)
+
+		done = importer.resume()
+		if done:
+			self.stdout.write('Resuming after %d records' % (done,))
+		with open(path, newline='', encoding='utf-8') as f:
+			stats = importer.run(transfer.read_records(f, format))
+		importer.forget()
+		if os.path.exists(checkpoint):
+			os.remove(checkpoint)
+		self.stdout.write('Imported %(lists)d lists, %(items)d items (%(skipped)d skipped)' % stats)
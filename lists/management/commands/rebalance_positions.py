@@ -0,0 +1,41 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from lists import shards
+from lists.models import List, POSITION_GAP
+
+
+class Command(NoArgsCommand):
+	help = ('Spreads out the items of any list that moves have crowded together, '
+		'or that has items sharing a position or still without one.')
+	option_list = NoArgsCommand.option_list + (
+		make_option('--min-gap', type='int', default=POSITION_GAP >> 10,
+			help='Rebalance lists with any two items closer together than this'),
+		make_option('--batch-size', type='int', default=1000,
+			help='Lists checked per query'),
+	)
+
+	# Moves rebalance a list themselves when they run out of room, but that
+	# lands on whoever makes the move - run this now and then to do it ahead
+	# of them. It's also the backfill for items from before there were
+	# positions, which are all still at 0: the first item of a list has to be
+	# a whole gap clear of 0, and two items at the same position have no gap
+	# at all
+	def handle_noargs(self, min_gap, batch_size, **options):
+		checked = rebalanced = 0
+		for db in shards.databases():
+			last_id = 0
+			while True:
+				lists = list(List.objects.using(db).filter(id__gt=last_id).order_by('id')[:batch_size])
+				if not lists:
+					break
+				for list_ in lists:
+					positions = list(list_.item_set.values_list('position', flat=True))
+					if any(b - a < min_gap for a, b in zip([0] + positions, positions)):
+						list_.rebalance_positions()
+						rebalanced += 1
+				checked += len(lists)
+				last_id = lists[-1].id
+				if int(options.get('verbosity', 1)) > 1:
+					self.stdout.write('Checked %d lists' % (checked,))
+
+		self.stdout.write('Checked %d lists, rebalanced %d' % (checked, rebalanced))
@@ -0,0 +1,49 @@
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import CommandError, NoArgsCommand
+from lists import shards
+from lists.models import List
+
+
+class Command(NoArgsCommand):
+	help = ('Moves lists from the fullest shards to the emptiest until every shard has '
+		'about as many, or moves one list with --list and --to.')
+	option_list = NoArgsCommand.option_list + (
+		make_option('--list', type='int', dest='list_id', default=None,
+			help='Move just this list'),
+		make_option('--to', default=None,
+			help='The shard to move --list to'),
+		make_option('--batch-size', type='int', default=100,
+			help='Lists moved before the shards are weighed up again'),
+	)
+
+	def handle_noargs(self, list_id, to, batch_size, **options):
+		if not shards.enabled():
+			raise CommandError('Lists are not sharded: set SUPERLISTS_LIST_SHARDS')
+		if list_id is not None:
+			if to not in settings.LIST_SHARDS:
+				raise CommandError('--to must be one of %s' % (', '.join(settings.LIST_SHARDS),))
+			moved = shards.move_list(list_id, to)
+			self.stdout.write('Moved list %d to %s' % (list_id, to) if moved else 'List %d is already on %s' % (list_id, to))
+			return
+
+		counts = dict((db, List.objects.using(db).count()) for db in settings.LIST_SHARDS)
+		moved = 0
+		while True:
+			fullest = max(counts, key=counts.get)
+			emptiest = min(counts, key=counts.get)
+			batch = min(batch_size, (counts[fullest] - counts[emptiest]) // 2)
+			if batch < 1:
+				break
+			# the lists least likely to be written to while they're moved
+			lists = List.objects.using(fullest).order_by('updated_at').values_list('id', flat=True)[:batch]
+			for list_id in list(lists):
+				shards.move_list(list_id, emptiest)
+			counts[fullest] -= batch
+			counts[emptiest] += batch
+			moved += batch
+			if int(options.get('verbosity', 1)) > 1:
+				self.stdout.write('Moved %d lists from %s to %s' % (batch, fullest, emptiest))
+
+		self.stdout.write('Moved %d lists: %s' % (moved, ', '.join(
+			'%s has %d' % (db, counts[db]) for db in settings.LIST_SHARDS)))
@@ -0,0 +1,36 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from lists import shards
+from lists.models import Item, ItemTerm, List
+
+
+class Command(NoArgsCommand):
+	help = ("Rebuilds the search index, a batch of lists at a time. Each batch's "
+		"terms are swapped in one transaction, so search keeps working throughout.")
+	option_list = NoArgsCommand.option_list + (
+		make_option('--batch-size', type='int', default=100,
+			help='Lists reindexed per transaction'),
+	)
+
+	def handle_noargs(self, batch_size, **options):
+		indexed = terms = 0
+		for db in shards.databases():
+			last_id = 0
+			while True:
+				# walk the lists in id order rather than OFFSET-ing through them
+				ids = list(List.objects.using(db).filter(id__gt=last_id).order_by('id').values_list(
+					'id', flat=True)[:batch_size])
+				if not ids:
+					break
+				items = list(Item.objects.using(db).filter(list__in=ids))
+				with transaction.atomic(using=db):
+					ItemTerm.objects.using(db).filter(list__in=ids).delete()
+					ItemTerm.index_items(items, using=db)
+				indexed += len(items)
+				last_id = ids[-1]
+				if int(options.get('verbosity', 1)) > 1:
+					self.stdout.write('Indexed %d items' % (indexed,))
+			terms += ItemTerm.objects.using(db).count()
+
+		self.stdout.write('Indexed %d items, %d terms' % (indexed, terms))
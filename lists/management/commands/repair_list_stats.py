@@ -0,0 +1,68 @@
+import json
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+from django.db import connections, transaction
+from django.db.models import Count
+from lists import shards
+from lists.models import Item, List
+
+# Lists whose previews are read per query: one SELECT each in a compound
+# statement, and SQLite won't take more than 500 of those
+PREVIEW_QUERY_LISTS = 400
+
+
+class Command(NoArgsCommand):
+	help = "Recomputes every list's item count and preview from its items."
+	option_list = NoArgsCommand.option_list + (
+		make_option('--batch-size', type='int', default=1000,
+			help='Lists repaired per transaction'),
+	)
+
+	def handle_noargs(self, batch_size, **options):
+		checked = repaired = 0
+		for db in shards.databases():
+			last_id = 0
+			while True:
+				# one COUNT ... GROUP BY and a query or two for the previews per
+				# batch, and only rows that are off get written. Archived lists
+				# keep the counts they were archived with
+				lists = list(List.objects.using(db).filter(id__gt=last_id, archived=False).order_by('id').annotate(
+					counted=Count('item')
+				)[:batch_size])
+				if not lists:
+					break
+				previews = self.previews(db, [list_.id for list_ in lists])
+				with transaction.atomic(using=db):
+					for list_ in lists:
+						preview = previews[list_.id]
+						if list_.item_count != list_.counted or list_.preview != preview:
+							List.objects.using(db).filter(pk=list_.pk).update(
+								item_count=list_.counted, preview=preview)
+							repaired += 1
+				checked += len(lists)
+				last_id = lists[-1].id
+				if int(options.get('verbosity', 1)) > 1:
+					self.stdout.write('Checked %d lists' % (checked,))
+
+		self.stdout.write('Checked %d lists, repaired %d' % (checked, repaired))
+
+	# What List.current_preview() would give for each list, from a UNION ALL of
+	# one short range scan over the (list, position) index per list - a query
+	# per PREVIEW_QUERY_LISTS lists instead of one per list
+	def previews(self, db, list_ids):
+		connection = connections[db]
+		qn = connection.ops.quote_name
+		branch = 'SELECT * FROM (SELECT %s, %s, %s, %s FROM %s WHERE %s = %%s ORDER BY %s, %s LIMIT %d) AS preview' % (
+			qn('list_id'), qn('position'), qn('id'), qn('text'), qn(Item._meta.db_table),
+			qn('list_id'), qn('position'), qn('id'), settings.LIST_PREVIEW_ITEMS)
+		rows = []
+		for start in range(0, len(list_ids), PREVIEW_QUERY_LISTS):
+			chunk = list_ids[start:start + PREVIEW_QUERY_LISTS]
+			cursor = connection.cursor()
+			cursor.execute(' UNION ALL '.join([branch] * len(chunk)), chunk)
+			rows.extend(cursor.fetchall())
+		texts = dict((list_id, []) for list_id in list_ids)
+		for list_id, _, _, text in sorted(rows):
+			texts[list_id].append(text)
+		return dict((list_id, json.dumps(list_texts)) for list_id, list_texts in texts.items())
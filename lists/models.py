@@ -1,23 +1,393 @@
-from django.db import models
+import hashlib
+import json
+import re
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction, IntegrityError
 from django.shortcuts import resolve_url
+from django.utils import timezone
+from lists import live
+
+# Room left between neighbouring items, so an item can be moved between two
+# others by changing its position alone - twenty moves into the same spot
+# before the list has to be spread out again
+POSITION_GAP = 1 << 20
+
+# Positions aren't unique - two items saved at once can both go a gap after
+# the same last item - so items are ordered by position and then id, and a
+# keyset cursor is the (position, id) of the last item already seen
+def items_after(items, cursor):
+	position, item_id = cursor
+	return items.filter(position__gte=position).exclude(position=position, id__lte=item_id)
+
+# The same the other way: the items before a cursor, nearest first
+def items_before(items, cursor):
+	position, item_id = cursor
+	return items.filter(position__lte=position).exclude(position=position, id__gte=item_id).order_by(
+		'-position', '-id')
+
+# In URLs a cursor is <position>.<id>
+def format_cursor(cursor):
+	return '%d.%d' % cursor if cursor else ''
+
+MAX_ID = (1 << 63) - 1
+
+# Cursors come straight from the query string, so anything unusable just
+# means "from the beginning". A bare position, from a link made before
+# cursors had ids in them, carries on after every item at that position
+def parse_cursor(value):
+	position, _, item_id = (value or '').partition('.')
+	try:
+		position = int(position)
+		item_id = int(item_id) if item_id else None
+	except ValueError:
+		return None
+	if item_id is None:
+		return (position, MAX_ID) if position > 0 else None
+	return position, item_id
+
+# Duplicates are found by a hash of each item's text, so neither the unique
+# index nor the check against it has to hold or compare whole texts. With
+# ITEM_TEXT_FOLDING on, texts that only differ in case or spacing count as
+# the same item
+def hash_text(text):
+	if settings.ITEM_TEXT_FOLDING:
+		text = ' '.join(text.split()).casefold()
+	return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+EMPTY_LIST_ERROR = "You can't have an empty list item"
+DUPLICATE_ITEM_ERROR = "You've already got this in your list"
 
 # Create your models here.
 class List(models.Model):
+	# Bumped on every write, so anything cached against a version goes stale
+	version = models.PositiveIntegerField(default=0)
+	updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+	# Kept up to date by touch(), so overview pages needn't go near the items
+	item_count = models.PositiveIntegerField(default=0)
+	preview = models.TextField(default='[]') # JSON list of the first few texts
+	# When the list was last looked at, to LIST_ACCESS_RESOLUTION - see lists.archive
+	last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+	# Its items are packed away in an ArchivedList, until it's next looked at
+	archived = models.BooleanField(default=False)
+
+	@property
+	def preview_texts(self):
+		return json.loads(self.preview)
+
 	def get_absolute_url(self):
 		return resolve_url('view_list', self.id)
 
+	# Keyset pagination: one range scan over the (list, position) index per
+	# page, so the cost of a page doesn't grow with the size of the list.
+	# `after` is the cursor of the last item on the page before
+	def items_page(self, after=None, limit=None):
+		limit = limit or settings.LIST_PAGE_SIZE
+		items = self.item_set.all()
+		if after is not None:
+			items = items_after(items, after)
+		items = list(items[:limit + 1])
+		return items[:limit], len(items) > limit
+
+	def last_position(self):
+		return self.item_set.order_by('-position').values_list('position', flat=True).first() or 0
+
+	# Spreads the items back out POSITION_GAP apart, in their current order,
+	# for when moves have used up the room between two of them - or two items
+	# have ended up with the same position
+	def rebalance_positions(self):
+		db = self._state.db
+		items = list(self.item_set.values_list('id', 'position'))
+		with transaction.atomic(using=db, savepoint=False):
+			for index, (item_id, position) in enumerate(items, 1):
+				if position != index * POSITION_GAP:
+					Item.objects.using(db).filter(pk=item_id).update(position=index * POSITION_GAP)
+		return len(items)
+
+	# Bulk insert that checks emptiness and duplicates in memory, against one
+	# fetch of the texts already on the list, instead of paying a full_clean
+	# (and its uniqueness SELECT) per item. Returns the new items, plus an
+	# (index, text, error) triple for every text that was turned away
+	def add_items(self, texts):
+		existing = dict(self.item_set.values_list('text_hash', 'position'))
+		position = max(existing.values(), default=0)
+		items, rejected = [], []
+		for index, text in enumerate(texts):
+			digest = hash_text(text)
+			if not text:
+				rejected.append((index, text, EMPTY_LIST_ERROR))
+			elif digest in existing:
+				rejected.append((index, text, DUPLICATE_ITEM_ERROR))
+			else:
+				position += POSITION_GAP
+				existing[digest] = position
+				items.append(Item(list=self, text=text, text_hash=digest, position=position))
+
+		if items:
+			db = self._state.db
+			try:
+				with transaction.atomic(using=db):
+					Item.objects.using(db).bulk_create(items, batch_size=settings.BULK_BATCH_SIZE)
+					self._fill_in_ids(items)
+					ItemTerm.index_items(items, using=db)
+					self.touch(added=len(items))
+			except List.DoesNotExist:
+				return self.reload().add_items(texts)
+			live.publish(self.id)
+		return items, rejected
+
+	# bulk_create can't tell us the ids it inserted on every backend, but
+	# text hashes are unique within a list so they can be looked up afterwards
+	def _fill_in_ids(self, items):
+		batch_size = settings.BULK_BATCH_SIZE
+		for start in range(0, len(items), batch_size):
+			batch = items[start:start + batch_size]
+			ids = dict(self.item_set.filter(
+				text_hash__in=[item.text_hash for item in batch]
+			).values_list('text_hash', 'id'))
+			for item in batch:
+				item.id = ids[item.text_hash]
+
+	# Single UPDATE, so concurrent writers can't lose each other's bumps. The
+	# preview only has to be re-read while the list is shorter than it, or
+	# when an existing item was edited. Every write to a list's items ends
+	# here, in the same transaction, so if the list isn't on this database
+	# any more, or has been archived, the whole write is rolled back rather
+	# than left behind
+	def touch(self, added=0):
+		now = timezone.now()
+		lists = List.objects.using(self._state.db).filter(pk=self.pk, archived=False)
+		with transaction.atomic(using=self._state.db, savepoint=False):
+			updated = lists.update(
+				version=models.F('version') + 1,
+				updated_at=now,
+				item_count=models.F('item_count') + added,
+			)
+			if not updated:
+				raise List.DoesNotExist('List %d has been moved, archived or deleted' % (self.pk,))
+			if not added or self.item_count < settings.LIST_PREVIEW_ITEMS:
+				self.preview = self.current_preview()
+				lists.update(preview=self.preview)
+		self.version += 1
+		self.updated_at = now
+		self.item_count += added
+
+	# Only written when the last access is older than LIST_ACCESS_RESOLUTION,
+	# so busy lists don't cost an UPDATE on every read
+	def mark_accessed(self):
+		now = timezone.now()
+		if now - self.last_accessed < timedelta(seconds=settings.LIST_ACCESS_RESOLUTION):
+			return
+		List.objects.using(self._state.db).filter(pk=self.pk).update(last_accessed=now)
+		self.last_accessed = now
+
+	# The list as it is now, ready to write to, for a write that touch() turned
+	# away because this copy of it was loaded before the list was moved to
+	# another shard (see lists.shards.move_list) or archived. Raises
+	# DoesNotExist if it's gone altogether
+	def reload(self):
+		from lists import archive
+		return archive.get_list(self.pk)
+
+	def current_preview(self):
+		texts = self.item_set.values_list('text', flat=True)[:settings.LIST_PREVIEW_ITEMS]
+		return json.dumps(list(texts))
+
 class Item(models.Model):
 	text = models.TextField()
 	list = models.ForeignKey(List)
+	text_hash = models.CharField(max_length=40, editable=False) # see hash_text
+	# Sort key within the list: new items go POSITION_GAP after the last one
+	position = models.BigIntegerField(default=0)
 
 	class Meta:
-		ordering = ('id',)
-		unique_together = ('list', 'text')
+		ordering = ('position', 'id')
+		unique_together = ('list', 'text_hash')
+		# (list, id) is for the live updates, which follow new items by id
+		index_together = (('list', 'position'), ('list', 'id'))
 
 	# Override the save method to force a validation check in model layer
 	def save(self, *args, **kwargs):
-		self.full_clean()
-		super().save(*args, **kwargs)
+		created = self.pk is None
+		self.text_hash = hash_text(self.text)
+		if self.list_id is not None:
+			# an item is always saved alongside its list, whichever shard that's on
+			kwargs['using'] = self.list._state.db
+			if created and not self.position:
+				self.position = self.list.last_position() + POSITION_GAP
+		if settings.LISTS_FAST_WRITES:
+			# Skip the SELECT for duplicates and let the (list, text_hash)
+			# constraint turn them away - no race between the check and the
+			# INSERT either. Nor is the list looked up again to check it
+			# exists, when we're already holding it
+			self.full_clean(exclude=['list'] if self.list_id is not None else None, validate_unique=False)
+		else:
+			self.full_clean()
+		try:
+			# the item, its search terms and the list's count and preview all
+			# go in together, or none of them do
+			with transaction.atomic(using=kwargs.get('using')):
+				super().save(*args, **kwargs)
+				ItemTerm.index_items([self], replace=not created, using=self._state.db)
+				self.list.touch(added=1 if created else 0)
+		except IntegrityError:
+			if not settings.LISTS_FAST_WRITES:
+				raise
+			raise ValidationError({'text': [DUPLICATE_ITEM_ERROR]})
+		except List.DoesNotExist:
+			if not created:
+				raise # an edit can't follow: the item has a new id by now
+			self.pk, self._state.db, self._state.adding = None, None, True
+			self.list = self.list.reload()
+			return self.save(*args, **kwargs)
+		live.publish(self.list_id)
+
+	# A single lookup on the (list, text_hash) index, with the same error the
+	# forms show for a duplicate
+	def validate_unique(self, exclude=None):
+		if self.list_id is None or (exclude and 'list' in exclude):
+			return
+		self.text_hash = hash_text(self.text)
+		items = Item.objects.using(router.db_for_read(Item, instance=self))
+		if items.filter(list_id=self.list_id, text_hash=self.text_hash).exclude(pk=self.pk).exists():
+			raise ValidationError({'text': [DUPLICATE_ITEM_ERROR]})
+
+	# Moves the item to just before or just after another item on its list,
+	# by giving it a position in the gap between that item and its neighbour -
+	# a single-row UPDATE, unless the gap has run out and the list is spread
+	# out again first. That includes when the neighbour shares the other
+	# item's position, as there's no room between them at all
+	def move(self, before=None, after=None):
+		others = self.list.item_set.exclude(pk=self.pk).values_list('position', flat=True)
+		if after is not None:
+			low = after.position
+			high = items_after(others, (low, after.id)).first()
+		else:
+			high = before.position
+			low = items_before(others, (high, before.id)).first() or 0
+
+		if high is None:
+			position = low + POSITION_GAP
+		elif high - low > 1:
+			position = (low + high) // 2
+		else:
+			self.list.rebalance_positions()
+			target = Item.objects.using(self._state.db).get(pk=(after or before).pk)
+			return self.move(**{'after' if after is not None else 'before': target})
+
+		with transaction.atomic(using=self._state.db, savepoint=False):
+			Item.objects.using(self._state.db).filter(pk=self.pk).update(position=position)
+			self.position = position
+			self.list.touch()
+		live.publish(self.list_id)
 
 	def __str__(self):
-		return self.text
\ No newline at end of file
+		return self.text
+
+SEARCH_WORD = re.compile(r'\w+')
+# A word in a search query, with a trailing * if it's a prefix
+QUERY_WORD = re.compile(r'(\w+)(\*?)')
+# Highest possible code point, for turning a prefix into an index range
+PREFIX_END = chr(0x10ffff)
+
+def search_terms(text):
+	return set(word[:ItemTerm.MAX_LENGTH] for word in SEARCH_WORD.findall(text.lower()))
+
+# Inverted index for search: one row per distinct word in each item, so a
+# lookup is a range scan over the (term, list) index rather than a LIKE over
+# every item's text
+class ItemTerm(models.Model):
+	MAX_LENGTH = 64
+
+	term = models.CharField(max_length=MAX_LENGTH)
+	item = models.ForeignKey(Item)
+	list = models.ForeignKey(List, db_index=False) # covered by the (term, list) index
+
+	class Meta:
+		index_together = (('term', 'list'),)
+
+	@classmethod
+	def index_items(cls, items, replace=False, using=None):
+		terms = cls.objects.using(using)
+		if replace:
+			terms.filter(item__in=items).delete()
+		terms.bulk_create([
+			cls(term=term, item_id=item.id, list_id=item.list_id)
+			for item in items
+			for term in search_terms(item.text)
+		], batch_size=settings.BULK_BATCH_SIZE)
+
+	# Ranked search: items matching more of the query's words come first, and
+	# newest first after that. A word ending in * matches any word starting
+	# with it. Returns (item, score) pairs for the page, and whether there's
+	# another page after it
+	@classmethod
+	def search(cls, query, list_=None, page=1, per_page=None):
+		per_page = per_page or settings.SEARCH_PAGE_SIZE
+		matches = models.Q()
+		for word, prefix in QUERY_WORD.findall(query.lower()):
+			term = word[:cls.MAX_LENGTH]
+			if prefix:
+				matches |= models.Q(term__gte=term, term__lt=term + PREFIX_END)
+			else:
+				matches |= models.Q(term=term)
+		if not matches:
+			return [], False
+
+		terms = cls.objects.filter(matches)
+		if list_ is not None:
+			terms = terms.filter(list=list_)
+			dbs = [list_._state.db]
+		else:
+			from lists.shards import databases
+			dbs = databases()
+
+		# With lists on several shards, each shard's best results up to the end
+		# of the page are merged; otherwise it's straight to the page
+		offset = (page - 1) * per_page
+		skip = offset if len(dbs) == 1 else 0
+		scores = []
+		for db in dbs:
+			scores.extend((score, item_id, db) for item_id, score in terms.using(db).values_list('item').annotate(
+				score=models.Count('id')
+			).order_by('-score', '-item')[skip:offset + per_page + 1])
+		scores.sort(key=lambda row: (-row[0], -row[1]))
+		scores = scores[offset - skip:offset - skip + per_page + 1]
+
+		items = {}
+		for db in set(db for _, _, db in scores[:per_page]):
+			items[db] = Item.objects.using(db).in_bulk([item_id for _, item_id, item_db in scores[:per_page] if item_db == db])
+		return [(items[db][item_id], score) for score, item_id, db in scores[:per_page]], len(scores) > per_page
+
+# The items of a list that's been archived, packed into a single compressed
+# row on the list's shard instead of a row apiece in the item table and its
+# indexes. See lists.archive
+class ArchivedList(models.Model):
+	list = models.OneToOneField(List, primary_key=True)
+	data = models.BinaryField() # zlib'd JSON of [id, text, position] per item
+	archived_at = models.DateTimeField(default=timezone.now)
+
+	@staticmethod
+	def pack(rows):
+		return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'), 9)
+
+	def unpack(self):
+		return json.loads(zlib.decompress(bytes(self.data)).decode('utf-8'))
+
+# The list an import made out of each list it read, for as long as the
+# import is running (see lists.transfer.Importer). Kept on the new list's own
+# database, so it's committed along with the list
+class ImportedList(models.Model):
+	list = models.OneToOneField(List, primary_key=True)
+	source = models.CharField(max_length=40) # which import
+	source_id = models.IntegerField() # the list's id in the file
+
+	class Meta:
+		unique_together = ('source', 'source_id')
+
+# Which shard each list is on, when lists are sharded (see lists.shards).
+# Lives on the default database, and hands out the ids for new lists
+class ListShard(models.Model):
+	shard = models.CharField(max_length=100)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Everything belonging to a list lives on the list's shard
+SHARDED_MODELS = ('list', 'item', 'itemterm', 'archivedlist', 'importedlist')
+
+
+# Sends lists, their items and their search terms to the shard the list lives
+# on, when LIST_SHARDS is set; the map of which list is where stays in the
+# default database. Queries only know their list when they're given an
+# instance to go on - a related manager, or saving - so the rest say which
+# database they want with using(); see lists.shards
+class ListShardRouter:
+	def _db_for(self, model, instance=None, **hints):
+		if not settings.LIST_SHARDS or model._meta.app_label != 'lists':
+			return None
+		name = model._meta.model_name
+		if name == 'listshard':
+			return DEFAULT_DB_ALIAS
+		if name not in SHARDED_MODELS or instance is None:
+			return None
+		if instance._state.db:
+			return instance._state.db
+		list_id = instance.pk if instance._meta.model_name == 'list' else getattr(instance, 'list_id', None)
+		if list_id is None:
+			return None
+		from lists.shards import shard_map
+		return shard_map.db_for_list(list_id)
+
+	db_for_read = _db_for
+	db_for_write = _db_for
+
+	def allow_syncdb(self, db, model):
+		if not settings.LIST_SHARDS or model._meta.app_label != 'lists':
+			return None
+		if model._meta.model_name == 'listshard':
+			return db == DEFAULT_DB_ALIAS
+		return db in settings.LIST_SHARDS
@@ -0,0 +1,188 @@
+# Lists sharded across several databases. With LIST_SHARDS set, every list -
+# and its items and search terms, which never reach outside it - lives on one
+# of those databases, and the default database keeps a ListShard row per list
+# saying which. List ids come from those rows, so they're unique across every
+# shard and list URLs stay the same wherever a list lives. New lists go to
+# shard `id % N`; rebalance_shards moves them about after that. Handing out
+# the id is a write to the default database, so creating a list writes to two
+# databases, and every new list still queues on the default one's writer lock.
+#
+# Without LIST_SHARDS everything is on the default database, as before, and
+# none of this costs a query.
+import heapq
+import itertools
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.http import Http404
+from lists.models import ArchivedList, Item, ItemTerm, List, ListShard
+
+# Lists whose shard is remembered by each process, between clearing out
+SHARD_MAP_ENTRIES = 100000
+
+
+def enabled():
+	return bool(settings.LIST_SHARDS)
+
+# Every database lists are kept on
+def databases():
+	return tuple(settings.LIST_SHARDS) or (DEFAULT_DB_ALIAS,)
+
+
+class ShardMap:
+	def __init__(self):
+		self._shards = {}
+
+	def db_for_list(self, list_id):
+		if not enabled():
+			return DEFAULT_DB_ALIAS
+		list_id = int(list_id)
+		try:
+			return self._shards[list_id]
+		except KeyError:
+			pass
+		shard = ListShard.objects.filter(id=list_id).values_list('shard', flat=True).first()
+		if shard is None:
+			return self.home_shard(list_id) # no such list: anywhere will say so
+		if len(self._shards) >= SHARD_MAP_ENTRIES:
+			self._shards.clear()
+		self._shards[list_id] = shard
+		return shard
+
+	def home_shard(self, list_id):
+		return settings.LIST_SHARDS[list_id % len(settings.LIST_SHARDS)]
+
+	# An id and a database for a new list. The id is None without sharding,
+	# for the database to pick as usual. With it, every new list costs an
+	# INSERT and an UPDATE on the default database before the list itself is
+	# written - the shard depends on the id the INSERT hands out - so they
+	# share a transaction, and a single commit
+	def allocate(self):
+		if not enabled():
+			return None, DEFAULT_DB_ALIAS
+		with transaction.atomic(using=DEFAULT_DB_ALIAS):
+			entry = ListShard.objects.create(shard='')
+			entry.shard = self.home_shard(entry.id)
+			entry.save(update_fields=['shard'])
+		self._shards[entry.id] = entry.shard
+		return entry.id, entry.shard
+
+	def moved(self, list_id, shard):
+		ListShard.objects.filter(id=list_id).update(shard=shard)
+		self._shards[list_id] = shard
+
+	# Another process may have moved the list since we looked
+	def forget(self, list_id):
+		self._shards.pop(int(list_id), None)
+
+	def clear(self):
+		self._shards.clear()
+
+shard_map = ShardMap()
+
+
+def create_list(**fields):
+	list_id, db = shard_map.allocate()
+	return List.objects.using(db).create(id=list_id, **fields)
+
+def get_list(list_id):
+	db = shard_map.db_for_list(list_id)
+	try:
+		return List.objects.using(db).get(id=list_id)
+	except List.DoesNotExist:
+		if not enabled():
+			raise
+		shard_map.forget(list_id)
+		if shard_map.db_for_list(list_id) == db:
+			raise
+		return List.objects.using(shard_map.db_for_list(list_id)).get(id=list_id)
+
+def get_list_or_404(list_id):
+	try:
+		return get_list(list_id)
+	except List.DoesNotExist:
+		raise Http404('No such list')
+
+# in_bulk across shards: a query per shard the lists are on. As with
+# get_list, any that weren't where the shard map said are looked up again
+def in_bulk(list_ids):
+	lists = _in_bulk(list_ids)
+	missing = [list_id for list_id in list_ids if list_id not in lists]
+	if missing and enabled():
+		for list_id in missing:
+			shard_map.forget(list_id)
+		lists.update(_in_bulk(missing))
+	return lists
+
+def _in_bulk(list_ids):
+	by_db = {}
+	for list_id in list_ids:
+		by_db.setdefault(shard_map.db_for_list(list_id), []).append(list_id)
+	lists = {}
+	for db, ids in by_db.items():
+		lists.update(List.objects.using(db).in_bulk(ids))
+	return lists
+
+# The most recently updated lists on every shard, merged
+def recent_lists(count):
+	per_shard = [
+		List.objects.using(db).order_by('-updated_at')[:count]
+		for db in databases()
+	]
+	if len(per_shard) == 1:
+		return per_shard[0]
+	merged = heapq.merge(*[
+		[(-list_.updated_at.timestamp(), list_.id, list_) for list_ in lists]
+		for lists in per_shard
+	])
+	return [list_ for _, _, list_ in itertools.islice(merged, count)]
+
+
+# Copies a list to another shard and then deletes it from the one it was on.
+# Items get new ids on the way, and the list a new version, so nothing cached
+# against the old ones is served again. If the list is written to while it's
+# being copied, the copy is thrown away and made again. A writer still
+# holding the list from before it moved can't leave items behind on the
+# source either: its write rolls back when it finds the list gone, and is
+# made again on the target (see List.touch). An archived list goes still
+# archived
+def move_list(list_id, target, attempts=3):
+	source = shard_map.db_for_list(list_id)
+	if source == target:
+		return False
+	for _ in range(attempts):
+		list_ = List.objects.using(source).get(id=list_id)
+		items = list(list_.item_set.all())
+		archived = ArchivedList.objects.using(source).filter(pk=list_id).first()
+		with transaction.atomic(using=target):
+			copy = List(**dict((field.attname, getattr(list_, field.attname)) for field in List._meta.fields))
+			copy.version += 1
+			copy.save(using=target, force_insert=True)
+			copies = [
+				Item(list=copy, text=item.text, text_hash=item.text_hash, position=item.position)
+				for item in items
+			]
+			Item.objects.using(target).bulk_create(copies, batch_size=settings.BULK_BATCH_SIZE)
+			copy._fill_in_ids(copies)
+			ItemTerm.index_items(copies, using=target)
+			if archived is not None:
+				ArchivedList.objects.using(target).create(
+					list=copy, data=archived.data, archived_at=archived.archived_at)
+
+		with transaction.atomic(using=source):
+			# the UPDATE holds the list's write lock until the list is gone
+			unchanged = List.objects.using(source).filter(id=list_id, version=list_.version).update(
+				version=models.F('version'))
+			if unchanged:
+				shard_map.moved(list_id, target)
+				_delete_list(list_id, source)
+				return True
+		_delete_list(list_id, target)
+	raise RuntimeError('List %d kept changing while it was moved' % (list_id,))
+
+def _delete_list(list_id, db):
+	with transaction.atomic(using=db):
+		ItemTerm.objects.using(db).filter(list_id=list_id).delete()
+		Item.objects.using(db).filter(list_id=list_id).delete()
+		ArchivedList.objects.using(db).filter(pk=list_id).delete()
+		List.objects.using(db).filter(id=list_id).delete()
@@ -0,0 +1,20 @@
+// Adds items to the list table as they're added elsewhere, from the list's
+// server-sent events. Only the last page of a list carries data-events.
+(function () {
+	var table = document.getElementById('id_list_table');
+	if (!table || !table.getAttribute('data-events') || !window.EventSource) {
+		return;
+	}
+	var rows = parseInt(table.getAttribute('data-rows'), 10);
+	var seen = {};
+	var events = new EventSource(table.getAttribute('data-events'));
+	events.addEventListener('item', function (event) {
+		var item = JSON.parse(event.data);
+		if (seen[item.id]) {
+			return;
+		}
+		seen[item.id] = true;
+		rows += 1;
+		table.insertRow(-1).insertCell(0).textContent = rows + ': ' + item.text;
+	});
+})();
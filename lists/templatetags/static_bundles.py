@@ -0,0 +1,16 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+# The one built bundle when the static pipeline is on, or each of the files
+# it's made from when it isn't (and there may be no bundle yet)
+@register.simple_tag
+def stylesheets(bundle):
+	names = [bundle] if settings.STATIC_PIPELINE else settings.STATIC_BUNDLES[bundle]
+	return format_html_join(
+		'\n', '<link href="{0}" rel="stylesheet" media="screen">',
+		((static(name),) for name in names)
+	)
\ No newline at end of file
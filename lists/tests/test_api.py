@@ -0,0 +1,226 @@
+import json
+from unittest.mock import patch
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from lists.models import Item, List, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR, POSITION_GAP
+
+class ApiTestCase(TestCase):
+	def post_json(self, url, data):
+		return self.client.post(url, data=json.dumps(data), content_type='application/json')
+
+	def json(self, response):
+		return json.loads(b''.join(response).decode() if response.streaming else response.content.decode())
+
+
+class CreateListApiTest(ApiTestCase):
+
+	def test_creates_list_with_a_batch_of_items(self):
+		response = self.post_json('/api/lists/', {'items': ['one', '', 'two', 'one']})
+
+		list_ = List.objects.get()
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(self.json(response), {
+			'id': list_.id,
+			'url': '/lists/%d/' % (list_.id,),
+			'added': 2,
+			'rejected': [
+				{'index': 1, 'text': '', 'error': EMPTY_LIST_ERROR},
+				{'index': 3, 'text': 'one', 'error': DUPLICATE_ITEM_ERROR},
+			],
+		})
+		self.assertEqual([item.text for item in list_.item_set.all()], ['one', 'two'])
+
+	def test_accepts_a_single_text(self):
+		response = self.post_json('/api/lists/', {'text': 'just one'})
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(Item.objects.get().text, 'just one')
+
+	def test_does_not_create_a_list_without_items(self):
+		response = self.post_json('/api/lists/', {'text': ''})
+
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(self.json(response)['rejected'][0]['error'], EMPTY_LIST_ERROR)
+		self.assertEqual(List.objects.count(), 0)
+
+	def test_rejects_malformed_bodies(self):
+		response = self.client.post('/api/lists/', data='nope', content_type='application/json')
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('error', self.json(response))
+
+
+class ListItemsApiTest(ApiTestCase):
+
+	def test_appends_items(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='old')
+		response = self.post_json('/api/lists/%d/items' % (list_.id,), {'items': ['new', 'old']})
+
+		self.assertEqual(self.json(response), {
+			'added': 1,
+			'rejected': [{'index': 1, 'text': 'old', 'error': DUPLICATE_ITEM_ERROR}],
+		})
+		self.assertEqual(list_.item_set.count(), 2)
+
+	def test_duplicate_single_item_is_a_bad_request(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='old')
+		response = self.post_json('/api/lists/%d/items' % (list_.id,), {'text': 'old'})
+		self.assertEqual(response.status_code, 400)
+
+	@override_settings(LIST_PAGE_SIZE=2)
+	def test_pages_through_items_with_a_cursor(self):
+		list_ = List.objects.create()
+		items = [Item.objects.create(list=list_, text='item %d' % (i,)) for i in range(3)]
+
+		page = self.json(self.client.get('/api/lists/%d/items' % (list_.id,)))
+		self.assertEqual(page['items'], [
+			{'id': items[0].id, 'text': 'item 0'},
+			{'id': items[1].id, 'text': 'item 1'},
+		])
+		self.assertEqual(page['next'], '%d.%d' % (items[1].position, items[1].id))
+
+		page = self.json(self.client.get('/api/lists/%d/items?after=%s' % (list_.id, page['next'])))
+		self.assertEqual(page['items'], [{'id': items[2].id, 'text': 'item 2'}])
+		self.assertIsNone(page['next'])
+
+	def test_unknown_list_is_not_found(self):
+		response = self.client.get('/api/lists/999/items')
+		self.assertEqual(response.status_code, 404)
+
+
+class MoveItemApiTest(ApiTestCase):
+
+	def setUp(self):
+		self.list_ = List.objects.create()
+		self.items, _ = self.list_.add_items(['item 0', 'item 1', 'item 2'])
+
+	def move(self, item, data):
+		return self.post_json('/api/lists/%d/items/%d/move' % (self.list_.id, item.id), data)
+
+	def test_moves_an_item_before_another(self):
+		response = self.move(self.items[2], {'before': self.items[0].id})
+		self.assertEqual(self.json(response)['id'], self.items[2].id)
+		self.assertEqual([item.text for item in self.list_.item_set.all()], ['item 2', 'item 0', 'item 1'])
+
+	def test_moves_an_item_after_another(self):
+		self.move(self.items[0], {'after': self.items[1].id})
+		self.assertEqual([item.text for item in self.list_.item_set.all()], ['item 1', 'item 0', 'item 2'])
+
+	def test_rejects_a_move_without_a_target(self):
+		response = self.move(self.items[0], {'to': 1})
+		self.assertEqual(response.status_code, 400)
+
+	def test_target_must_be_on_the_same_list(self):
+		other = Item.objects.create(list=List.objects.create(), text='elsewhere')
+		response = self.move(self.items[0], {'before': other.id})
+		self.assertEqual(response.status_code, 404)
+
+
+class StreamItemsApiTest(ApiTestCase):
+
+	@override_settings(LIST_PAGE_SIZE=2)
+	def test_streams_the_whole_list(self):
+		list_ = List.objects.create()
+		list_.add_items(['item %d' % (i,) for i in range(450)])
+		response = self.client.get('/api/lists/%d/items/stream' % (list_.id,))
+
+		self.assertTrue(response.streaming)
+		data = self.json(response)
+		self.assertEqual(data['list'], list_.id)
+		self.assertEqual(len(data['items']), 450)
+		self.assertEqual(data['items'][-1]['text'], 'item 449')
+
+	@patch('lists.api.STREAM_CHUNK_SIZE', 100)
+	def test_reads_the_list_a_chunk_at_a_time(self):
+		list_ = List.objects.create()
+		list_.add_items(['item %d' % (i,) for i in range(450)])
+		response = self.client.get('/api/lists/%d/items/stream' % (list_.id,))
+		with CaptureQueriesContext(connection) as queries:
+			data = self.json(response)
+
+		self.assertEqual([item['text'] for item in data['items']], ['item %d' % (i,) for i in range(450)])
+		self.assertEqual(len(queries), 5)
+		for query in queries:
+			self.assertIn('LIMIT 100', query['sql'])
+
+	@patch('lists.api.STREAM_CHUNK_SIZE', 2)
+	def test_streams_items_that_share_a_position(self):
+		list_ = List.objects.create()
+		list_.add_items(['item %d' % (i,) for i in range(5)])
+		Item.objects.filter(list=list_).update(position=POSITION_GAP)
+		data = self.json(self.client.get('/api/lists/%d/items/stream' % (list_.id,)))
+		self.assertEqual([item['text'] for item in data['items']], ['item %d' % (i,) for i in range(5)])
+
+	def test_streams_an_empty_list(self):
+		list_ = List.objects.create()
+		response = self.client.get('/api/lists/%d/items/stream' % (list_.id,))
+		self.assertEqual(self.json(response), {'list': list_.id, 'items': []})
+
+
+class BulkAddItemsApiTest(ApiTestCase):
+
+	def test_adds_json_array_of_items_and_reports_rejects(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='old')
+		response = self.client.post(
+			'/lists/%d/items/bulk' % (list_.id,),
+			data=json.dumps(['new', '', 'old']),
+			content_type='application/json'
+		)
+
+		self.assertEqual(json.loads(response.content.decode()), {
+			'added': 1,
+			'rejected': [
+				{'index': 1, 'text': '', 'error': EMPTY_LIST_ERROR},
+				{'index': 2, 'text': 'old', 'error': DUPLICATE_ITEM_ERROR},
+			],
+		})
+		self.assertEqual(list_.item_set.count(), 2)
+
+	def test_adds_one_item_per_line_of_form_field(self):
+		list_ = List.objects.create()
+		self.client.post(
+			'/lists/%d/items/bulk' % (list_.id,),
+			data={'items': 'first\nsecond\n'}
+		)
+		self.assertEqual(
+			[item.text for item in list_.item_set.all()],
+			['first', 'second']
+		)
+
+	def test_form_posts_need_a_csrf_token(self):
+		list_ = List.objects.create()
+		client = Client(enforce_csrf_checks=True)
+		response = client.post('/lists/%d/items/bulk' % (list_.id,), data={'items': 'sneaky'})
+		self.assertEqual(response.status_code, 403)
+		self.assertEqual(list_.item_set.count(), 0)
+
+		response = client.post('/lists/%d/items/bulk' % (list_.id,),
+			data=json.dumps(['wanted']), content_type='application/json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(list_.item_set.count(), 1)
+
+	def test_json_endpoints_turn_away_other_content_types(self):
+		list_ = List.objects.create()
+		first, second = list_.add_items(['first', 'second'])[0]
+		client = Client(enforce_csrf_checks=True)
+		# what a cross-site <form enctype="text/plain"> can send
+		for url, body in (
+			('/api/lists/', {'items': ['sneaky']}),
+			('/api/lists/%d/items' % (list_.id,), {'items': ['sneaky']}),
+			('/api/lists/%d/items/%d/move' % (list_.id, second.id), {'before': first.id}),
+		):
+			response = client.post(url, data=json.dumps(body), content_type='text/plain')
+			self.assertEqual(response.status_code, 415)
+		self.assertEqual(List.objects.count(), 1)
+		self.assertEqual([item.text for item in list_.item_set.all()], ['first', 'second'])
+
+	def test_rejects_malformed_json(self):
+		list_ = List.objects.create()
+		response = self.client.post(
+			'/lists/%d/items/bulk' % (list_.id,),
+			data='{"not": "a list"}',
+			content_type='application/json'
+		)
+		self.assertEqual(response.status_code, 400)
@@ -0,0 +1,147 @@
+from datetime import timedelta
+from io import StringIO
+import json
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from lists import archive, transfer
+from lists.cache import fragments
+from lists.models import ArchivedList, Item, ItemTerm, List
+
+
+class ArchiveTest(TestCase):
+
+	def setUp(self):
+		fragments.clear()
+
+	def make_list(self, *texts, idle_days=0):
+		list_ = List.objects.create()
+		list_.add_items(list(texts))
+		List.objects.filter(pk=list_.pk).update(last_accessed=timezone.now() - timedelta(days=idle_days))
+		return List.objects.get(pk=list_.pk)
+
+	def archive(self, days=30):
+		out = StringIO()
+		call_command('archive_lists', days=days, stdout=out)
+		return out.getvalue()
+
+	def test_command_archives_only_idle_lists(self):
+		idle = self.make_list('buy milk', 'walk dog', idle_days=60)
+		busy = self.make_list('feed cat')
+		output = self.archive()
+
+		self.assertIn('Archived 1 lists (2 items)', output)
+		self.assertTrue(List.objects.get(pk=idle.pk).archived)
+		self.assertFalse(List.objects.get(pk=busy.pk).archived)
+		self.assertEqual([item.text for item in Item.objects.all()], ['feed cat'])
+		self.assertFalse(ItemTerm.objects.filter(list=idle).exists())
+		self.assertEqual([row[1] for row in ArchivedList.objects.get(pk=idle.pk).unpack()], ['buy milk', 'walk dog'])
+
+	def test_archiving_runs_in_batches(self):
+		for i in range(5):
+			self.make_list('item %d' % (i,), idle_days=60)
+		out = StringIO()
+		call_command('archive_lists', days=30, batch_size=2, verbosity=2, stdout=out)
+		self.assertEqual(out.getvalue().count('Archived 2 lists on default'), 2)
+		self.assertEqual(ArchivedList.objects.count(), 5)
+
+	def test_archived_list_keeps_its_url_and_preview(self):
+		list_ = self.make_list('buy milk', idle_days=60)
+		self.archive()
+		response = self.client.get('/lists/')
+		self.assertContains(response, 'buy milk')
+		self.assertFalse(Item.objects.exists())
+
+	def test_viewing_an_archived_list_brings_it_back(self):
+		list_ = self.make_list('buy milk', 'walk dog', idle_days=60)
+		self.archive()
+		response = self.client.get('/lists/%d/' % (list_.id,))
+
+		self.assertContains(response, '1: buy milk')
+		self.assertContains(response, '2: walk dog')
+		list_ = List.objects.get(pk=list_.pk)
+		self.assertFalse(list_.archived)
+		self.assertFalse(ArchivedList.objects.exists())
+		self.assertEqual(ItemTerm.search('milk', list_=list_)[0][0][0].text, 'buy milk')
+
+	def test_rehydrated_list_takes_new_items(self):
+		list_ = self.make_list('buy milk', 'walk dog', idle_days=60)
+		self.archive()
+		response = self.client.post('/api/lists/%d/items' % (list_.id,),
+			data=json.dumps({'items': ['walk dog', 'feed cat']}), content_type='application/json')
+		self.assertEqual(json.loads(response.content.decode())['added'], 1)
+		self.assertEqual([item.text for item in list_.item_set.all()], ['buy milk', 'walk dog', 'feed cat'])
+
+	@override_settings(LISTS_FAST_WRITES=True)
+	def test_writers_holding_a_list_from_before_it_was_archived_bring_it_back(self):
+		list_ = self.make_list('buy milk', idle_days=60)
+		self.archive()
+		Item(list=list_, text='walk dog').save()
+		list_.add_items(['feed cat'])
+
+		list_ = List.objects.get(pk=list_.pk)
+		self.assertFalse(list_.archived)
+		self.assertFalse(ArchivedList.objects.exists())
+		self.assertEqual([item.text for item in list_.item_set.all()], ['buy milk', 'walk dog', 'feed cat'])
+		self.assertEqual(list_.item_count, 3)
+
+	def test_rehydrating_serves_nothing_cached_from_before(self):
+		list_ = self.make_list('buy milk', idle_days=60)
+		etag = self.client.get('/lists/%d/' % (list_.id,))['ETag']
+		List.objects.filter(pk=list_.pk).update(last_accessed=timezone.now() - timedelta(days=60))
+		self.archive()
+		response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+
+	def test_not_modified_answers_still_count_as_an_access(self):
+		list_ = self.make_list('buy milk', idle_days=1)
+		etag = self.client.get('/lists/%d/' % (list_.id,))['ETag']
+		List.objects.filter(pk=list_.pk).update(last_accessed=timezone.now() - timedelta(days=1))
+		with self.assertNumQueries(2):
+			response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(archive.idle_lists('default', timezone.now() - timedelta(hours=1), 10), [])
+
+		# and no more often than any other access
+		with self.assertNumQueries(1):
+			response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+
+	def test_a_list_looked_at_after_being_picked_is_left_alone(self):
+		list_ = self.make_list('buy milk', idle_days=60)
+		cutoff = timezone.now() - timedelta(days=30)
+		ids = archive.idle_lists('default', cutoff, 10)
+		List.objects.filter(pk=list_.pk).update(last_accessed=timezone.now())
+		self.assertEqual(archive.archive_lists('default', ids, cutoff), (0, 0))
+		self.assertEqual(Item.objects.count(), 1)
+
+	@override_settings(LIST_ACCESS_RESOLUTION=3600)
+	def test_last_access_is_only_written_once_it_is_out_of_date(self):
+		list_ = self.make_list('buy milk')
+		with self.assertNumQueries(0):
+			list_.mark_accessed()
+
+		list_ = self.make_list('walk dog', idle_days=1)
+		list_.mark_accessed()
+		self.assertGreater(List.objects.get(pk=list_.pk).last_accessed, timezone.now() - timedelta(minutes=1))
+
+	def test_export_includes_archived_items(self):
+		list_ = self.make_list('buy milk', idle_days=60)
+		self.archive()
+		records = list(transfer.export_records())
+		self.assertEqual(records[-1][2:], (list_.id, 'buy milk'))
+
+	def test_stats_report_the_hot_tables_and_the_archive(self):
+		self.make_list('buy milk', 'walk dog', idle_days=60)
+		self.make_list('feed cat')
+		before = archive.stats()
+		self.archive()
+		stats = archive.stats()
+
+		self.assertEqual(stats['default']['lists'], 1)
+		self.assertEqual(stats['default']['items'], 1)
+		self.assertEqual(stats['default']['archived_lists'], 1)
+		self.assertGreater(stats['default']['archived_bytes'], 0)
+		self.assertEqual(stats['archived'], before['archived'] + 1)
@@ -0,0 +1,50 @@
+from django.test import TestCase
+from unittest.mock import patch
+from lists.cache import LRUCache, cached_fragment, fragments, stats
+
+class LRUCacheTest(TestCase):
+	def make_cache(self, **options):
+		cache = LRUCache('test-lru', {'OPTIONS': options})
+		cache.clear()
+		return cache
+
+	def test_evicts_least_recently_used_entry(self):
+		cache = self.make_cache(MAX_ENTRIES=2)
+		cache.set('a', 1)
+		cache.set('b', 2)
+		cache.get('a')
+		cache.set('c', 3)
+
+		self.assertEqual(cache.get('a'), 1)
+		self.assertIsNone(cache.get('b'))
+		self.assertEqual(cache.get('c'), 3)
+
+	def test_entries_expire_after_their_timeout(self):
+		cache = self.make_cache()
+		with patch('lists.cache.time.time', return_value=1000):
+			cache.set('a', 1, timeout=10)
+		with patch('lists.cache.time.time', return_value=1005):
+			self.assertEqual(cache.get('a'), 1)
+		with patch('lists.cache.time.time', return_value=1010):
+			self.assertIsNone(cache.get('a'))
+
+	def test_add_only_sets_missing_keys(self):
+		cache = self.make_cache()
+		self.assertTrue(cache.add('a', 1))
+		self.assertFalse(cache.add('a', 2))
+		self.assertEqual(cache.get('a'), 1)
+
+class CachedFragmentTest(TestCase):
+	def setUp(self):
+		fragments.clear()
+
+	def test_renders_once_then_counts_hits(self):
+		before = stats()
+		render = lambda: '<table></table>'
+		cached_fragment('some-key', render)
+		fragment = cached_fragment('some-key', lambda: self.fail('should be cached'))
+
+		self.assertEqual(fragment, '<table></table>')
+		after = stats()
+		self.assertEqual(after['misses'] - before['misses'], 1)
+		self.assertEqual(after['hits'] - before['hits'], 1)
\ No newline at end of file
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import override_settings, CaptureQueriesContext
 from lists.forms import EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR, ItemForm, ExistingListItemForm
 from lists.models import Item, List
 
@@ -42,8 +44,43 @@ class ExistingListItemFormTest(TestCase):
 		self.assertFalse(form.is_valid())
 		self.assertEqual(form.errors['text'], [DUPLICATE_ITEM_ERROR])
 
+	@override_settings(ITEM_TEXT_FOLDING=True)
+	def test_duplicate_check_compares_text_hashes(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='no dupes yo')
+		form = ExistingListItemForm(for_list=list_, data={'text': 'No  Dupes yo'})
+		with CaptureQueriesContext(connection) as queries:
+			self.assertFalse(form.is_valid())
+		self.assertEqual(form.errors['text'], [DUPLICATE_ITEM_ERROR])
+		self.assertEqual(len(queries), 1)
+		self.assertIn('text_hash', queries[0]['sql'])
+
 	def test_form_save(self):
 		list_ = List.objects.create()
 		form = ExistingListItemForm(for_list=list_, data={'text': 'some text'})
 		new_item = form.save()
-		self.assertEqual(new_item, Item.objects.all()[0])
\ No newline at end of file
+		self.assertEqual(new_item, Item.objects.all()[0])
+
+@override_settings(LISTS_FAST_WRITES=True)
+class FastWriteExistingListItemFormTest(TestCase):
+	def test_save_does_not_select_for_duplicates_first(self):
+		list_ = List.objects.create()
+		form = ExistingListItemForm(for_list=list_, data={'text': 'some text'})
+		with CaptureQueriesContext(connection) as queries:
+			self.assertTrue(form.is_valid())
+			new_item = form.save()
+
+		self.assertEqual(new_item, Item.objects.all()[0])
+		selects = [q['sql'] for q in queries if 'SELECT' in q['sql']]
+		self.assertFalse([sql for sql in selects if 'text_hash' in sql])
+		self.assertFalse([sql for sql in selects if 'FROM "lists_list"' in sql])
+
+	def test_duplicate_turned_away_by_database_becomes_form_error(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='no dupes yo')
+		form = ExistingListItemForm(for_list=list_, data={'text': 'no dupes yo'})
+
+		self.assertTrue(form.is_valid())
+		self.assertIsNone(form.save())
+		self.assertEqual(form.errors['text'], [DUPLICATE_ITEM_ERROR])
+		self.assertEqual(Item.objects.count(), 1)
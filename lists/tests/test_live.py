@@ -0,0 +1,121 @@
+import http.client
+import socket
+import threading
+from urllib.parse import urlsplit
+from django.test import LiveServerTestCase, TestCase
+from django.test.utils import override_settings
+from lists.live import LocalHub, PollingHub
+from lists.models import Item, List
+
+class LocalHubTest(TestCase):
+
+	def test_publish_wakes_waiters_on_that_list(self):
+		hub = LocalHub()
+		marker = hub.marker(1)
+		threading.Timer(0.05, hub.publish, args=(1,)).start()
+		self.assertNotEqual(hub.wait(1, marker, timeout=5), marker)
+
+	def test_wait_times_out_without_a_publish(self):
+		hub = LocalHub()
+		hub.publish(2)
+		marker = hub.marker(1)
+		self.assertEqual(hub.wait(1, marker, timeout=0.01), marker)
+
+
+class PollingHubTest(TestCase):
+
+	@override_settings(LIVE_POLL_SECONDS=0.01)
+	def test_marker_follows_the_list_version(self):
+		hub = PollingHub()
+		list_ = List.objects.create()
+		marker = hub.marker(list_.id)
+		self.assertEqual(hub.wait(list_.id, marker, timeout=0.01), marker)
+
+		Item.objects.create(list=list_, text='item 1')
+		self.assertNotEqual(hub.wait(list_.id, marker, timeout=1), marker)
+
+
+@override_settings(LIVE_UPDATES=True, LIVE_STREAM_SECONDS=0)
+class ListEventsTest(TestCase):
+
+	def events(self, list_, **extra):
+		response = self.client.get('/lists/%d/events' % (list_.id,), **extra)
+		self.assertEqual(response['Content-Type'], 'text/event-stream')
+		return b''.join(response.streaming_content).decode()
+
+	def test_sends_items_after_the_given_one(self):
+		list_ = List.objects.create()
+		item1 = Item.objects.create(list=list_, text='item 1')
+		item2 = Item.objects.create(list=list_, text='item 2')
+		response = self.client.get('/lists/%d/events?after=%d' % (list_.id, item1.id))
+
+		self.assertEqual(
+			b''.join(response.streaming_content).decode(),
+			'retry: 2000\n\n'
+			'id: %d\nevent: item\ndata: {"id": %d, "text": "item 2"}\n\n' % (item2.id, item2.id)
+		)
+
+	def test_resumes_from_last_event_id(self):
+		list_ = List.objects.create()
+		item1 = Item.objects.create(list=list_, text='item 1')
+		Item.objects.create(list=list_, text='item 2')
+		events = self.events(list_, HTTP_LAST_EVENT_ID=str(item1.id))
+
+		self.assertNotIn('item 1', events)
+		self.assertIn('item 2', events)
+
+	def test_only_new_items_without_a_starting_point(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		self.assertNotIn('item 1', self.events(list_))
+
+	@override_settings(LIVE_STREAM_SECONDS=5, LIVE_KEEPALIVE_SECONDS=5)
+	def test_sends_items_added_after_connecting(self):
+		list_ = List.objects.create()
+		stream = self.client.get('/lists/%d/events?after=0' % (list_.id,)).streaming_content
+		next(stream) # retry
+
+		Item.objects.create(list=list_, text='new')
+		self.assertIn('"text": "new"', next(stream).decode())
+
+	def test_list_page_points_its_last_page_at_the_events(self):
+		list_ = List.objects.create()
+		item = Item.objects.create(list=list_, text='item 1')
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		self.assertContains(
+			response,
+			'data-events="/lists/%d/events?after=%d" data-rows="1"' % (list_.id, item.id)
+		)
+
+	def test_live_updates_are_off_unless_asked_for(self):
+		list_ = List.objects.create()
+		with self.settings(LIVE_UPDATES=False):
+			self.assertEqual(self.client.get('/lists/%d/events' % (list_.id,)).status_code, 404)
+			self.assertNotContains(self.client.get('/lists/%d/' % (list_.id,)), 'live.js')
+		self.assertContains(self.client.get('/lists/%d/' % (list_.id,)), 'live.js')
+
+
+# Django's test server handles one request at a time, like a synchronous
+# worker - so it shows whether an open stream holds the worker up
+@override_settings(LIVE_UPDATES=True)
+class ListEventsServerTest(LiveServerTestCase):
+
+	def test_other_requests_are_served_while_a_stream_is_open(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		netloc = urlsplit(self.live_server_url).netloc
+		stream = http.client.HTTPConnection(netloc, timeout=10)
+		stream.request('GET', '/lists/%d/events?after=0' % (list_.id,))
+		response = stream.getresponse()
+		self.assertEqual(response.status, 200)
+
+		# read until the server hangs up, which it only does once it's through
+		# with the request - database and all - so none of it runs into the
+		# test's teardown
+		page = socket.create_connection(tuple(netloc.split(':')), timeout=5)
+		page.sendall(('GET /lists/%d/ HTTP/1.0\r\n\r\n' % (list_.id,)).encode())
+		reply = b''.join(iter(lambda: page.recv(65536), b''))
+		page.close()
+		self.assertIn(b' 200 ', reply.split(b'\r\n', 1)[0])
+		self.assertIn('item 1', response.read().decode())
+		stream.close()
@@ -1,5 +1,9 @@
+from io import StringIO
+from django.core.management import call_command, CommandError
+from django.db import connection
 from django.test import TestCase
-from lists.models import Item, List
+from django.test.utils import override_settings
+from lists.models import format_cursor, hash_text, parse_cursor, Item, List, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR, MAX_ID, POSITION_GAP
 from django.core.exceptions import ValidationError
 
 class ListAndItemModelTest(TestCase):
@@ -67,9 +71,214 @@ class ListAndItemModelTest(TestCase):
 			[item1, item2, item3]
 		)
 
+	def test_saving_an_item_bumps_the_list_version(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		Item.objects.create(list=list_, text='item 2')
+		self.assertEqual(List.objects.get(id=list_.id).version, 2)
+
+	@override_settings(BULK_BATCH_SIZE=2)
+	def test_add_items_inserts_in_batches_and_reports_rejects(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='already there')
+
+		# existing texts, then three batches of two rows each for the items,
+		# their ids and their search terms, a version bump, reading and saving
+		# the preview of a short list, and the savepoint around the lot
+		with self.assertNumQueries(15):
+			items, rejected = list_.add_items(
+				['a', '', 'b', 'already there', 'c', 'a', 'd', 'e']
+			)
+
+		self.assertEqual([item.text for item in items], ['a', 'b', 'c', 'd', 'e'])
+		self.assertEqual(rejected, [
+			(1, '', EMPTY_LIST_ERROR),
+			(3, 'already there', DUPLICATE_ITEM_ERROR),
+			(5, 'a', DUPLICATE_ITEM_ERROR),
+		])
+		self.assertEqual(
+			[item.text for item in list_.item_set.all()],
+			['already there', 'a', 'b', 'c', 'd', 'e']
+		)
+		self.assertEqual(List.objects.get(id=list_.id).version, 2)
+
 	# Test that an Item's str representation is its text
 	def test_string_representation(self):
 		list1 = List.objects.create()
 		item1 = Item.objects.create(list=list1, text='blah blah')
 
 		self.assertEqual(str(item1), item1.text)
+
+	@override_settings(LIST_PAGE_SIZE=2)
+	def test_items_page_walks_the_list_with_a_cursor(self):
+		list_ = List.objects.create()
+		items = [Item.objects.create(list=list_, text='item %d' % (i,)) for i in range(5)]
+
+		page, has_more = list_.items_page()
+		self.assertEqual(page, items[:2])
+		self.assertTrue(has_more)
+
+		page, has_more = list_.items_page(after=(items[3].position, items[3].id))
+		self.assertEqual(page, items[4:])
+		self.assertFalse(has_more)
+
+	@override_settings(LIST_PAGE_SIZE=2)
+	def test_items_sharing_a_position_are_paged_by_id(self):
+		list_ = List.objects.create()
+		items = [Item.objects.create(list=list_, text='item %d' % (i,), position=POSITION_GAP) for i in range(3)]
+
+		page, has_more = list_.items_page()
+		self.assertEqual(page, items[:2])
+		page, has_more = list_.items_page(after=(page[-1].position, page[-1].id))
+		self.assertEqual(page, items[2:])
+		self.assertFalse(has_more)
+
+	def test_cursors_read_from_urls(self):
+		self.assertEqual(parse_cursor('%d.7' % (POSITION_GAP,)), (POSITION_GAP, 7))
+		self.assertEqual(format_cursor((POSITION_GAP, 7)), '%d.7' % (POSITION_GAP,))
+		# links from before cursors had ids skip the whole of that position
+		self.assertEqual(parse_cursor(str(POSITION_GAP)), (POSITION_GAP, MAX_ID))
+		for value in (None, '', '0', 'bogus', '1.x'):
+			self.assertIsNone(parse_cursor(value))
+
+
+class ItemPositionTest(TestCase):
+	def make_list(self, count=3):
+		list_ = List.objects.create()
+		items, _ = list_.add_items(['item %d' % (i,) for i in range(count)])
+		return list_, items
+
+	def texts(self, list_):
+		return [item.text for item in list_.item_set.all()]
+
+	def test_new_items_go_a_gap_after_the_last(self):
+		list_, items = self.make_list(2)
+		item = Item.objects.create(list=list_, text='item 2')
+		self.assertEqual([i.position for i in items + [item]], [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP])
+
+	def test_moving_an_item_updates_only_its_own_row(self):
+		list_, items = self.make_list()
+		items[2].move(before=items[0])
+
+		self.assertEqual(self.texts(list_), ['item 2', 'item 0', 'item 1'])
+		self.assertEqual([item.position for item in list_.item_set.all()[1:]], [POSITION_GAP, 2 * POSITION_GAP])
+
+	def test_move_after_the_last_item(self):
+		list_, items = self.make_list()
+		items[0].move(after=items[2])
+		self.assertEqual(self.texts(list_), ['item 1', 'item 2', 'item 0'])
+
+	def test_moving_refreshes_the_preview_and_version(self):
+		list_, items = self.make_list()
+		items[1].move(before=items[0])
+		list_ = List.objects.get(id=list_.id)
+		self.assertEqual(list_.preview_texts, ['item 1', 'item 0', 'item 2'])
+		self.assertEqual(list_.version, 2)
+
+	def test_list_is_rebalanced_when_a_gap_runs_out(self):
+		list_, items = self.make_list()
+		Item.objects.filter(id=items[1].id).update(position=POSITION_GAP + 1)
+		items[2].move(after=items[0])
+
+		self.assertEqual(self.texts(list_), ['item 0', 'item 2', 'item 1'])
+		positions = [item.position for item in list_.item_set.all()]
+		self.assertEqual(positions, [POSITION_GAP, POSITION_GAP * 3 // 2, 2 * POSITION_GAP])
+
+	def test_moving_next_to_an_item_that_shares_its_position(self):
+		list_, items = self.make_list()
+		Item.objects.filter(id=items[1].id).update(position=POSITION_GAP)
+		items[2].move(after=items[0])
+
+		self.assertEqual(self.texts(list_), ['item 0', 'item 2', 'item 1'])
+		positions = [item.position for item in list_.item_set.all()]
+		self.assertEqual(len(set(positions)), 3)
+
+	def test_rebalance_command_only_touches_crowded_lists(self):
+		list_, items = self.make_list()
+		self.make_list()
+		Item.objects.filter(id=items[1].id).update(position=POSITION_GAP + 1)
+		out = StringIO()
+		call_command('rebalance_positions', stdout=out)
+
+		self.assertIn('Checked 2 lists, rebalanced 1', out.getvalue())
+		self.assertEqual(Item.objects.get(id=items[1].id).position, 2 * POSITION_GAP)
+
+	def test_rebalance_command_gives_unpositioned_items_positions(self):
+		list_, items = self.make_list()
+		Item.objects.filter(list=list_).update(position=0)
+		call_command('rebalance_positions', stdout=StringIO())
+
+		positions = [item.position for item in list_.item_set.all()]
+		self.assertEqual(positions, [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP])
+		self.assertEqual(self.texts(list_), ['item 0', 'item 1', 'item 2'])
+
+
+class TextHashTest(TestCase):
+
+	def test_items_are_stored_with_a_hash_of_their_text(self):
+		item = Item.objects.create(list=List.objects.create(), text='a long paragraph')
+		self.assertEqual(len(Item.objects.get(id=item.id).text_hash), 40)
+
+	def test_editing_an_item_rehashes_it(self):
+		item = Item.objects.create(list=List.objects.create(), text='before')
+		item.text = 'after'
+		item.save()
+		self.assertEqual(Item.objects.get(id=item.id).text_hash, hash_text('after'))
+
+	def test_texts_differing_in_case_are_different_items_by_default(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='Buy milk')
+		Item.objects.create(list=list_, text='buy milk')
+		self.assertEqual(list_.item_set.count(), 2)
+
+	@override_settings(ITEM_TEXT_FOLDING=True)
+	def test_folding_makes_case_and_spacing_duplicates(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='Buy milk')
+		with self.assertRaises(ValidationError):
+			Item.objects.create(list=list_, text='  buy   MILK ')
+		items, rejected = list_.add_items(['BUY MILK', 'bread'])
+		self.assertEqual(rejected, [(0, 'BUY MILK', DUPLICATE_ITEM_ERROR)])
+
+	def test_backfill_fills_in_missing_hashes(self):
+		first = Item.objects.create(list=List.objects.create(), text='one')
+		second = Item.objects.create(list=List.objects.create(), text='two')
+		Item.objects.update(text_hash='')
+		out = StringIO()
+		call_command('backfill_text_hashes', batch_size=1, stdout=out)
+
+		self.assertIn('Checked 2 items, updated 2', out.getvalue())
+		self.assertEqual(Item.objects.get(id=first.id).text_hash, hash_text('one'))
+		self.assertEqual(Item.objects.get(id=second.id).text_hash, hash_text('two'))
+
+	def test_backfill_swaps_the_old_unique_text_index_for_the_hash(self):
+		# the item table as syncdb made it before there were text hashes
+		cursor = connection.cursor()
+		cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lists_item'")
+		create = cursor.fetchone()[0].replace('UNIQUE ("list_id", "text_hash")', 'UNIQUE ("list_id", "text")')
+		cursor.execute('DROP TABLE lists_item')
+		cursor.execute(create)
+		item = Item.objects.create(list=List.objects.create(), text='one', position=5)
+		out = StringIO()
+		call_command('backfill_text_hashes', stdout=out)
+
+		self.assertIn('Rebuilt lists_item on default', out.getvalue())
+		cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lists_item'")
+		create = cursor.fetchone()[0]
+		self.assertIn('UNIQUE ("list_id", "text_hash")', create)
+		self.assertNotIn('UNIQUE ("list_id", "text")', create)
+		cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'lists_item'")
+		self.assertEqual(cursor.fetchone()[0], 4) # the constraint's, and the model's three
+		saved = Item.objects.get(id=item.id)
+		self.assertEqual((saved.text, saved.text_hash, saved.position), ('one', hash_text('one'), 5))
+
+		out = StringIO()
+		call_command('backfill_text_hashes', stdout=out)
+		self.assertNotIn('Rebuilt', out.getvalue())
+
+	def test_backfill_refuses_to_fold_texts_into_duplicates(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='Buy milk')
+		Item.objects.create(list=list_, text='buy milk')
+		with override_settings(ITEM_TEXT_FOLDING=True), self.assertRaises(CommandError):
+			call_command('backfill_text_hashes', stdout=StringIO())
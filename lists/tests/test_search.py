@@ -0,0 +1,129 @@
+import json
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from lists.models import Item, ItemTerm, List
+
+class SearchIndexTest(TestCase):
+
+	def search_texts(self, query, **kwargs):
+		results, _ = ItemTerm.search(query, **kwargs)
+		return [item.text for item, _ in results]
+
+	def test_saving_an_item_indexes_its_words(self):
+		list_ = List.objects.create()
+		item = Item.objects.create(list=list_, text='Buy peacock feathers, buy!')
+		self.assertEqual(
+			sorted(ItemTerm.objects.filter(item=item).values_list('term', flat=True)),
+			['buy', 'feathers', 'peacock']
+		)
+
+	def test_changing_an_items_text_reindexes_it(self):
+		item = Item.objects.create(list=List.objects.create(), text='old words')
+		item.text = 'new words'
+		item.save()
+		self.assertEqual(self.search_texts('old'), [])
+		self.assertEqual(self.search_texts('new'), ['new words'])
+
+	def test_bulk_added_items_are_indexed(self):
+		list_ = List.objects.create()
+		list_.add_items(['buy milk', 'make tea'])
+		self.assertEqual(self.search_texts('tea'), ['make tea'])
+
+	def test_ranks_items_matching_more_words_first(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='buy milk')
+		Item.objects.create(list=list_, text='buy bread and milk')
+		Item.objects.create(list=list_, text='drink milk')
+		Item.objects.create(list=list_, text='read a book')
+
+		self.assertEqual(
+			self.search_texts('buy milk'),
+			['buy bread and milk', 'buy milk', 'drink milk']
+		)
+
+	def test_prefix_queries(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='peacock feathers')
+		Item.objects.create(list=list_, text='peas')
+		Item.objects.create(list=list_, text='apples')
+
+		self.assertEqual(self.search_texts('pea*'), ['peas', 'peacock feathers'])
+		self.assertEqual(self.search_texts('pea'), [])
+
+	def test_can_search_one_list(self):
+		list1 = List.objects.create()
+		list2 = List.objects.create()
+		Item.objects.create(list=list1, text='milk')
+		Item.objects.create(list=list2, text='more milk')
+
+		self.assertEqual(self.search_texts('milk', list_=list1), ['milk'])
+		self.assertEqual(self.search_texts('milk'), ['more milk', 'milk'])
+
+	def test_pages_through_results(self):
+		list_ = List.objects.create()
+		list_.add_items(['milk %d' % (i,) for i in range(5)])
+
+		results, has_more = ItemTerm.search('milk', page=1, per_page=2)
+		self.assertEqual([item.text for item, _ in results], ['milk 4', 'milk 3'])
+		self.assertTrue(has_more)
+		results, has_more = ItemTerm.search('milk', page=3, per_page=2)
+		self.assertEqual([item.text for item, _ in results], ['milk 0'])
+		self.assertFalse(has_more)
+
+	def test_empty_query_finds_nothing(self):
+		Item.objects.create(list=List.objects.create(), text='milk')
+		self.assertEqual(self.search_texts(' * '), [])
+
+	def test_rebuild_command_reindexes_everything(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='buy milk')
+		Item.objects.create(list=list_, text='make tea')
+		ItemTerm.objects.all().delete()
+
+		call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+		self.assertEqual(self.search_texts('tea'), ['make tea'])
+		self.assertEqual(ItemTerm.objects.count(), 4)
+
+	def test_search_keeps_working_while_the_index_is_rebuilt(self):
+		Item.objects.create(list=List.objects.create(), text='buy milk')
+		Item.objects.create(list=List.objects.create(), text='make tea')
+		index_items = ItemTerm.index_items
+		found = []
+		def index_and_search(items, **kwargs):
+			found.append((self.search_texts('milk'), self.search_texts('tea')))
+			return index_items(items, **kwargs)
+
+		with patch.object(ItemTerm, 'index_items', side_effect=index_and_search):
+			call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+		# each list's terms are only missing inside its own batch's transaction
+		self.assertEqual(found, [([], ['make tea']), (['buy milk'], [])])
+
+
+class SearchApiTest(TestCase):
+
+	@override_settings(SEARCH_PAGE_SIZE=1)
+	def test_returns_ranked_page_of_results(self):
+		list_ = List.objects.create()
+		item1 = Item.objects.create(list=list_, text='buy milk')
+		item2 = Item.objects.create(list=list_, text='milk')
+		response = self.client.get('/api/lists/search', {'q': 'buy milk'})
+
+		self.assertEqual(json.loads(response.content.decode()), {
+			'query': 'buy milk',
+			'page': 1,
+			'results': [{'id': item1.id, 'list': list_.id, 'text': 'buy milk', 'score': 2}],
+			'next_page': 2,
+		})
+
+	def test_can_be_scoped_to_a_list(self):
+		list1 = List.objects.create()
+		list2 = List.objects.create()
+		Item.objects.create(list=list1, text='milk')
+		Item.objects.create(list=list2, text='milk')
+		response = self.client.get('/api/lists/search', {'q': 'milk', 'list': list2.id})
+
+		results = json.loads(response.content.decode())['results']
+		self.assertEqual([result['list'] for result in results], [list2.id])
\ No newline at end of file
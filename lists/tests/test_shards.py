@@ -0,0 +1,188 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from lists import archive, shards, transfer
+from lists.cache import fragments
+from lists.live import PollingHub
+from lists.models import ArchivedList, Item, ItemTerm, List, ListShard
+
+SHARDS = ('shard0', 'shard1')
+
+
+# Two in-memory shards alongside the test database
+@override_settings(LIST_SHARDS=SHARDS)
+class ShardedListsTest(TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		with override_settings(LIST_SHARDS=SHARDS):
+			for alias in SHARDS:
+				connections.databases[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+				connections.ensure_defaults(alias)
+				call_command('syncdb', database=alias, interactive=False, verbosity=0)
+
+	@classmethod
+	def tearDownClass(cls):
+		for alias in SHARDS:
+			connections[alias].close()
+			del connections[alias]
+			del connections.databases[alias]
+		super().tearDownClass()
+
+	def setUp(self):
+		fragments.clear()
+		shards.shard_map.clear()
+		for alias in SHARDS:
+			ItemTerm.objects.using(alias).all().delete()
+			Item.objects.using(alias).all().delete()
+			ArchivedList.objects.using(alias).all().delete()
+			List.objects.using(alias).all().delete()
+
+	def make_list(self, *texts):
+		list_ = shards.create_list()
+		list_.add_items(list(texts))
+		return list_
+
+	def test_new_lists_are_spread_over_the_shards_by_id(self):
+		first, second = self.make_list('a'), self.make_list('b')
+		self.assertEqual(first.id + 1, second.id)
+		self.assertEqual(set([first._state.db, second._state.db]), set(SHARDS))
+		self.assertEqual(ListShard.objects.get(id=first.id).shard, first._state.db)
+		self.assertEqual(Item.objects.using(first._state.db).get().text, 'a')
+
+	def test_list_pages_and_adding_items_go_to_the_lists_shard(self):
+		list_ = self.make_list('first')
+		response = self.client.post(list_.get_absolute_url(), {'text': 'second'})
+		self.assertRedirects(response, '/lists/%d/' % (list_.id,))
+
+		response = self.client.get(list_.get_absolute_url())
+		self.assertContains(response, '2: second')
+		self.assertEqual(Item.objects.using(list_._state.db).count(), 2)
+
+	def test_new_list_from_the_home_page(self):
+		self.client.post('/lists/new', {'text': 'new item'})
+		list_id = ListShard.objects.get().id
+		self.assertEqual(shards.get_list(list_id).item_set.get().text, 'new item')
+
+	def test_recent_lists_and_search_cover_every_shard(self):
+		first, second = self.make_list('buy milk'), self.make_list('buy bread')
+		self.assertEqual([list_.id for list_ in shards.recent_lists(10)], [second.id, first.id])
+
+		results, has_more = ItemTerm.search('buy')
+		self.assertEqual(sorted(item.text for item, _ in results), ['buy bread', 'buy milk'])
+		results, has_more = ItemTerm.search('buy', per_page=1, page=2)
+		self.assertEqual(len(results), 1)
+		self.assertFalse(has_more)
+
+	def test_moving_a_list_takes_its_items_and_terms_along(self):
+		list_ = self.make_list('buy milk', 'walk dog')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		self.assertTrue(shards.move_list(list_.id, target))
+
+		self.assertFalse(List.objects.using(source).exists())
+		self.assertFalse(ItemTerm.objects.using(source).exists())
+		moved = shards.get_list(list_.id)
+		self.assertEqual(moved._state.db, target)
+		self.assertEqual(moved.version, list_.version + 1)
+		self.assertEqual([item.text for item in moved.item_set.all()], ['buy milk', 'walk dog'])
+		self.assertEqual(ItemTerm.search('milk', list_=moved)[0][0][0].text, 'buy milk')
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		self.assertContains(response, '2: walk dog')
+
+	def test_an_archived_list_moves_still_archived(self):
+		list_ = self.make_list('buy milk')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		archive.archive_lists(source, [list_.id], timezone.now() + timedelta(days=1))
+		shards.move_list(list_.id, target)
+
+		self.assertFalse(ArchivedList.objects.using(source).exists())
+		moved = archive.get_list(list_.id)
+		self.assertEqual(moved._state.db, target)
+		self.assertEqual([item.text for item in moved.item_set.all()], ['buy milk'])
+
+	def test_a_stale_shard_map_finds_the_list_where_it_went(self):
+		list_ = self.make_list('item')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		shards.move_list(list_.id, target)
+		shards.shard_map._shards[list_.id] = source # as another process would remember it
+		self.assertEqual(shards.get_list(list_.id)._state.db, target)
+
+	def test_bulk_lookups_with_a_stale_shard_map_find_the_list_where_it_went(self):
+		list_, other = self.make_list('item'), self.make_list('other')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		shards.move_list(list_.id, target)
+		shards.shard_map._shards[list_.id] = source
+		lists = shards.in_bulk([list_.id, other.id, other.id + 100])
+		self.assertEqual(sorted(lists), [list_.id, other.id])
+		self.assertEqual(lists[list_.id]._state.db, target)
+
+	# With LISTS_FAST_WRITES off the check that the list exists turns them
+	# away first, unless they get past it just before the move
+	@override_settings(LISTS_FAST_WRITES=True)
+	def test_writers_holding_a_list_from_before_it_moved_follow_it(self):
+		list_ = self.make_list('item')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		stale = shards.get_list(list_.id)
+		shards.move_list(list_.id, target)
+
+		Item(list=stale, text='saved').save()
+		stale.add_items(['added'])
+
+		self.assertFalse(Item.objects.using(source).exists())
+		self.assertFalse(ItemTerm.objects.using(source).exists())
+		moved = shards.get_list(list_.id)
+		self.assertEqual([item.text for item in moved.item_set.all()], ['item', 'saved', 'added'])
+		self.assertEqual(moved.item_count, 3)
+
+	def test_live_polling_follows_a_moved_list(self):
+		list_ = self.make_list('item')
+		source = list_._state.db
+		target = [alias for alias in SHARDS if alias != source][0]
+		shards.move_list(list_.id, target)
+		shards.shard_map._shards[list_.id] = source
+		self.assertEqual(PollingHub().marker(list_.id), List.objects.using(target).get(id=list_.id).version)
+		self.assertIsNone(PollingHub().marker(list_.id + 100))
+
+	@override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, SLOW_REQUEST_THRESHOLD_MS=0)
+	def test_instrumentation_counts_the_shards_queries(self):
+		list_ = self.make_list('item')
+		with self.assertLogs('superlists.instrumentation', 'WARNING') as logs:
+			self.client.get(list_.get_absolute_url())
+		self.assertIn('FROM "lists_item"', logs.output[0])
+
+	def test_rebalance_evens_out_the_shards(self):
+		lists = [self.make_list('item %d' % (i,)) for i in range(4)]
+		for list_ in lists:
+			shards.move_list(list_.id, 'shard0')
+		out = StringIO()
+		call_command('rebalance_shards', stdout=out)
+
+		self.assertIn('Moved 2 lists', out.getvalue())
+		self.assertEqual(List.objects.using('shard1').count(), 2)
+		for list_ in lists:
+			self.assertEqual(shards.get_list(list_.id).item_set.count(), 1)
+
+	def test_a_failed_import_batch_takes_its_list_allocations_with_it(self):
+		records = [('list', 1, None, None), ('item', 1, 1, 'a'), ('list', 2, None, None), ('item', 2, 2, 'b')]
+		with patch.object(ItemTerm, 'index_items', side_effect=RuntimeError):
+			with self.assertRaises(RuntimeError):
+				transfer.Importer().import_batch(records)
+		self.assertFalse(ListShard.objects.exists())
+		self.assertEqual(sum(List.objects.using(alias).count() for alias in SHARDS), 0)
+
+	def test_export_reads_every_shard(self):
+		self.make_list('a')
+		self.make_list('b')
+		kinds = [record[0] for record in transfer.export_records()]
+		self.assertEqual(kinds, ['list', 'list', 'item', 'item'])
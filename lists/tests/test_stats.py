@@ -0,0 +1,120 @@
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from lists.models import Item, List
+
+@override_settings(LIST_PREVIEW_ITEMS=2)
+class ListStatsTest(TestCase):
+
+	def test_saving_items_keeps_count_and_preview_up_to_date(self):
+		list_ = List.objects.create()
+		for text in ('item 1', 'item 2', 'item 3'):
+			Item.objects.create(list=list_, text=text)
+
+		list_ = List.objects.get(id=list_.id)
+		self.assertEqual(list_.item_count, 3)
+		self.assertEqual(list_.preview_texts, ['item 1', 'item 2'])
+
+	def test_add_items_keeps_count_and_preview_up_to_date(self):
+		list_ = List.objects.create()
+		list_.add_items(['item 1', '', 'item 2', 'item 3'])
+
+		list_ = List.objects.get(id=list_.id)
+		self.assertEqual(list_.item_count, 3)
+		self.assertEqual(list_.preview_texts, ['item 1', 'item 2'])
+
+	def test_editing_an_item_refreshes_the_preview(self):
+		list_ = List.objects.create()
+		item = Item.objects.create(list=list_, text='item 1')
+		item.text = 'edited'
+		item.save()
+
+		list_ = List.objects.get(id=list_.id)
+		self.assertEqual(list_.item_count, 1)
+		self.assertEqual(list_.preview_texts, ['edited'])
+
+	def test_full_preview_isnt_read_again(self):
+		list_ = List.objects.create()
+		list_.add_items(['item 1', 'item 2'])
+		# existing texts, insert, ids, search terms, the list UPDATE and the
+		# savepoint around them - but no preview
+		with self.assertNumQueries(7):
+			list_.add_items(['item 3'])
+
+	def test_repair_command_recomputes_stats(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		Item.objects.create(list=list_, text='item 2')
+		List.objects.update(item_count=0, preview='[]')
+		List.objects.create()
+
+		out = StringIO()
+		call_command('repair_list_stats', batch_size=1, stdout=out)
+		self.assertEqual(out.getvalue().strip(), 'Checked 2 lists, repaired 1')
+
+		list_ = List.objects.get(id=list_.id)
+		self.assertEqual(list_.item_count, 2)
+		self.assertEqual(list_.preview_texts, ['item 1', 'item 2'])
+
+	def test_repair_command_reads_previews_a_batch_at_a_time(self):
+		for i in range(5):
+			List.objects.create().add_items(['item %d' % (i,), 'second', 'third'])
+		List.objects.update(preview='[]')
+
+		# the lists with their counts, their previews, an UPDATE apiece inside
+		# a savepoint, and the empty batch after
+		with self.assertNumQueries(2 + 5 + 2 + 1):
+			call_command('repair_list_stats', stdout=StringIO())
+		self.assertEqual(
+			[list_.preview_texts for list_ in List.objects.order_by('id')],
+			[['item %d' % (i,), 'second'] for i in range(5)]
+		)
+
+	@override_settings(BULK_BATCH_SIZE=1000)
+	def test_preview_queries_are_sized_apart_from_bulk_inserts(self):
+		for i in range(5):
+			List.objects.create().add_items(['item %d' % (i,)])
+		List.objects.update(preview='[]')
+
+		with patch('lists.management.commands.repair_list_stats.PREVIEW_QUERY_LISTS', 2):
+			with self.assertNumQueries(1 + 3 + 5 + 2 + 1):
+				call_command('repair_list_stats', stdout=StringIO())
+		self.assertEqual(List.objects.get(preview='["item 4"]').item_count, 1)
+
+	def test_a_failed_item_insert_leaves_the_stats_alone(self):
+		list_ = List.objects.create()
+		with patch.object(List, 'touch', side_effect=RuntimeError):
+			with self.assertRaises(RuntimeError):
+				Item.objects.create(list=list_, text='item 1')
+		self.assertFalse(Item.objects.exists())
+		self.assertEqual(List.objects.get(id=list_.id).item_count, 0)
+
+
+class RecentListsTest(TestCase):
+
+	def test_shows_newest_lists_first(self):
+		older = List.objects.create()
+		older.add_items(['older item'])
+		newer = List.objects.create()
+		newer.add_items(['newer item'])
+
+		response = self.client.get('/lists/')
+		self.assertTemplateUsed(response, 'recent_lists.html')
+		self.assertEqual(list(response.context['lists']), [newer, older])
+		self.assertContains(response, newer.get_absolute_url())
+
+	@override_settings(LIST_PREVIEW_ITEMS=1)
+	def test_shows_count_and_preview(self):
+		List.objects.create().add_items(['first', 'second'])
+		response = self.client.get('/lists/')
+		self.assertContains(response, '2 items')
+		self.assertContains(response, 'first, ...')
+		self.assertNotContains(response, 'second')
+
+	def test_renders_in_one_query(self):
+		for n in range(5):
+			List.objects.create().add_items(['item %d' % (i,) for i in range(n * 10)])
+		with self.assertNumQueries(1):
+			self.client.get('/lists/')
\ No newline at end of file
@@ -0,0 +1,109 @@
+from io import StringIO
+import json
+import os
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.test import TestCase
+from lists import transfer
+from lists.models import ImportedList, Item, ItemTerm, List
+
+
+class TransferTest(TestCase):
+	def setUp(self):
+		self.scratch = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.scratch)
+
+	def make_lists(self):
+		first, second = List.objects.create(), List.objects.create()
+		first.add_items(['buy milk', 'call mum, later'])
+		second.add_items(['say "hi"'])
+		return first, second
+
+	def export(self, format, **options):
+		return ''.join(transfer.export_chunks(format, **options))
+
+	def test_ndjson_export_has_lists_then_items(self):
+		first, second = self.make_lists()
+		records = [json.loads(line) for line in self.export('ndjson', chunk_size=2).splitlines()]
+		self.assertEqual(records[:2], [{'type': 'list', 'id': first.id}, {'type': 'list', 'id': second.id}])
+		self.assertEqual(records[-1], {
+			'type': 'item', 'id': second.item_set.get().id, 'list': second.id, 'text': 'say "hi"'})
+		self.assertEqual(len(records), 5)
+
+	def test_export_keeps_items_that_share_a_position(self):
+		list_ = List.objects.create()
+		items, _ = list_.add_items(['item %d' % (i,) for i in range(5)])
+		Item.objects.filter(list=list_).update(position=0)
+		records = [json.loads(line) for line in self.export('ndjson', chunk_size=2).splitlines()]
+		self.assertEqual([record['id'] for record in records[1:]], [item.id for item in items])
+
+	def test_csv_export_round_trips(self):
+		self.make_lists()
+		exported = self.export('csv', chunk_size=2)
+		self.assertTrue(exported.startswith('type,id,list,text\n'))
+		records = list(transfer.read_records(StringIO(exported), 'csv'))
+		self.assertEqual(records, list(transfer.export_records()))
+
+	def test_import_recreates_lists_under_new_ids(self):
+		first, second = self.make_lists()
+		path = os.path.join(self.scratch, 'lists.ndjson')
+		call_command('export_lists', output=path)
+		out = StringIO()
+		call_command('import_lists', path, batch_size=2, stdout=out)
+
+		self.assertIn('Imported 2 lists, 3 items', out.getvalue())
+		copy = List.objects.exclude(id__in=[first.id, second.id]).order_by('id')[0]
+		self.assertEqual([item.text for item in copy.item_set.all()], ['buy milk', 'call mum, later'])
+		self.assertEqual(copy.item_count, 2)
+		self.assertEqual(ItemTerm.objects.filter(list=copy, term='milk').count(), 1)
+		self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+	def test_import_resumes_from_its_checkpoint(self):
+		self.make_lists()
+		records = list(transfer.export_records())
+		checkpoint = os.path.join(self.scratch, 'checkpoint')
+		transfer.Importer(checkpoint=checkpoint, batch_size=3).import_batch(records[:3])
+
+		importer = transfer.Importer(checkpoint=checkpoint, batch_size=3)
+		self.assertEqual(importer.resume(), 3)
+		stats = importer.run(records)
+		self.assertEqual(stats, {'lists': 0, 'items': 2, 'skipped': 0})
+		self.assertEqual(List.objects.count(), 4)
+		self.assertEqual(Item.objects.count(), 6)
+
+	def test_lists_of_a_batch_whose_checkpoint_line_was_lost_arent_made_again(self):
+		self.make_lists()
+		records = list(transfer.export_records())
+		checkpoint = os.path.join(self.scratch, 'checkpoint')
+		transfer.Importer(checkpoint=checkpoint, batch_size=3).import_batch(records[:3])
+		os.remove(checkpoint) # went down after committing, before writing it
+
+		importer = transfer.Importer(checkpoint=checkpoint, batch_size=3)
+		self.assertEqual(importer.resume(), 0)
+		importer.run(records)
+		self.assertEqual(List.objects.count(), 4)
+		self.assertEqual(Item.objects.count(), 6)
+		importer.forget()
+		self.assertFalse(ImportedList.objects.exists())
+
+	def test_batch_imported_again_after_a_crash_isnt_duplicated(self):
+		self.make_lists()
+		records = list(transfer.export_records())
+		importer = transfer.Importer(batch_size=10)
+		importer.import_batch(records)
+		importer.done = 0 # as if its checkpoint line was never written
+		importer.run(records)
+		self.assertEqual(Item.objects.count(), 6)
+
+	def test_export_endpoint_streams_an_attachment(self):
+		self.make_lists()
+		response = self.client.get('/api/lists/export?format=csv')
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'], 'text/csv')
+		self.assertIn('filename="lists.csv"', response['Content-Disposition'])
+		self.assertEqual(b''.join(response).decode().count('\n'), 6)
+
+	def test_export_endpoint_rejects_unknown_formats(self):
+		response = self.client.get('/api/lists/export?format=xml')
+		self.assertEqual(response.status_code, 400)
@@ -1,6 +1,9 @@
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
 from lists.models import Item, List
 from lists.forms import ItemForm, ExistingListItemForm, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR
+from lists.cache import fragments
 from unittest import skip
 from django.utils.html import escape
 
@@ -51,6 +54,11 @@ class NewListTest(TestCase):
 
 
 class ListViewTest(TestCase):
+
+	# ids get reused once each test's transaction is rolled back, so don't
+	# let rendered tables leak from one test into the next
+	def setUp(self):
+		fragments.clear()
 	
 	# Test that the list view uses its own template in the unique list URL
 	def test_uses_list_template(self):
@@ -82,6 +90,90 @@ class ListViewTest(TestCase):
 		self.assertNotContains(response, 'other item 1')
 		self.assertNotContains(response, 'other item 2')
 
+	@override_settings(LIST_PAGE_SIZE=2)
+	def test_long_lists_are_paginated_with_a_load_more_cursor(self):
+		list_ = List.objects.create()
+		items = [Item.objects.create(list=list_, text='item %d' % (i,)) for i in range(3)]
+
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		self.assertContains(response, '1: item 0')
+		self.assertContains(response, '2: item 1')
+		self.assertNotContains(response, 'item 2')
+		self.assertEqual(
+			response.context['next_page'],
+			'after=%d.%d&start=2' % (items[1].position, items[1].id)
+		)
+
+		response = self.client.get('/lists/%d/?%s' % (list_.id, response.context['next_page']))
+		self.assertContains(response, '3: item 2')
+		self.assertNotContains(response, 'item 1')
+		self.assertIsNone(response.context['next_page'])
+
+	def test_bad_cursor_starts_from_the_beginning(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		response = self.client.get('/lists/%d/?after=bogus' % (list_.id,))
+		self.assertContains(response, '1: item 1')
+
+	def test_list_table_is_cached_until_an_item_is_added(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		self.client.get('/lists/%d/' % (list_.id,))
+
+		# sneak a row in behind the cache's back...
+		Item.objects.filter(list=list_).update(text='changed')
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		self.assertContains(response, 'item 1')
+
+		# ...but a proper save bumps the list version
+		self.client.post('/lists/%d/' % (list_.id,), data={'text': 'item 2'})
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		self.assertContains(response, '1: changed')
+		self.assertContains(response, '2: item 2')
+
+	def test_unchanged_list_gets_not_modified_from_a_single_query(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		response = self.client.get('/lists/%d/' % (list_.id,))
+		etag = response['ETag']
+
+		with self.assertNumQueries(1):
+			response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+
+	def test_adding_an_item_changes_the_etag(self):
+		list_ = List.objects.create()
+		etag = self.client.get('/lists/%d/' % (list_.id,))['ETag']
+		self.client.post('/lists/%d/' % (list_.id,), data={'text': 'item 1'})
+
+		response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertContains(response, 'item 1')
+
+	def test_honours_if_modified_since(self):
+		list_ = List.objects.create(updated_at=timezone.now().replace(microsecond=0))
+		last_modified = self.client.get('/lists/%d/' % (list_.id,))['Last-Modified']
+		response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(response.status_code, 304)
+
+		response = self.client.get(
+			'/lists/%d/' % (list_.id,),
+			HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT'
+		)
+		self.assertEqual(response.status_code, 200)
+
+	def test_a_second_write_in_the_same_second_isnt_hidden_by_if_modified_since(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		last_modified = self.client.get('/lists/%d/' % (list_.id,))['Last-Modified']
+		list_ = List.objects.get(id=list_.id)
+		Item.objects.create(list=list_, text='item 2')
+		List.objects.filter(id=list_.id).update(updated_at=list_.updated_at.replace(microsecond=999999))
+
+		response = self.client.get('/lists/%d/' % (list_.id,), HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertContains(response, 'item 2')
+
 	def test_passes_correct_list_to_template(self):
 		other_list = List.objects.create()
 		correct_list = List.objects.create()
@@ -145,7 +237,58 @@ class ListViewTest(TestCase):
 		self.assertTemplateUsed(response, 'list.html')
 		self.assertEqual(Item.objects.all().count(), 1)
 
+	@override_settings(LISTS_FAST_WRITES=True)
+	def test_duplicate_item_errors_are_the_same_in_fast_write_mode(self):
+		list1 = List.objects.create()
+		Item.objects.create(list=list1, text='textey')
+		response = self.client.post(
+			'/lists/%d/' % (list1.id,),
+			data={'text': 'textey'}
+		)
+
+		self.assertContains(response, escape(DUPLICATE_ITEM_ERROR))
+		self.assertTemplateUsed(response, 'list.html')
+		self.assertEqual(Item.objects.all().count(), 1)
+
+
+
+class MoveItemTest(TestCase):
+
+	def setUp(self):
+		fragments.clear()
+		self.list_ = List.objects.create()
+		self.items, _ = self.list_.add_items(['item 0', 'item 1', 'item 2'])
+
+	def texts(self):
+		return [item.text for item in self.list_.item_set.all()]
+
+	def test_up_swaps_an_item_with_the_one_before(self):
+		response = self.client.post('/lists/%d/items/move' % (self.list_.id,), {'up': self.items[2].id})
+		self.assertRedirects(response, '/lists/%d/' % (self.list_.id,))
+		self.assertEqual(self.texts(), ['item 0', 'item 2', 'item 1'])
+
+	def test_down_swaps_an_item_with_the_one_after(self):
+		self.client.post('/lists/%d/items/move' % (self.list_.id,), {'down': self.items[0].id})
+		self.assertEqual(self.texts(), ['item 1', 'item 0', 'item 2'])
 
+	def test_moving_past_the_end_does_nothing(self):
+		self.client.post('/lists/%d/items/move' % (self.list_.id,), {'down': self.items[2].id})
+		self.assertEqual(self.texts(), ['item 0', 'item 1', 'item 2'])
 
+	def test_items_on_other_lists_are_not_found(self):
+		other = List.objects.create()
+		response = self.client.post('/lists/%d/items/move' % (other.id,), {'up': self.items[1].id})
+		self.assertEqual(response.status_code, 404)
 
+	def test_moved_item_shows_in_its_new_place(self):
+		self.client.get('/lists/%d/' % (self.list_.id,))
+		self.client.post('/lists/%d/items/move' % (self.list_.id,), {'up': self.items[1].id})
+		response = self.client.get('/lists/%d/' % (self.list_.id,))
+		self.assertContains(response, '1: item 1')
+		self.assertContains(response, '2: item 0')
 
+	def test_only_items_with_somewhere_to_go_get_buttons(self):
+		response = self.client.get('/lists/%d/' % (self.list_.id,))
+		self.assertNotContains(response, 'name="up" value="%d"' % (self.items[0].id,))
+		self.assertContains(response, 'name="down" value="%d"' % (self.items[0].id,))
+		self.assertNotContains(response, 'name="down" value="%d"' % (self.items[2].id,))
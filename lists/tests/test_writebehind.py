@@ -0,0 +1,241 @@
+import fcntl
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.test.utils import override_settings
+from lists import writebehind
+from lists.cache import fragments
+from lists.models import hash_text, Item, List, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR
+from lists.writebehind import WriteBehindQueue
+
+class WriteBehindQueueTest(TestCase):
+
+	def setUp(self):
+		self.list_ = List.objects.create()
+		self.queue = WriteBehindQueue()
+
+	def texts(self):
+		return [item.text for item in self.list_.item_set.all()]
+
+	def assertRejected(self, text, error):
+		with self.assertRaises(ValidationError) as raised:
+			self.queue.enqueue(self.list_, text)
+		self.assertEqual(raised.exception.message_dict, {'text': [error]})
+
+	def test_items_are_written_on_flush(self):
+		self.queue.enqueue(self.list_, 'item 1')
+		self.queue.enqueue(self.list_, 'item 2')
+		self.assertEqual(self.texts(), [])
+
+		self.assertEqual(self.queue.flush(), 2)
+		self.assertEqual(self.texts(), ['item 1', 'item 2'])
+		self.assertEqual(self.queue.flush(), 0)
+
+	def test_turns_away_empty_and_duplicate_items(self):
+		Item.objects.create(list=self.list_, text='saved')
+		self.queue.enqueue(self.list_, 'queued')
+
+		self.assertRejected('', EMPTY_LIST_ERROR)
+		self.assertRejected('saved', DUPLICATE_ITEM_ERROR)
+		self.assertRejected('queued', DUPLICATE_ITEM_ERROR)
+		# the same text on another list is fine
+		self.queue.enqueue(List.objects.create(), 'queued')
+
+	def test_flushes_a_batch_at_a_time(self):
+		queue = WriteBehindQueue(batch_size=2)
+		for n in range(3):
+			queue.enqueue(self.list_, 'item %d' % (n,))
+
+		self.assertEqual(queue.flush(), 2)
+		self.assertEqual(queue.stats()['depth'], 1)
+		self.assertEqual(queue.flush(), 1)
+		self.assertEqual(self.texts(), ['item 0', 'item 1', 'item 2'])
+
+	def test_duplicates_that_raced_in_are_dropped(self):
+		self.queue.enqueue(self.list_, 'item 1')
+		Item.objects.create(list=self.list_, text='item 1')
+		self.queue.flush()
+
+		self.assertEqual(self.texts(), ['item 1'])
+		self.assertEqual(self.queue.stats()['rejected'], 1)
+
+	def test_wait_returns_once_the_ticket_is_written(self):
+		first = self.queue.enqueue(self.list_, 'item 1')
+		second = self.queue.enqueue(self.list_, 'item 2')
+		self.assertFalse(self.queue.wait(first, timeout=0))
+
+		self.queue.flush()
+		self.assertTrue(self.queue.wait(second, timeout=0))
+
+	def test_stats(self):
+		self.queue.enqueue(self.list_, 'item 1')
+		self.assertEqual(self.queue.stats()['depth'], 1)
+		self.queue.flush()
+
+		stats = self.queue.stats()
+		self.assertEqual(
+			(stats['depth'], stats['enqueued'], stats['written'], stats['batches']),
+			(0, 1, 1, 1)
+		)
+		self.assertGreater(stats['last_flush_ms'], 0)
+
+	def test_gives_up_on_a_batch_that_keeps_failing(self):
+		ticket = self.queue.enqueue(self.list_, 'item 1')
+		with patch.object(self.queue, 'flush', side_effect=RuntimeError), \
+				patch('lists.writebehind.time.sleep') as sleep, \
+				self.assertLogs('lists.writebehind', 'ERROR') as logs:
+			self.queue.start()
+			self.assertTrue(self.queue.wait(ticket, timeout=5))
+		self.queue.stop()
+
+		self.assertEqual([call[0][0] for call in sleep.call_args_list], [1, 2, 4, 8])
+		self.assertEqual(self.queue.stats()['failed'], 1)
+		self.assertIn('"text": "item 1"', logs.output[-1])
+		self.assertEqual(self.texts(), [])
+
+
+class WriteBehindJournalTest(TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.journal = os.path.join(self.directory, 'journal')
+		self.list_ = List.objects.create()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	# what a process dying leaves behind: its journal, and no lock on it
+	def crashed_queue(self, *texts):
+		queue = WriteBehindQueue(journal=self.journal)
+		for text in texts:
+			queue.enqueue(self.list_, text)
+		queue.close()
+		return queue
+
+	def test_queued_items_survive_a_restart(self):
+		self.crashed_queue('item 1')
+
+		with self.assertLogs('lists.writebehind'):
+			recovered = WriteBehindQueue(journal=self.journal)
+		self.assertEqual(recovered.stats()['depth'], 1)
+		recovered.flush()
+		self.assertEqual([item.text for item in self.list_.item_set.all()], ['item 1'])
+
+	def test_journal_only_keeps_unwritten_items(self):
+		queue = WriteBehindQueue(journal=self.journal)
+		queue.enqueue(self.list_, 'item 1')
+		queue.flush()
+		queue.close()
+		self.assertEqual(WriteBehindQueue(journal=self.journal).stats()['depth'], 0)
+
+	def test_workers_sharing_a_journal_keep_each_others_adds(self):
+		first = WriteBehindQueue(journal=self.journal)
+		second = WriteBehindQueue(journal=self.journal)
+		first.enqueue(self.list_, 'item 1')
+		second.enqueue(self.list_, 'item 2')
+		first.flush()
+		first.close()
+		second.close()
+
+		with self.assertLogs('lists.writebehind'):
+			recovered = WriteBehindQueue(journal=self.journal)
+		self.assertEqual([text for _, _, text, _ in recovered._pending], ['item 2'])
+
+	def test_running_queues_journals_are_left_alone(self):
+		running = WriteBehindQueue(journal=self.journal)
+		running.enqueue(self.list_, 'item 1')
+		self.assertEqual(WriteBehindQueue(journal=self.journal).stats()['depth'], 0)
+		self.assertEqual(running.stats()['depth'], 1)
+
+	def test_stopped_queue_cleans_up_after_itself(self):
+		queue = WriteBehindQueue(journal=self.journal)
+		queue.enqueue(self.list_, 'item 1')
+		queue.stop()
+		self.assertEqual(os.listdir(self.directory), [])
+
+	def test_a_lock_file_taken_for_an_orphan_before_it_was_locked_is_made_again(self):
+		path = self.journal + '.starting.lock'
+		flock = fcntl.flock
+		removed = []
+		# another queue's recovery gets in between our opening and locking it
+		def remove_then_lock(f, operation):
+			if not removed:
+				os.remove(path)
+				removed.append(path)
+			flock(f, operation)
+
+		with patch('lists.writebehind.fcntl.flock', side_effect=remove_then_lock):
+			lock = writebehind._lock(path)
+		self.assertEqual(removed, [path])
+		self.assertEqual(os.fstat(lock.fileno()).st_ino, os.stat(path).st_ino)
+		self.assertIsNone(writebehind._lock(path, blocking=False))
+		lock.close()
+
+	def test_torn_last_line_is_ignored(self):
+		queue = self.crashed_queue('item 1')
+		with open(queue.journal_path, 'a') as f:
+			f.write('{"list": 1, "te')
+		with self.assertLogs('lists.writebehind'):
+			self.assertEqual(WriteBehindQueue(journal=self.journal).stats()['depth'], 1)
+
+
+@override_settings(LISTS_WRITE_BEHIND=True)
+class WriteBehindViewTest(TestCase):
+
+	def setUp(self):
+		# no writer thread: the tests flush for it
+		self.queue = WriteBehindQueue()
+		patcher = patch.object(writebehind, '_queue', self.queue)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		fragments.clear()
+		self.list_ = List.objects.create()
+
+	def test_POST_queues_the_item_and_redirects(self):
+		response = self.client.post('/lists/%d/' % (self.list_.id,), data={'text': 'queued'})
+
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(Item.objects.count(), 0)
+		self.assertEqual(
+			response.cookies[writebehind.TICKET_COOKIE].value,
+			'%s.1.%s' % (self.queue.id, hash_text('queued'))
+		)
+
+	def test_duplicate_of_a_queued_item_shows_an_error(self):
+		self.queue.enqueue(self.list_, 'queued')
+		response = self.client.post('/lists/%d/' % (self.list_.id,), data={'text': 'queued'})
+		self.assertContains(response, 'already got this in your list')
+
+	def test_reader_sees_their_own_writes(self):
+		self.client.post('/lists/%d/' % (self.list_.id,), data={'text': 'queued'})
+
+		with patch.object(self.queue, 'wait', side_effect=lambda *args: self.queue.flush()) as wait:
+			response = self.client.get('/lists/%d/' % (self.list_.id,))
+		wait.assert_called_once_with(1, 5)
+		self.assertContains(response, 'queued')
+
+	def test_tickets_from_another_queue_wait_for_the_item_in_the_database(self):
+		self.client.cookies[writebehind.TICKET_COOKIE] = 'elsewhere.1.%s' % (hash_text('queued'),)
+		# the other process writes the item while we're polling for it
+		written = lambda seconds: Item.objects.create(list=self.list_, text='queued')
+		with patch.object(self.queue, 'wait') as wait, patch('lists.writebehind.time.sleep', side_effect=written) as sleep:
+			response = self.client.get('/lists/%d/' % (self.list_.id,))
+		self.assertFalse(wait.called)
+		self.assertEqual(sleep.call_count, 1)
+		self.assertContains(response, 'queued')
+
+	def test_a_ticket_is_spent_by_the_read_after_it(self):
+		response = self.client.post('/lists/%d/' % (self.list_.id,), data={'text': 'queued'})
+		self.assertEqual(response.cookies[writebehind.TICKET_COOKIE]['max-age'], writebehind.TICKET_MAX_AGE)
+		with self.assertLogs('lists.writebehind', 'ERROR'):
+			self.queue.drop_batch() # given up on, so never written
+
+		with patch.object(self.queue, 'wait', wraps=self.queue.wait) as wait:
+			response = self.client.get('/lists/%d/' % (self.list_.id,))
+			self.assertEqual(response.cookies[writebehind.TICKET_COOKIE].value, '')
+			self.assertEqual(response.cookies[writebehind.TICKET_COOKIE]['path'], '/lists/%d/' % (self.list_.id,))
+			self.client.get('/lists/%d/' % (self.list_.id,))
+		self.assertEqual(wait.call_count, 1)
\ No newline at end of file
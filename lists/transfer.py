@@ -0,0 +1,237 @@
+# Export and import of every list and item, as NDJSON or CSV. A record is a
+# (kind, id, list id, text) tuple: lists come first in id order, then every
+# item in list order - archived lists' items included - so a list is always
+# defined before its items turn up.
+#
+#   {"type": "list", "id": 1}                                  list,1,,
+#   {"type": "item", "id": 7, "list": 1, "text": "Buy milk"}   item,7,1,Buy milk
+from contextlib import ExitStack
+import csv
+import hashlib
+from io import StringIO
+import json
+import os
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from lists import shards
+from lists.models import hash_text, items_after, ArchivedList, ImportedList, Item, ItemTerm, List, POSITION_GAP
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_HEADER = ('type', 'id', 'list', 'text')
+
+
+def format_for(filename, default='ndjson'):
+	extension = os.path.splitext(filename)[1].lstrip('.').lower()
+	return extension if extension in FORMATS else default
+
+# Walks the tables a chunk at a time with a keyset cursor, so memory stays
+# flat and each chunk is a range scan however far in it is. Every shard's
+# lists come before any items
+def export_records(chunk_size=None):
+	chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+	for db in shards.databases():
+		last_id = 0
+		while True:
+			ids = list(List.objects.using(db).filter(id__gt=last_id).order_by('id').values_list(
+				'id', flat=True)[:chunk_size])
+			for list_id in ids:
+				yield ('list', list_id, None, None)
+			if len(ids) < chunk_size:
+				break
+			last_id = ids[-1]
+
+	for db in shards.databases():
+		for record in _export_items(db, chunk_size):
+			yield record
+		for record in _export_archived_items(db, chunk_size):
+			yield record
+
+# Items in list order, so an import puts them back in the same order: the
+# rest of the current list, then on into the lists after it - each a range
+# scan over the (list, position) index. Item ids are only unique within a
+# shard, but nothing reads them back in
+def _export_items(db, chunk_size):
+	items = Item.objects.using(db).order_by('list', 'position', 'id').values_list(
+		'id', 'list_id', 'text', 'position')
+	last_list, last_item = 0, (0, 0)
+	while True:
+		rows = list(items_after(items.filter(list=last_list), last_item)[:chunk_size])
+		if len(rows) < chunk_size:
+			rows += items.filter(list__gt=last_list)[:chunk_size - len(rows)]
+		for item_id, list_id, text, position in rows:
+			yield ('item', item_id, list_id, text)
+		if len(rows) < chunk_size:
+			break
+		last_list, last_item = rows[-1][1], (rows[-1][3], rows[-1][0])
+
+# Archived lists' items, unpacked a few lists at a time - each row can hold
+# a whole list
+def _export_archived_items(db, chunk_size):
+	last_id = 0
+	per_query = max(chunk_size // 100, 1)
+	while True:
+		entries = list(ArchivedList.objects.using(db).filter(pk__gt=last_id).order_by('pk')[:per_query])
+		for entry in entries:
+			for item_id, text, position in entry.unpack():
+				yield ('item', item_id, entry.list_id, text)
+		if len(entries) < per_query:
+			break
+		last_id = entries[-1].pk
+
+# Text in the given format, a chunk of records to each string
+def export_chunks(format, chunk_size=None):
+	chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+	buffer = StringIO()
+	if format == 'csv':
+		writer = csv.writer(buffer, lineterminator='\n')
+		writer.writerow(CSV_HEADER)
+		write = lambda record: writer.writerow(('' if value is None else value for value in record))
+	else:
+		write = lambda record: buffer.write(json.dumps(_as_json(record)) + '\n')
+
+	for count, record in enumerate(export_records(chunk_size), 1):
+		write(record)
+		if count % chunk_size == 0:
+			yield buffer.getvalue()
+			buffer.seek(0)
+			buffer.truncate()
+	yield buffer.getvalue()
+
+def _as_json(record):
+	kind, id_, list_id, text = record
+	if kind == 'list':
+		return {'type': kind, 'id': id_}
+	return {'type': kind, 'id': id_, 'list': list_id, 'text': text}
+
+def read_records(f, format):
+	if format == 'csv':
+		rows = csv.reader(f)
+		if next(rows, None) is None:
+			return
+		for kind, id_, list_id, text in rows:
+			yield (kind, int(id_), int(list_id) if list_id else None, text or None)
+	else:
+		for line in f:
+			if line.strip():
+				data = json.loads(line)
+				yield (data['type'], data['id'], data.get('list'), data.get('text'))
+
+
+# Imports records under new ids, a batch per transaction. With a checkpoint
+# file, each list made is recorded as an ImportedList in the same transaction
+# as the list, and the file gets a line per committed batch saying how many
+# records are done - so an interrupted import can pick up after the last
+# batch it knows made it into the database, and knows every list it made
+# even if it went down before writing that line
+class Importer:
+	def __init__(self, checkpoint=None, batch_size=None):
+		self.checkpoint = checkpoint
+		self.source = hashlib.sha1(os.path.abspath(checkpoint).encode('utf-8')).hexdigest() if checkpoint else None
+		self.batch_size = batch_size or settings.BULK_BATCH_SIZE
+		self.list_ids = {} # exported id -> new id
+		self.done = 0
+		self.stats = {'lists': 0, 'items': 0, 'skipped': 0}
+
+	# Picks up where the checkpoint left off, if there is one. Returns the
+	# number of records already imported
+	def resume(self):
+		if self.checkpoint and os.path.exists(self.checkpoint):
+			with open(self.checkpoint) as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						break # torn by whatever interrupted us
+					self.done = entry['done']
+		if self.source:
+			for db in shards.databases():
+				self.list_ids.update(ImportedList.objects.using(db).filter(
+					source=self.source).values_list('source_id', 'list_id'))
+		return self.done
+
+	# Drops what the import recorded to resume by, once it's finished or is to
+	# start again
+	def forget(self):
+		if self.source:
+			for db in shards.databases():
+				ImportedList.objects.using(db).filter(source=self.source).delete()
+		self.list_ids = {}
+		self.done = 0
+
+	def run(self, records):
+		batch = []
+		for index, record in enumerate(records):
+			if index < self.done:
+				continue
+			batch.append(record)
+			if len(batch) >= self.batch_size:
+				self.import_batch(batch)
+				batch = []
+		if batch:
+			self.import_batch(batch)
+		return self.stats
+
+	def import_batch(self, records):
+		new_lists = {}
+		items = {}
+		# with sharding, the ListShard rows new lists take on the default
+		# database go with the batch too - entered first, so committed last
+		databases = shards.databases()
+		if DEFAULT_DB_ALIAS not in databases:
+			databases = (DEFAULT_DB_ALIAS,) + databases
+		with ExitStack() as stack:
+			for db in databases:
+				stack.enter_context(transaction.atomic(using=db))
+			for kind, old_id, old_list_id, text in records:
+				if kind == 'list':
+					if old_id not in self.list_ids and old_id not in new_lists:
+						new_lists[old_id] = shards.create_list()
+				elif text and (old_list_id in self.list_ids or old_list_id in new_lists):
+					list_id = self.list_ids.get(old_list_id) or new_lists[old_list_id].id
+					items.setdefault(list_id, []).append(Item(list_id=list_id, text=text, text_hash=hash_text(text)))
+				else:
+					self.stats['skipped'] += 1
+			if self.source:
+				imported = {}
+				for old_id, list_ in new_lists.items():
+					imported.setdefault(list_._state.db, []).append(
+						ImportedList(list=list_, source=self.source, source_id=old_id))
+				for db, rows in imported.items():
+					ImportedList.objects.using(db).bulk_create(rows, batch_size=settings.BULK_BATCH_SIZE)
+
+			lists = shards.in_bulk(list(items))
+			for list_id, list_items in items.items():
+				list_ = lists[list_id]
+				list_items = self._not_yet_imported(list_, list_items)
+				position = list_.last_position()
+				for item in list_items:
+					position += POSITION_GAP
+					item.position = position
+				Item.objects.using(list_._state.db).bulk_create(list_items, batch_size=settings.BULK_BATCH_SIZE)
+				list_._fill_in_ids(list_items)
+				ItemTerm.index_items(list_items, using=list_._state.db)
+				list_.touch(added=len(list_items))
+				self.stats['items'] += len(list_items)
+
+		self.list_ids.update((old_id, list_.id) for old_id, list_ in new_lists.items())
+		self.done += len(records)
+		self.stats['lists'] += len(new_lists)
+		if self.checkpoint:
+			with open(self.checkpoint, 'a') as f:
+				f.write(json.dumps({'done': self.done}) + '\n')
+				f.flush()
+				os.fsync(f.fileno())
+
+	# A crash between committing a batch and writing its checkpoint line means
+	# that batch is imported again on resume. Its lists are known from their
+	# ImportedList rows, and items already on them are left out rather than
+	# added twice
+	def _not_yet_imported(self, list_, items):
+		if list_.item_count == 0:
+			return items
+		existing = set(list_.item_set.filter(
+			text_hash__in=[item.text_hash for item in items]
+		).values_list('text_hash', flat=True))
+		return [item for item in items if item.text_hash not in existing]
@@ -1,10 +1,11 @@
 from django.conf.urls import patterns, url
-from django.contrib import admin
-
-admin.autodiscover()
 
 urlpatterns = patterns('',
+    url(r'^$', 'lists.views.recent_lists', name='recent_lists'),
     url(r'^(\d+)/$', 'lists.views.view_list', name='view_list'),
     url(r'^new$', 'lists.views.new_list', name='new_list'),
+    url(r'^(\d+)/events$', 'lists.views.list_events', name='list_events'),
+    url(r'^(\d+)/items/move$', 'lists.views.move_item', name='move_item'),
+    url(r'^(\d+)/items/bulk$', 'lists.api.bulk_add_items', name='bulk_add_items'),
 
 )
@@ -1,32 +1,201 @@
+import calendar
+import json
+import time
+from django.conf import settings
+from django.http import Http404, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render
-from django.shortcuts import redirect
-from lists.models import Item, List
+from django.shortcuts import redirect, resolve_url
+from django.utils.http import urlencode, http_date, parse_http_date_safe, parse_etags, quote_etag
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_POST
+from lists.models import format_cursor, items_after, items_before, parse_cursor, Item
 from lists.forms import ItemForm, ExistingListItemForm
+from lists.cache import cached_fragment, list_table_key
+from lists.live import get_hub
+from lists import archive, shards, writebehind
+from superlists.instrumentation import span
 
 def home_page(request):
-	return render(request, 'home.html', {'form': ItemForm()})
+	with span('render'):
+		return render(request, 'home.html', {'form': ItemForm()})
 
 def new_list(request):
 	form = ItemForm(data=request.POST)
 
 	if form.is_valid():
-		list_ = List.objects.create()
+		list_ = shards.create_list()
 		form.save(for_list=list_)
 		return redirect(list_)
 	else:
-		return render(request, 'home.html', {"form": form})
+		with span('render'):
+			return render(request, 'home.html', {"form": form})
 
+# Every list's size and preview live on the list row itself, so this is a
+# single query however long the lists are
+def recent_lists(request):
+	lists = shards.recent_lists(settings.RECENT_LISTS)
+	with span('render'):
+		return render(request, 'recent_lists.html', {'form': ItemForm(), 'lists': lists})
+
+@writebehind.read_your_writes
 def view_list(request, list_id):
+	list_ = shards.get_list_or_404(list_id)
+	after = parse_cursor(request.GET.get('after'))
+	start = _int_param(request, 'start')
+
+	# Clients that already have this version of the page get a 304 on the back
+	# of the single-row lookup above, without loading items or rendering. It
+	# still counts as looking at the list, or one that's only ever polled
+	# would keep being archived - but that write is rate limited like any
+	# other. An archived list's page has to change: bringing it back gives its
+	# items new ids and the list a new version
+	if request.method == 'GET' and not list_.archived:
+		etag, last_modified = _validators(list_, after, start)
+		if _not_modified(request, etag, list_):
+			list_.mark_accessed()
+			response = HttpResponseNotModified()
+			response['ETag'] = etag
+			return response
 
-	list_ = List.objects.get(id=list_id)
+	archive.prepare(list_) # unpacked first, if it was archived
+	etag, last_modified = _validators(list_, after, start)
 	form = ExistingListItemForm(for_list = list_, data = request.POST or None)
 
 	if form.is_valid():
-		form.save()
-		return redirect(list_) # uses get_absolute_url under the covers to work out the URL to redirect to
+		if settings.LISTS_WRITE_BEHIND:
+			ticket = form.enqueue()
+			if ticket is not None:
+				cookie = writebehind.ticket_cookie(ticket, form.cleaned_data['text'])
+				response = redirect(list_)
+				response.set_cookie(writebehind.TICKET_COOKIE, cookie, max_age=writebehind.TICKET_MAX_AGE,
+					path=list_.get_absolute_url(), httponly=True)
+				return response
+		elif form.save() is not None:
+			return redirect(list_) # uses get_absolute_url under the covers to work out the URL to redirect to
 	
 	# Failed validation, or a GET
-	return render(request, 'list.html', {'list': list_, 'form': form})
+	table = cached_fragment(
+		list_table_key(list_, format_cursor(after), start),
+		lambda: _render_list_table(list_, after, start)
+	)
+	with span('render'):
+		response = render(request, 'list.html', {
+			'list': list_, 'form': form, 'table': table, 'live_updates': settings.LIVE_UPDATES})
+	if request.method == 'GET':
+		response['ETag'] = etag
+		response['Last-Modified'] = http_date(last_modified)
+	return response
+
+def _validators(list_, after, start):
+	etag = quote_etag('%d.%d.%s.%d' % (list_.id, list_.version, format_cursor(after), start))
+	return etag, calendar.timegm(list_.updated_at.utctimetuple())
+
+# If-None-Match wins over If-Modified-Since when a client sends both: the
+# version in the ETag changes with every write, while Last-Modified only goes
+# to the second. So a list last written partway through a second might have
+# been written again in that second since the client looked, and only one
+# written on the second itself can be trusted to If-Modified-Since
+def _not_modified(request, etag, list_):
+	if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+	if if_none_match:
+		etags = parse_etags(if_none_match)
+		return '*' in etags or etag in (quote_etag(e) for e in etags)
+	if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+	return (if_modified_since is not None and list_.updated_at.microsecond == 0
+		and calendar.timegm(list_.updated_at.utctimetuple()) <= if_modified_since)
+
+def _render_list_table(list_, after, start):
+	items, has_more = list_.items_page(after=after)
+	next_page = events_url = None
+	if has_more:
+		next_page = urlencode([
+			('after', format_cursor((items[-1].position, items[-1].id))), ('start', start + len(items))])
+	else:
+		# only the last page has anywhere to put new items. Events follow items
+		# by id, and a moved item can have the newest id anywhere on the list
+		last_id = list_.item_set.order_by('-id').values_list('id', flat=True).first() or 0
+		events_url = '%s?after=%d' % (resolve_url('list_events', list_.id), last_id)
+
+	with span('render'):
+		return render_to_string('list_table.html', {
+			'items': items,
+			'start': start,
+			'next_page': next_page,
+			'events_url': events_url,
+			'rows': start + len(items),
+			'last_page': not has_more,
+		})
+
+# The up and down buttons on each row of the list table: swaps the item with
+# the one before or after it
+@require_POST
+def move_item(request, list_id):
+	list_ = archive.get_list_or_404(list_id)
+	direction = 'up' if 'up' in request.POST else 'down'
+	try:
+		item = list_.item_set.get(id=int(request.POST.get(direction)))
+	except (TypeError, ValueError, Item.DoesNotExist):
+		raise Http404('No such item on this list')
+
+	if direction == 'up':
+		neighbour = items_before(list_.item_set, (item.position, item.id)).first()
+		if neighbour is not None:
+			item.move(before=neighbour)
+	else:
+		neighbour = items_after(list_.item_set, (item.position, item.id)).first()
+		if neighbour is not None:
+			item.move(after=neighbour)
+	return redirect(list_)
+
+# Server-sent events for the items added to a list, so open pages can add new
+# rows as they arrive rather than reloading. Browsers resume from the last
+# event they saw with Last-Event-ID; otherwise ?after=<item id> says where to
+# start, and without either only items added from now on are sent. Only
+# served with LIVE_UPDATES on; see LIVE_STREAM_SECONDS for how long a stream
+# keeps its worker
+def list_events(request, list_id):
+	if not settings.LIVE_UPDATES:
+		raise Http404('Live updates are off')
+	list_ = archive.get_list_or_404(list_id)
+	last_id = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('after')
+	try:
+		last_id = int(last_id)
+	except (TypeError, ValueError):
+		last_id = list_.item_set.order_by('-id').values_list('id', flat=True).first() or 0
+
+	response = StreamingHttpResponse(_item_events(list_, last_id), content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no' # or nginx holds the events back
+	return response
+
+def _item_events(list_, last_id):
+	hub = get_hub()
+	deadline = time.time() + settings.LIVE_STREAM_SECONDS
+	yield 'retry: 2000\n\n'
+	while True:
+		# take the marker before looking, so a write we don't see yet still wakes us
+		marker = hub.marker(list_.id)
+		items = list(list_.item_set.filter(id__gt=last_id).order_by('id')[:settings.LIST_PAGE_SIZE])
+		for item in items:
+			yield 'id: %d\nevent: item\ndata: %s\n\n' % (
+				item.id, json.dumps({'id': item.id, 'text': item.text}))
+			last_id = item.id
+		if len(items) == settings.LIST_PAGE_SIZE:
+			continue
+
+		remaining = deadline - time.time()
+		if remaining <= 0:
+			return
+		if hub.wait(list_.id, marker, min(remaining, settings.LIVE_KEEPALIVE_SECONDS)) == marker:
+			yield ': keep-alive\n\n'
+
+# Cursor values come straight from the query string, so anything unusable
+# just means "from the beginning"
+def _int_param(request, name):
+	try:
+		return max(int(request.GET.get(name, 0)), 0)
+	except ValueError:
+		return 0
 
 
 	
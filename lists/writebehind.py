@@ -0,0 +1,343 @@
+import atexit
+from collections import defaultdict, deque, OrderedDict
+import fcntl
+from functools import wraps
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from lists import archive, shards
+from lists.models import hash_text, Item, EMPTY_LIST_ERROR, DUPLICATE_ITEM_ERROR
+
+logger = logging.getLogger('lists.writebehind')
+
+# Cookie carrying the last ticket a browser was given, so its next read of the
+# list can wait for that write to land. That read spends it, and it's only
+# good for TICKET_MAX_AGE seconds if the browser never comes back
+TICKET_COOKIE = 'write_ticket'
+TICKET_MAX_AGE = 60
+# Pause before the writer retries after the database let it down, doubling
+# with each failure up to MAX_RETRY_SECONDS. After MAX_ATTEMPTS the batch is
+# given up on and logged
+RETRY_SECONDS = 1
+MAX_RETRY_SECONDS = 30
+MAX_ATTEMPTS = 5
+# How often a reader checks the database for an add queued in another process
+TICKET_POLL_SECONDS = 0.05
+
+
+# Queued item adds, written to the database in batches by a background thread.
+# Adds are validated against the database and against what's still queued
+# when they're enqueued, so callers get the same errors as a synchronous save;
+# add_items checks again as it writes, in case two processes raced.
+#
+# With a journal, every add is appended and fsync'd before enqueue() returns,
+# and the file is rewritten with whatever is still queued after each flush.
+# `journal` is a path prefix: each queue keeps its own <journal>.<queue id>,
+# so workers sharing a prefix never rewrite each other's, and holds a lock on
+# <journal>.<queue id>.lock for as long as it lives. A new queue takes over
+# the journals of any queue whose lock is free - its process is gone - and
+# replays them. Replaying is safe, as anything that did make it to the
+# database is turned away as a duplicate.
+class WriteBehindQueue:
+	def __init__(self, journal=None, batch_size=None):
+		self.id = uuid.uuid4().hex[:12]
+		self.journal = journal
+		self.journal_path = '%s.%s' % (journal, self.id) if journal else None
+		self.batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+		self._condition = threading.Condition()
+		self._pending = deque() # (ticket, list id, text, time enqueued)
+		self._pending_hashes = defaultdict(set) # text hashes queued for each list
+		self._next_ticket = 1
+		self._flushed = 0
+		self._stopping = False
+		self._thread = None
+		self._journal_file = None
+		self._lock_file = None
+		self._failures = 0
+		self._stats = {
+			'enqueued': 0, 'written': 0, 'rejected': 0, 'failed': 0, 'batches': 0,
+			'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'max_wait_ms': 0.0,
+		}
+		if journal:
+			self._recover()
+
+	def start(self):
+		self._thread = threading.Thread(target=self._run, name='lists-write-behind', daemon=True)
+		self._thread.start()
+
+	# Writes out everything still queued, then stops the writer
+	def stop(self, timeout=None):
+		with self._condition:
+			self._stopping = True
+			self._condition.notify_all()
+		if self._thread is not None:
+			self._thread.join(timeout)
+		while self.flush():
+			pass
+		self.close(remove=True)
+
+	# Lets go of the journal, leaving anything still in it for another queue
+	# to take over - or, with remove, deleting it if there's nothing left
+	def close(self, remove=False):
+		with self._condition:
+			if remove and self.journal and not self._pending:
+				for path in (self.journal_path, self.journal_path + '.lock'):
+					if os.path.exists(path):
+						os.remove(path)
+			for f in (self._journal_file, self._lock_file):
+				if f is not None:
+					f.close() # which releases the lock
+			self._journal_file = self._lock_file = None
+
+	# Returns a ticket to wait() on, or raises a ValidationError just as
+	# Item.full_clean would
+	def enqueue(self, list_, text):
+		if not text:
+			raise ValidationError({'text': [EMPTY_LIST_ERROR]})
+		digest = hash_text(text)
+		with self._condition:
+			queued = digest in self._pending_hashes[list_.id]
+		if queued or list_.item_set.filter(text_hash=digest).exists():
+			raise ValidationError({'text': [DUPLICATE_ITEM_ERROR]})
+
+		with self._condition:
+			# checked again, now that nobody else can be enqueueing
+			if digest in self._pending_hashes[list_.id]:
+				raise ValidationError({'text': [DUPLICATE_ITEM_ERROR]})
+			ticket = self._add(list_.id, text)
+			if self._journal_file is not None:
+				self._journal_file.write(json.dumps({'list': list_.id, 'text': text}) + '\n')
+				self._journal_file.flush()
+				os.fsync(self._journal_file.fileno())
+			self._condition.notify_all()
+		return ticket
+
+	# Blocks until the write behind the ticket is in the database. Returns
+	# whether it got there within the timeout
+	def wait(self, ticket, timeout=None):
+		with self._condition:
+			return self._condition.wait_for(lambda: self._flushed >= ticket, timeout)
+
+	# Writes out the oldest batch, a transaction per list. Returns how many
+	# adds it took off the queue
+	def flush(self):
+		with self._condition:
+			batch = list(itertools.islice(self._pending, self.batch_size))
+		if not batch:
+			return 0
+
+		started = time.perf_counter()
+		texts = OrderedDict()
+		for _, list_id, text, _ in batch:
+			texts.setdefault(list_id, []).append(text)
+		lists = shards.in_bulk(list(texts))
+		written = rejected = 0
+		for list_id, list_texts in texts.items():
+			if list_id not in lists:
+				rejected += len(list_texts) # deleted while its adds were queued
+				continue
+			if lists[list_id].archived:
+				archive.rehydrate(lists[list_id]) # archived while its adds were queued
+			items, rejects = lists[list_id].add_items(list_texts)
+			written += len(items)
+			rejected += len(rejects)
+		elapsed_ms = (time.perf_counter() - started) * 1000
+
+		with self._condition:
+			self._take_off(batch)
+			stats = self._stats
+			stats['written'] += written
+			stats['rejected'] += rejected
+			stats['batches'] += 1
+			stats['last_flush_ms'] = elapsed_ms
+			stats['max_flush_ms'] = max(stats['max_flush_ms'], elapsed_ms)
+			stats['max_wait_ms'] = max(stats['max_wait_ms'], (time.time() - batch[0][3]) * 1000)
+			depth = len(self._pending)
+
+		logger.debug('Wrote %d items (%d rejected) in %.1fms, %d still queued',
+			written, rejected, elapsed_ms, depth)
+		return len(batch)
+
+	def stats(self):
+		with self._condition:
+			stats = dict(self._stats, depth=len(self._pending))
+			stats['oldest_ms'] = (time.time() - self._pending[0][3]) * 1000 if self._pending else 0.0
+		return stats
+
+	# Gives up on the oldest batch after it's failed MAX_ATTEMPTS times, so one
+	# bad batch can't hold up everything queued behind it. Its adds are logged,
+	# to be put back by hand. Returns how many there were
+	def drop_batch(self):
+		with self._condition:
+			batch = list(itertools.islice(self._pending, self.batch_size))
+			if batch:
+				self._take_off(batch)
+				self._stats['failed'] += len(batch)
+		if batch:
+			logger.error('Gave up writing %d queued items after %d attempts: %s', len(batch), MAX_ATTEMPTS,
+				json.dumps([{'list': list_id, 'text': text} for _, list_id, text, _ in batch]))
+		return len(batch)
+
+	# Call holding the condition, with the batch from the front of the queue
+	def _take_off(self, batch):
+		for _, list_id, text, _ in batch:
+			self._pending.popleft()
+			self._pending_hashes[list_id].discard(hash_text(text))
+			if not self._pending_hashes[list_id]:
+				del self._pending_hashes[list_id]
+		self._flushed = batch[-1][0]
+		if self.journal:
+			self._rewrite_journal()
+		self._condition.notify_all()
+
+	def _add(self, list_id, text):
+		ticket = self._next_ticket
+		self._next_ticket += 1
+		self._pending.append((ticket, list_id, text, time.time()))
+		self._pending_hashes[list_id].add(hash_text(text))
+		self._stats['enqueued'] += 1
+		return ticket
+
+	def _run(self):
+		while True:
+			with self._condition:
+				self._condition.wait_for(lambda: self._pending or self._stopping)
+				if self._stopping:
+					return
+			try:
+				self.flush()
+				self._failures = 0
+			except Exception:
+				self._failures += 1
+				for conn in connections.all():
+					conn.close() # start again on fresh connections
+				if self._failures >= MAX_ATTEMPTS:
+					logger.exception('Write-behind flush failed %d times', self._failures)
+					self.drop_batch()
+					self._failures = 0
+				else:
+					logger.exception('Write-behind flush failed, retrying')
+					time.sleep(min(RETRY_SECONDS * 2 ** (self._failures - 1), MAX_RETRY_SECONDS))
+
+	def _recover(self):
+		self._lock_file = _lock(self.journal_path + '.lock')
+
+		for lock_path in glob.glob(glob.escape(self.journal) + '.*.lock'):
+			if lock_path == self.journal_path + '.lock':
+				continue
+			lock = _lock(lock_path, blocking=False)
+			if lock is None:
+				continue # its queue is still running
+			with lock:
+				path = lock_path[:-len('.lock')]
+				recovered = 0
+				if os.path.exists(path):
+					with open(path) as f:
+						for line in f:
+							try:
+								entry = json.loads(line)
+							except ValueError:
+								continue # torn by the crash, so it was never acknowledged
+							self._add(entry['list'], entry['text'])
+							recovered += 1
+				if recovered:
+					logger.info('Recovered %d queued items from %s', recovered, path)
+					self._rewrite_journal()
+				# still holding its lock, so nobody else replays it too
+				for orphan in (path, lock_path):
+					if os.path.exists(orphan):
+						os.remove(orphan)
+		self._rewrite_journal()
+
+	# Swaps in a journal holding just what's still queued
+	def _rewrite_journal(self):
+		if self._journal_file is not None:
+			self._journal_file.close()
+		temporary = self.journal_path + '.tmp'
+		with open(temporary, 'w') as f:
+			for _, list_id, text, _ in self._pending:
+				f.write(json.dumps({'list': list_id, 'text': text}) + '\n')
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temporary, self.journal_path)
+		self._journal_file = open(self.journal_path, 'a')
+
+# An flock on the file at the path, or None without blocking if someone else
+# holds it. The lock only counts if the file is still at the path once it's
+# ours: another queue recovering the journals may have taken the file for an
+# orphan and removed it between our opening and locking it
+def _lock(path, blocking=True):
+	while True:
+		f = open(path, 'a')
+		try:
+			fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+		except OSError:
+			f.close()
+			return None
+		try:
+			if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+				return f
+		except FileNotFoundError:
+			pass
+		f.close()
+		if not blocking:
+			return None # gone already: whoever removed it replayed it
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+	global _queue
+	with _queue_lock:
+		if _queue is None:
+			_queue = WriteBehindQueue(journal=settings.WRITE_BEHIND_JOURNAL)
+			_queue.start()
+			atexit.register(_queue.stop)
+		return _queue
+
+def stats():
+	return get_queue().stats()
+
+# The queue and ticket, and the hash of the text added, so any process can
+# tell when it's been written
+def ticket_cookie(ticket, text):
+	return '%s.%d.%s' % (get_queue().id, ticket, hash_text(text))
+
+# Read-your-writes for a view of a list: a GET carrying a ticket is held until
+# the add behind it has been written, or for WRITE_BEHIND_WAIT_SECONDS at the
+# most, and the ticket is spent either way - so the reads after it, and reads
+# after an add that was rejected or given up on, don't wait at all
+def read_your_writes(view):
+	@wraps(view)
+	def wrapped(request, list_id, *args, **kwargs):
+		if not (settings.LISTS_WRITE_BEHIND and request.method == 'GET' and TICKET_COOKIE in request.COOKIES):
+			return view(request, list_id, *args, **kwargs)
+		wait_for_ticket(request, list_id)
+		response = view(request, list_id, *args, **kwargs)
+		response.delete_cookie(TICKET_COOKIE, path=request.path)
+		return response
+	return wrapped
+
+# A ticket from this process's queue is waited on; one from another process
+# (or from before a restart) can't be, so the database is checked for the
+# item instead
+def wait_for_ticket(request, list_id):
+	queue_id, ticket, digest = (request.COOKIES.get(TICKET_COOKIE, '').split('.') + ['', ''])[:3]
+	queue = get_queue()
+	if queue_id == queue.id and ticket.isdigit():
+		queue.wait(int(ticket), settings.WRITE_BEHIND_WAIT_SECONDS)
+	elif digest:
+		items = Item.objects.using(shards.shard_map.db_for_list(list_id)).filter(list_id=list_id, text_hash=digest)
+		deadline = time.time() + settings.WRITE_BEHIND_WAIT_SECONDS
+		while not items.exists() and time.time() < deadline:
+			time.sleep(TICKET_POLL_SECONDS)
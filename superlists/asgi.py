@@ -0,0 +1,152 @@
+"""
+ASGI config for superlists project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for servers like uvicorn or daphne:
+
+    uvicorn superlists.asgi:application
+
+Django 1.6 has no async views, so this serves the same Django application as
+superlists/wsgi.py. Reading requests from and writing responses to slow
+clients happens on the event loop, while the views themselves, and their
+database access, run on a bounded pool of ASGI_THREADS threads. A worker
+thread is only busy while Django is actually working, not while a client
+trickles its request in or its response out.
+
+The coroutines are generator-based (asyncio.coroutine and yield from) rather
+than async def, so the module imports on every Python Django 1.6 runs on that
+has asyncio - 3.4, or 3.3 with the asyncio backport - as well as on the newer
+ones ASGI servers need, which await them like any other coroutine.
+
+A streaming response is pulled from the pool a chunk at a time, so it only
+holds a thread while a chunk is being produced. The live update stream waits
+for new items inside its generator, though, so with LIVE_STREAM_SECONDS set
+each open stream holds a pool thread for that long.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import os
+import sys
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "superlists.settings")
+
+from django.conf import settings
+from superlists.wsgi import application as wsgi_application
+
+executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS)
+
+_DONE = object()
+
+
+def _environ(scope, body):
+	server_name, server_port = scope.get('server') or ('localhost', 80)
+	environ = {
+		'REQUEST_METHOD': scope['method'],
+		'SCRIPT_NAME': scope.get('root_path', ''),
+		# WSGI wants the raw bytes of the path, decoded as latin-1
+		'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+		'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+		'SERVER_NAME': server_name,
+		'SERVER_PORT': str(server_port),
+		'SERVER_PROTOCOL': 'HTTP/%s' % (scope.get('http_version', '1.1'),),
+		'CONTENT_LENGTH': str(len(body)),
+		'wsgi.version': (1, 0),
+		'wsgi.url_scheme': scope.get('scheme', 'http'),
+		'wsgi.input': BytesIO(body),
+		'wsgi.errors': sys.stderr,
+		'wsgi.multithread': True,
+		'wsgi.multiprocess': True,
+		'wsgi.run_once': False,
+	}
+	if scope.get('client'):
+		environ['REMOTE_ADDR'] = scope['client'][0]
+	for name, value in scope.get('headers', []):
+		name = name.decode('latin-1').upper().replace('-', '_')
+		value = value.decode('latin-1')
+		if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+			environ[name] = value
+		elif 'HTTP_' + name in environ:
+			environ['HTTP_' + name] += ',' + value
+		else:
+			environ['HTTP_' + name] = value
+	return environ
+
+# Runs on the pool: the whole of an ordinary response is produced in one go,
+# while a streaming one is handed back to be pulled a chunk at a time
+def _call_application(environ):
+	started = []
+	def start_response(status, headers, exc_info=None):
+		started[:] = [status, headers]
+
+	result = wsgi_application(environ, start_response)
+	if getattr(result, 'streaming', False):
+		return started, result, None
+	try:
+		body = b''.join(result)
+	finally:
+		if hasattr(result, 'close'):
+			result.close()
+	return started, None, body
+
+@asyncio.coroutine
+def _read_body(receive):
+	chunks = []
+	while True:
+		message = yield from receive()
+		if message['type'] == 'http.disconnect':
+			return None
+		chunks.append(message.get('body', b''))
+		if not message.get('more_body', False):
+			return b''.join(chunks)
+
+@asyncio.coroutine
+def _lifespan(receive, send):
+	while True:
+		message = yield from receive()
+		if message['type'] == 'lifespan.startup':
+			yield from send({'type': 'lifespan.startup.complete'})
+		elif message['type'] == 'lifespan.shutdown':
+			executor.shutdown(wait=True)
+			yield from send({'type': 'lifespan.shutdown.complete'})
+			return
+
+@asyncio.coroutine
+def application(scope, receive, send):
+	if scope['type'] == 'lifespan':
+		yield from _lifespan(receive, send)
+		return
+	if scope['type'] != 'http':
+		raise ValueError('Unsupported ASGI scope type: %s' % (scope['type'],))
+
+	body = yield from _read_body(receive)
+	if body is None:
+		return # the client went away before we had the whole request
+
+	loop = asyncio.get_event_loop()
+	(status, headers), stream, body = yield from loop.run_in_executor(
+		executor, _call_application, _environ(scope, body))
+
+	yield from send({
+		'type': 'http.response.start',
+		'status': int(status.split(' ', 1)[0]),
+		'headers': [
+			(name.lower().encode('latin-1'), value.encode('latin-1'))
+			for name, value in headers
+		],
+	})
+	if stream is None:
+		yield from send({'type': 'http.response.body', 'body': body})
+		return
+
+	try:
+		chunks = iter(stream)
+		while True:
+			chunk = yield from loop.run_in_executor(executor, next, chunks, _DONE)
+			if chunk is _DONE:
+				break
+			if chunk:
+				yield from send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+		yield from send({'type': 'http.response.body', 'body': b''})
+	finally:
+		yield from loop.run_in_executor(executor, stream.close)
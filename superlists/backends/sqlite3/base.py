@@ -0,0 +1,24 @@
+from django.db.backends.sqlite3 import base
+
+# PRAGMAs that can be given in a database's OPTIONS, in the order they're
+# applied - the busy timeout has to be in place before switching the journal
+# mode, since that needs a lock
+PRAGMA_OPTIONS = ('busy_timeout', 'journal_mode', 'synchronous')
+
+
+# The stock SQLite backend, plus PRAGMAs run on every new connection.
+# sqlite3.connect() doesn't know about them, so they're taken out of the
+# connection params before it sees them
+class DatabaseWrapper(base.DatabaseWrapper):
+	def get_connection_params(self):
+		params = super().get_connection_params()
+		self.pragmas = [
+			(name, params.pop(name)) for name in PRAGMA_OPTIONS if name in params
+		]
+		return params
+
+	def get_new_connection(self, conn_params):
+		conn = super().get_new_connection(conn_params)
+		for name, value in self.pragmas:
+			conn.execute('PRAGMA %s = %s' % (name, value))
+		return conn
\ No newline at end of file
@@ -0,0 +1,130 @@
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from superlists.instrumentation import span
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(
+	r'^(text/(?!event-stream)|application/(json|javascript)|image/svg\+xml)')
+ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*(?:,|$)')
+# The suffix our ETags get for each encoding, as GZipMiddleware does it
+ETAG_ENCODING = re.compile(r';(gzip|br)"$')
+# Indentation: any run of whitespace that includes a line break
+INDENTATION = re.compile(r'\s*\n\s*')
+# Leave these alone, their whitespace means something
+PRESERVED_BLOCKS = re.compile(r'(<(pre|textarea|script)\b.*?</\2>)', re.I | re.S)
+
+
+# Keeps one line break wherever our templates' indentation was, outside of
+# the blocks where whitespace is content
+def strip_whitespace(html):
+	parts = PRESERVED_BLOCKS.split(html)
+	# split() hands back each preserved block followed by its tag name
+	for index in range(0, len(parts), 3):
+		parts[index] = INDENTATION.sub('\n', parts[index])
+	return ''.join(part for index, part in enumerate(parts) if index % 3 != 2)
+
+# The best of the available encodings - by default, what we can compress
+# with - that the client will take, or None
+def choose_encoding(accept_encoding, available=None):
+	if available is None:
+		available = ('br', 'gzip') if brotli is not None else ('gzip',)
+	accepted = {}
+	for coding, quality in ACCEPT_ENCODING.findall(accept_encoding.lower()):
+		try:
+			accepted[coding] = float(quality) if quality else 1.0
+		except ValueError:
+			continue
+	for coding in available:
+		if accepted.get(coding, accepted.get('*', 0)) > 0:
+			return coding
+	return None
+
+def compressor(coding):
+	if coding == 'br':
+		return brotli.Compressor(quality=settings.COMPRESSION_LEVEL)
+	# wbits 31 is deflate with a gzip header and trailer
+	return zlib.compressobj(settings.COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+
+def compress(coding, content):
+	engine = compressor(coding)
+	if coding == 'br':
+		return engine.process(content) + engine.finish()
+	return engine.compress(content) + engine.flush()
+
+# Compresses a stream a chunk at a time, so only the compressor's window is
+# ever held in memory however long the response is
+def compress_stream(coding, chunks):
+	engine = compressor(coding)
+	for chunk in chunks:
+		data = engine.process(chunk) if coding == 'br' else engine.compress(chunk)
+		if data:
+			yield data
+	yield engine.finish() if coding == 'br' else engine.flush()
+
+
+# Trims the indentation out of rendered HTML, then gzips or brotlis anything
+# compressible that's at least COMPRESSION_MIN_SIZE bytes - or that streams,
+# when its size isn't known up front. Event streams are left alone, as each
+# event has to go out as soon as it's written. Should come straight after
+# the instrumentation in MIDDLEWARE_CLASSES, so it sees the final response.
+class CompressionMiddleware:
+	# Conditional requests carry back the ETag we sent with the encoding's
+	# suffix; strip it again so views can compare against their own, and
+	# remember what it was for the 304
+	def process_request(self, request):
+		if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+		if if_none_match:
+			sent = dict((ETAG_ENCODING.sub('"', etag.strip()), etag.strip()) for etag in if_none_match.split(','))
+			request.META['HTTP_IF_NONE_MATCH'] = ','.join(sent)
+			request.encoded_etags = sent
+
+	def process_response(self, request, response):
+		# A 304 has to carry the ETag as the 200 it stands in for did
+		if response.status_code == 304 and response.has_header('ETag'):
+			response['ETag'] = getattr(request, 'encoded_etags', {}).get(response['ETag'], response['ETag'])
+			return response
+		content_type = response.get('Content-Type', '')
+		if response.status_code != 200 or not COMPRESSIBLE_TYPES.match(content_type):
+			return response
+		patch_vary_headers(response, ('Accept-Encoding',))
+		if response.has_header('Content-Encoding'):
+			return response
+
+		streaming = getattr(response, 'streaming', False)
+		if not streaming and settings.HTML_MINIFY and content_type.startswith('text/html'):
+			with span('minify'):
+				charset = response._charset or settings.DEFAULT_CHARSET
+				response.content = strip_whitespace(response.content.decode(charset))
+				response['Content-Length'] = str(len(response.content))
+
+		coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+		if coding is None:
+			return response
+
+		if streaming:
+			# As with Django's GZipMiddleware, the chunks have to be bytes
+			# already: once Content-Encoding is set Django stops encoding text
+			response.streaming_content = compress_stream(coding, response.streaming_content)
+			if response.has_header('Content-Length'):
+				del response['Content-Length']
+		else:
+			if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+				return response
+			with span('compress'):
+				compressed = compress(coding, response.content)
+			if len(compressed) >= len(response.content):
+				return response
+			response.content = compressed
+			response['Content-Length'] = str(len(compressed))
+
+		if response.has_header('ETag'):
+			response['ETag'] = re.sub(r'"$', ';%s"' % (coding,), response['ETag'])
+		response['Content-Encoding'] = coding
+		return response
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('superlists.instrumentation')
+
+_local = threading.local()
+
+
+# What we've measured so far for the request being handled on this thread
+class RequestTimings:
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.view_started = None
+		self.spans = defaultdict(float)
+		# every database's queries count - with sharding a request can touch
+		# several - so note where each one's log stood, and its debug cursor
+		self.first_queries = dict((db.alias, len(db.queries)) for db in connections.all())
+		self.debug_cursors = dict((db.alias, db.use_debug_cursor) for db in connections.all())
+
+	def queries(self):
+		return [
+			query for db in connections.all()
+			for query in db.queries[self.first_queries.get(db.alias, 0):]
+		]
+
+
+def current_timings():
+	return getattr(_local, 'timings', None)
+
+# Time a block of work (template rendering, say) against the current request.
+# Costs next to nothing when the request isn't being sampled
+@contextmanager
+def span(name):
+	timings = current_timings()
+	if timings is None:
+		yield
+		return
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		timings.spans[name] += time.perf_counter() - started
+
+
+# Records query count, DB time, render time and view time for a sample of
+# requests, reports them in a Server-Timing header, and logs the requests that
+# took longer than SLOW_REQUEST_THRESHOLD_MS along with their slowest queries.
+# Should come first in MIDDLEWARE_CLASSES so it sees the whole request.
+class InstrumentationMiddleware:
+	def process_request(self, request):
+		_local.timings = None
+		if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+			return
+		_local.timings = RequestTimings()
+		# the debug cursor is what times each query for us
+		for db in connections.all():
+			db.use_debug_cursor = True
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		timings = current_timings()
+		if timings is not None:
+			timings.view_started = time.perf_counter()
+
+	def process_response(self, request, response):
+		timings = current_timings()
+		if timings is None:
+			return response
+		_local.timings = None
+		for db in connections.all():
+			db.use_debug_cursor = timings.debug_cursors.get(db.alias)
+
+		finished = time.perf_counter()
+		queries = timings.queries()
+		durations = {
+			'db': sum(float(query['time']) for query in queries),
+			'total': finished - timings.started,
+		}
+		if timings.view_started is not None:
+			durations['view'] = finished - timings.view_started
+		durations.update(timings.spans)
+
+		metrics = ['db;dur=%.1f;desc="%d queries"' % (durations.pop('db') * 1000, len(queries))]
+		metrics += ['%s;dur=%.1f' % (name, seconds * 1000) for name, seconds in sorted(durations.items())]
+		response['Server-Timing'] = ', '.join(metrics)
+
+		total_ms = durations['total'] * 1000
+		if total_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+			slowest = sorted(queries, key=lambda query: float(query['time']), reverse=True)
+			logger.warning(
+				'Slow request: %s %s took %.1fms (%s)\n%s',
+				request.method, request.path, total_ms, response['Server-Timing'],
+				'\n'.join(
+					'  %.1fms %s' % (float(query['time']) * 1000, query['sql'])
+					for query in slowest[:settings.SLOW_REQUEST_TOP_QUERIES]
+				)
+			)
+		return response
@@ -20,9 +20,10 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 SECRET_KEY = 'd)@%#5)mathf6yagp9w56x7tg+laj2w6y-$%dm3p$p$5#wktl$'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# (superlists.settings_production turns it off)
+DEBUG = os.environ.get('SUPERLISTS_DEBUG', '1') == '1'
 
-TEMPLATE_DEBUG = True
+TEMPLATE_DEBUG = DEBUG
 
 ALLOWED_HOSTS = []
 
@@ -41,6 +42,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'superlists.instrumentation.InstrumentationMiddleware',
+    'superlists.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -49,21 +52,237 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
 
+# Templates
+# https://docs.djangoproject.com/en/1.6/ref/templates/api/#loader-types
+
+SOURCE_TEMPLATE_LOADERS = (
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+)
+
+# In production each template is compiled once and kept in memory by the
+# cached loader, instead of being found and parsed again on every render.
+# WARM_TEMPLATES has the WSGI app compile PRECOMPILED_TEMPLATES as it boots,
+# so the first requests don't pay for it either
+TEMPLATE_CACHE = os.environ.get('SUPERLISTS_TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = (
+        ('django.template.loaders.cached.Loader', SOURCE_TEMPLATE_LOADERS),
+    )
+else:
+    TEMPLATE_LOADERS = SOURCE_TEMPLATE_LOADERS
+
+WARM_TEMPLATES = os.environ.get('SUPERLISTS_WARM_TEMPLATES', '1' if TEMPLATE_CACHE else '0') == '1'
+PRECOMPILED_TEMPLATES = ('base.html', 'home.html', 'list.html', 'list_table.html')
+
+# Preload mode: the WSGI app imports every view and URLconf, loads the models
+# and warms the templates as it's imported (see superlists/warmup.py). Run
+# the server with its own preload option (gunicorn --preload) so this is done
+# once, before forking, and the workers share it all copy-on-write
+PRELOAD = os.environ.get('SUPERLISTS_PRELOAD') == '1'
+
 ROOT_URLCONF = 'superlists.urls'
 
 WSGI_APPLICATION = 'superlists.wsgi.application'
 
+# Threads the ASGI entry point (superlists/asgi.py) runs Django on - the most
+# requests a process will work on at once, however many clients are connected
+ASGI_THREADS = int(os.environ.get('SUPERLISTS_ASGI_THREADS', 8))
+
+# Runs the tests in several processes with --parallel N, and reports the
+# slowest ones
+TEST_RUNNER = 'superlists.test_runner.ParallelDiscoverRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.6/ref/settings/#databases
 
+# SUPERLISTS_DB_PROFILE picks one of the profiles below
+
+DATABASE_NAME = os.environ.get(
+    'SUPERLISTS_DB_NAME', os.path.join(BASE_DIR, '../database/db.sqlite3'))
+
+DATABASE_PROFILES = {
+    # Plain SQLite with default journaling and a connection per request - fine
+    # for development
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_NAME,
+    },
+    # SQLite in WAL mode, so readers and the writer stop blocking each other,
+    # with writers queueing on a busy timeout instead of failing with
+    # "database is locked", and connections kept open between requests
+    'sqlite-wal': {
+        'ENGINE': 'superlists.backends.sqlite3',
+        'NAME': DATABASE_NAME,
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'busy_timeout': 5000,
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+        },
+    },
+    # A local PostgreSQL server, configured through the usual libpq variables
+    # (needs psycopg2)
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'NAME': os.environ.get('PGDATABASE', 'superlists'),
+        'USER': os.environ.get('PGUSER', ''),
+        'PASSWORD': os.environ.get('PGPASSWORD', ''),
+        'HOST': os.environ.get('PGHOST', ''),
+        'PORT': os.environ.get('PGPORT', ''),
+        'CONN_MAX_AGE': 600,
+    },
+}
+
 DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('SUPERLISTS_DB_PROFILE', 'sqlite')],
+}
+
+# Sharding: with SUPERLISTS_LIST_SHARDS=N, lists and their items are spread
+# over N more databases of the same profile, each with a writer lock of its
+# own, and the default database only keeps track of which list is on which
+# (see lists/shards.py). That costs each new list an INSERT and an UPDATE on
+# the default database, in one transaction, on top of its own write to its
+# shard. Run syncdb with --database for each shard
+LIST_SHARDS = tuple('shard%d' % (i,) for i in range(int(os.environ.get('SUPERLISTS_LIST_SHARDS', 0))))
+for alias in LIST_SHARDS:
+    root, extension = os.path.splitext(DATABASES['default']['NAME'])
+    DATABASES[alias] = dict(DATABASES['default'], NAME='%s_%s%s' % (root, alias, extension))
+DATABASE_ROUTERS = ['lists.routers.ListShardRouter']
+
+# Fast write mode: adding an item goes straight to INSERT and relies on the
+# unique (list, text_hash) constraint to catch duplicates, instead of
+# SELECTing for one first
+LISTS_FAST_WRITES = os.environ.get('SUPERLISTS_FAST_WRITES') == '1'
+
+# Write-behind mode: items added on a list page are queued and written in
+# batches by a background thread, and the POST returns straight away. With a
+# journal the queue is fsync'd to disk, so queued items survive a crash. The
+# journal setting is a path prefix: each process journals to a file of its own
+# alongside it, and takes over those of processes that died
+LISTS_WRITE_BEHIND = os.environ.get('SUPERLISTS_WRITE_BEHIND') == '1'
+WRITE_BEHIND_JOURNAL = os.environ.get('SUPERLISTS_WRITE_BEHIND_JOURNAL') or None
+WRITE_BEHIND_BATCH_SIZE = 500
+# Longest a reader waits for their own queued items before the page is
+# rendered without them
+WRITE_BEHIND_WAIT_SECONDS = 5
+
+# Treat item texts that only differ in case or whitespace as duplicates. After
+# changing this, run backfill_text_hashes to rehash the existing items
+ITEM_TEXT_FOLDING = os.environ.get('SUPERLISTS_ITEM_TEXT_FOLDING') == '1'
+
+# Maximum number of items rendered per page of a list - further items are
+# reached through the "load more" cursor
+LIST_PAGE_SIZE = 100
+
+# Item texts kept on each list for previews, and lists on the recent lists page
+LIST_PREVIEW_ITEMS = 3
+RECENT_LISTS = 50
+
+# Live list updates, sent to open list pages as server-sent events - off
+# unless SUPERLISTS_LIVE_UPDATES=1. LocalHub only hears about writes made in
+# its own process; PollingHub watches the database for them, for when there's
+# more than one worker
+LIVE_UPDATES = os.environ.get('SUPERLISTS_LIVE_UPDATES') == '1'
+LIVE_HUB = os.environ.get('SUPERLISTS_LIVE_HUB', 'lists.live.LocalHub')
+LIVE_POLL_SECONDS = 1
+# How long a stream is held open waiting for new items, after which the
+# browser reconnects and picks up from the last item it saw. At 0 each request
+# sends what's new and ends straight away, and the browser polls by
+# reconnecting every couple of seconds, so a worker is only busy for a query.
+# Only hold streams open on a server whose workers can wait cheaply (gevent,
+# say): a synchronous worker is pinned for the whole time
+LIVE_STREAM_SECONDS = int(os.environ.get('SUPERLISTS_LIVE_STREAM_SECONDS', 0))
+LIVE_KEEPALIVE_SECONDS = 15
+
+# Archiving: lists nobody has looked at for ARCHIVE_AFTER_DAYS have their
+# items packed into one compressed row each by the archive_lists command, and
+# unpacked again the next time they're viewed. Last access is only recorded
+# to within LIST_ACCESS_RESOLUTION seconds, to keep reads from writing
+ARCHIVE_AFTER_DAYS = int(os.environ.get('SUPERLISTS_ARCHIVE_AFTER_DAYS', 90))
+LIST_ACCESS_RESOLUTION = 3600
+
+# Results per page of search results
+SEARCH_PAGE_SIZE = 20
+
+# Rows per INSERT when adding items in bulk - kept under SQLite's limit of
+# 999 variables per statement
+BULK_BATCH_SIZE = 400
+
+# Rows fetched per query, and written per chunk, by the list export
+EXPORT_CHUNK_SIZE = 2000
+
+# Caches
+# https://docs.djangoproject.com/en/1.6/topics/cache/
+
+# Rendered list tables are cached per list version under the 'lists' alias.
+# SUPERLISTS_LIST_CACHE picks the backend: 'lru' keeps them in this process,
+# 'file' shares them between all the workers on the host
+LIST_CACHE_BACKENDS = {
+    'lru': {
+        'BACKEND': 'lists.cache.LRUCache',
+        'LOCATION': 'list-tables',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '../cache/list-tables'),
+    },
+    'none': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, '../database/db.sqlite3'),
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'lists': dict(
+        LIST_CACHE_BACKENDS[os.environ.get('SUPERLISTS_LIST_CACHE', 'lru')],
+        TIMEOUT=int(os.environ.get('SUPERLISTS_LIST_CACHE_TTL', 300)),
+        OPTIONS={'MAX_ENTRIES': int(os.environ.get('SUPERLISTS_LIST_CACHE_ENTRIES', 1000))},
+    ),
 }
 
+# Request instrumentation: the share of requests that get timed and reported in
+# a Server-Timing header, and how slow one has to be before it's logged with
+# its slowest queries
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get(
+    'SUPERLISTS_INSTRUMENTATION_SAMPLE_RATE', 1.0 if DEBUG else 0.05))
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SUPERLISTS_SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_TOP_QUERIES = 5
+
+# Logging
+# https://docs.djangoproject.com/en/1.6/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'superlists': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'lists': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Response compression (superlists/compression.py): rendered HTML has its
+# indentation stripped, and compressible responses of at least
+# COMPRESSION_MIN_SIZE bytes are sent gzipped - or brotlied, when brotli is
+# installed and the client takes it
+HTML_MINIFY = True
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_LEVEL = 6
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.6/topics/i18n/
 
@@ -82,4 +301,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.6/howto/static-files/
 
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.abspath(os.path.join(BASE_DIR, '../static'))
\ No newline at end of file
+STATIC_ROOT = os.path.abspath(os.path.join(BASE_DIR, '../static'))
+
+# collectstatic builds the bundles, content-hashed copies of every file,
+# .gz/.br variants and a manifest (see superlists/staticfiles.py). With the
+# pipeline on, templates link the hashed names, and the WSGI app serves
+# STATIC_ROOT itself with far-future cache headers
+STATICFILES_STORAGE = 'superlists.staticfiles.PipelineStorage'
+STATIC_PIPELINE = os.environ.get('SUPERLISTS_STATIC_PIPELINE', '0' if DEBUG else '1') == '1'
+SERVE_STATIC = os.environ.get('SUPERLISTS_SERVE_STATIC', '1' if STATIC_PIPELINE else '0') == '1'
+
+# Stylesheets concatenated and minified into one file apiece
+STATIC_BUNDLES = {
+    'bundles/site.css': ('bootstrap/css/bootstrap.min.css', 'base.css'),
+}
\ No newline at end of file
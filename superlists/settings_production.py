@@ -0,0 +1,45 @@
+"""
+Lean settings for production workers: debug off, and only the apps and
+middleware the site actually uses, so a new worker has less to import.
+
+    DJANGO_SETTINGS_MODULE=superlists.settings_production
+
+python -m benchmarks.startup compares its cold start with the development
+settings.
+"""
+
+import os
+
+# Everything in superlists.settings that defaults differently without debug
+# (template caching, the static pipeline, instrumentation sampling) follows
+# from this
+os.environ.setdefault('SUPERLISTS_DEBUG', '0')
+os.environ.setdefault('SUPERLISTS_PRELOAD', '1')
+
+from superlists.settings import *
+
+SECRET_KEY = os.environ.get('SUPERLISTS_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = os.environ.get('SUPERLISTS_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# No functional_tests (test-only), and nothing uses users, sessions or
+# messages; staticfiles stays for its template tags
+INSTALLED_APPS = (
+    'django.contrib.staticfiles',
+    'lists',
+)
+
+MIDDLEWARE_CLASSES = (
+    'superlists.instrumentation.InstrumentationMiddleware',
+    'superlists.compression.CompressionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+)
+
+# The defaults, less auth, debug, media and messages
+TEMPLATE_CONTEXT_PROCESSORS = (
+    'django.core.context_processors.i18n',
+    'django.core.context_processors.static',
+    'django.core.context_processors.tz',
+)
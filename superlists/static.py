@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import json
+import mimetypes
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from superlists.compression import choose_encoding
+from superlists.staticfiles import MANIFEST_NAME
+
+# A year, the most HTTP/1.1 caches are meant to honour
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Files without a hash in their names can change under the same URL
+SHORT_CACHE_CONTROL = 'public, max-age=60'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# Serves collectstatic's output in front of the Django app. A name with a
+# content hash in it can never change, so it's cacheable forever and the
+# browser needn't come back for it at all; where collectstatic left a .br or
+# .gz beside a file, that's sent to clients that accept it.
+class StaticFiles:
+	def __init__(self, application, root=None, prefix=None):
+		self.application = application
+		self.root = os.path.abspath(root or settings.STATIC_ROOT)
+		self.prefix = prefix or settings.STATIC_URL
+		try:
+			with open(os.path.join(self.root, MANIFEST_NAME)) as f:
+				self.hashed_names = set(json.load(f)['paths'].values())
+		except (IOError, ValueError):
+			self.hashed_names = set()
+
+	def __call__(self, environ, start_response):
+		path = environ.get('PATH_INFO', '')
+		if not path.startswith(self.prefix):
+			return self.application(environ, start_response)
+		if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+			return self.respond(start_response, '405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+
+		name = path[len(self.prefix):]
+		filename = os.path.abspath(os.path.join(self.root, name))
+		if not filename.startswith(self.root + os.sep) or not os.path.isfile(filename):
+			return self.respond(start_response, '404 Not Found')
+
+		content_type, _ = mimetypes.guess_type(filename)
+		headers = [
+			('Content-Type', content_type or 'application/octet-stream'),
+			('Cache-Control', IMMUTABLE_CACHE_CONTROL if name in self.hashed_names else SHORT_CACHE_CONTROL),
+		]
+		variants = OrderedDict((encoding, filename + suffix) for encoding, suffix in ENCODINGS
+			if os.path.isfile(filename + suffix))
+		if variants:
+			headers.append(('Vary', 'Accept-Encoding'))
+			encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''), list(variants))
+			if encoding is not None:
+				headers.append(('Content-Encoding', encoding))
+				filename = variants[encoding]
+
+		headers.append(('Content-Length', str(os.path.getsize(filename))))
+		start_response('200 OK', headers)
+		if environ['REQUEST_METHOD'] == 'HEAD':
+			return [b'']
+		wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+		return wrapper(open(filename, 'rb'))
+
+	def respond(self, start_response, status, headers=()):
+		start_response(status, [('Content-Type', 'text/plain')] + list(headers))
+		return [status.encode('ascii')]
\ No newline at end of file
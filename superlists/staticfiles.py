@@ -0,0 +1,143 @@
+import gzip
+from io import BytesIO
+import json
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import CachedFilesMixin, CachedStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.encoding import force_bytes
+from django.utils.http import urlunquote
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+MANIFEST_NAME = 'staticfiles.json'
+# Worth storing compressed: text, and fonts that aren't compressed already
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.eot', '.ttf', '.json')
+# Smaller than this and the headers cost more than compression saves
+COMPRESS_MIN_SIZE = 512
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)(.*?)\1\s*\)''')
+# Comments, except /*! ones, which are licences
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_PUNCTUATION_SPACE = re.compile(r'\s*([{};,])\s*')
+
+
+# Best compression, and no timestamp, so the same file always compresses to
+# the same bytes
+def gzip_compress(content):
+	buffer = BytesIO()
+	with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+		f.write(content)
+	return buffer.getvalue()
+
+def minify_css(css):
+	css = CSS_COMMENT.sub('', css)
+	css = ' '.join(css.split())
+	css = CSS_PUNCTUATION_SPACE.sub(r'\1', css)
+	return css.replace(';}', '}').strip()
+
+# Relative url()s in a stylesheet that's moving from source to bundle, made
+# relative to where the bundle lives instead
+def rebase_css_urls(css, source, bundle):
+	def rebase(match):
+		quote, url = match.groups()
+		if not url or url.startswith(('/', '#', 'data:', 'http:', 'https:')):
+			return match.group(0)
+		split = min([index for index in (url.find('?'), url.find('#')) if index >= 0] or [len(url)])
+		path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url[:split]))
+		path = posixpath.relpath(path, posixpath.dirname(bundle) or '.')
+		return 'url(%s%s%s%s)' % (quote, path, url[split:], quote)
+	return CSS_URL.sub(rebase, css)
+
+
+# collectstatic, with everything needed for the static files to be cached
+# forever: STATIC_BUNDLES are concatenated and minified, every file gets a
+# copy named after a hash of its contents (as CachedStaticFilesStorage
+# does), text files are stored pre-compressed alongside as .gz - and .br,
+# when brotli is installed - and the hashed names are written to a manifest.
+#
+# With STATIC_PIPELINE on, {% static %} resolves names through the
+# manifest; with it off, it hands out the plain source files as before
+class PipelineStorage(CachedStaticFilesStorage):
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._manifest = None
+
+	@property
+	def manifest(self):
+		if self._manifest is None:
+			try:
+				with open(self.path(MANIFEST_NAME)) as f:
+					self._manifest = json.load(f)['paths']
+			except (IOError, ValueError):
+				self._manifest = {}
+		return self._manifest
+
+	def url(self, name, force=False):
+		if force: # collectstatic, rewriting references from one file to another
+			return super().url(name, force)
+		if not settings.STATIC_PIPELINE:
+			return super(CachedFilesMixin, self).url(name)
+		if name in self.manifest:
+			return urlunquote(super(CachedFilesMixin, self).url(self.manifest[name]))
+		return super().url(name)
+
+	def post_process(self, paths, dry_run=False, **options):
+		if dry_run:
+			return
+
+		for bundle, sources in sorted(settings.STATIC_BUNDLES.items()):
+			self.build_bundle(bundle, sources, paths)
+			paths[bundle] = (self, bundle)
+
+		manifest = {}
+		for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+			if isinstance(hashed_name, str):
+				manifest[name.replace('\\', '/')] = hashed_name
+			yield name, hashed_name, processed
+
+		for name in sorted(set(manifest) | set(manifest.values())):
+			self.compress(name)
+		self.save_manifest(manifest)
+
+	def build_bundle(self, bundle, sources, paths):
+		parts = []
+		for source in sources:
+			if source not in paths:
+				raise ValueError("Bundle '%s' includes '%s', which isn't a static file" % (bundle, source))
+			storage, path = paths[source]
+			with storage.open(path) as f:
+				css = f.read().decode(settings.FILE_CHARSET)
+			parts.append(minify_css(rebase_css_urls(css, source, bundle)))
+		if self.exists(bundle):
+			self.delete(bundle)
+		self._save(bundle, ContentFile(force_bytes('\n'.join(parts))))
+
+	def compress(self, name):
+		if not name.endswith(COMPRESS_EXTENSIONS):
+			return
+		with self.open(name) as f:
+			content = f.read()
+		if len(content) < COMPRESS_MIN_SIZE:
+			return
+		variants = [('.gz', gzip_compress(content))]
+		if brotli is not None:
+			variants.append(('.br', brotli.compress(content)))
+		for extension, compressed in variants:
+			if len(compressed) < len(content):
+				if self.exists(name + extension):
+					self.delete(name + extension)
+				self._save(name + extension, ContentFile(compressed))
+
+	def save_manifest(self, manifest):
+		self._manifest = manifest
+		if self.exists(MANIFEST_NAME):
+			self.delete(MANIFEST_NAME)
+		self._save(MANIFEST_NAME, ContentFile(force_bytes(
+			json.dumps({'version': 1, 'paths': manifest}, indent=1, sort_keys=True)
+		)))
@@ -0,0 +1,210 @@
+from collections import OrderedDict
+from io import StringIO
+import multiprocessing
+from optparse import make_option
+import os
+import sys
+import time
+import unittest
+from unittest.runner import _WritelnDecorator
+
+from django.db import connections
+from django.test.runner import DiscoverRunner, reorder_suite
+
+SEPARATOR1 = '=' * 70
+SEPARATOR2 = '-' * 70
+
+
+# Records how long every test took, setUp and tearDown included
+class TimedTextTestResult(unittest.TextTestResult):
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.timings = []
+
+	def startTest(self, test):
+		self._started = time.perf_counter()
+		super().startTest(test)
+
+	def stopTest(self, test):
+		super().stopTest(test)
+		self.timings.append((test.id(), time.perf_counter() - self._started))
+
+
+# What a worker sends back: just enough of its result to report on
+class ShardResult:
+	def __init__(self, result):
+		self.testsRun = result.testsRun
+		self.failures = [(str(test), traceback) for test, traceback in result.failures]
+		self.errors = [(str(test), traceback) for test, traceback in result.errors]
+		self.skipped = len(result.skipped)
+		self.expectedFailures = len(result.expectedFailures)
+		self.unexpectedSuccesses = len(result.unexpectedSuccesses)
+		self.timings = result.timings
+
+
+# Discover runner that can split the suite across processes. Test cases stay
+# whole, so a class's setUpClass (and its live server) runs once per shard.
+# Each worker gets its own test database and its own range of live server
+# ports, and the slowest tests are listed at the end either way:
+#
+#   python manage.py test --parallel 4
+#   SUPERLISTS_TEST_PROCESSES=4 python manage.py test lists
+class ParallelDiscoverRunner(DiscoverRunner):
+	option_list = DiscoverRunner.option_list + (
+		make_option('--parallel', type='int', dest='parallel',
+			default=int(os.environ.get('SUPERLISTS_TEST_PROCESSES', 1)),
+			help='Number of processes to run the tests in.'),
+		make_option('--timings', type='int', dest='timings', default=10,
+			help='Number of slowest tests to report, or 0 for none.'),
+	)
+
+	def __init__(self, parallel=1, timings=10, **kwargs):
+		super().__init__(**kwargs)
+		self.parallel = parallel
+		self.timings = timings
+
+	def run_tests(self, test_labels, extra_tests=None, **kwargs):
+		self.setup_test_environment()
+		suite = self.build_suite(test_labels, extra_tests)
+		shards = self.shard_suite(suite)
+		if len(shards) > 1:
+			result = self.run_shards(shards)
+		else:
+			old_config = self.setup_databases()
+			result = self.run_suite(suite)
+			self.teardown_databases(old_config)
+		self.teardown_test_environment()
+		return self.suite_result(suite, result)
+
+	def run_suite(self, suite, **kwargs):
+		result = unittest.TextTestRunner(
+			verbosity=self.verbosity,
+			failfast=self.failfast,
+			resultclass=TimedTextTestResult,
+		).run(suite)
+		self.report_timings(result.timings)
+		return result
+
+	def run_shards(self, shards):
+		started = time.perf_counter()
+		context = multiprocessing.get_context('fork')
+		workers = []
+		for worker, shard in enumerate(shards):
+			receiver, sender = context.Pipe(duplex=False)
+			process = context.Process(target=self._run_shard, args=(worker, shard, sender))
+			process.start()
+			sender.close()
+			workers.append((process, receiver))
+
+		results = []
+		for process, receiver in workers:
+			try:
+				results.append(receiver.recv())
+			except EOFError:
+				results.append(None) # died without reporting
+			process.join()
+		return self.report(shards, results, time.perf_counter() - started)
+
+	# Shards of whole test cases, biggest first onto the emptiest shard
+	def shard_suite(self, suite):
+		cases = OrderedDict()
+		for test in _flatten(suite):
+			cases.setdefault(type(test), []).append(test)
+		shards = [[] for _ in range(min(self.parallel, len(cases)) or 1)]
+		for tests in sorted(cases.values(), key=len, reverse=True):
+			min(shards, key=len).extend(tests)
+		return [reorder_suite(unittest.TestSuite(tests), self.reorder_by) for tests in shards if tests]
+
+	# Runs in a forked worker, which sets up databases of its own
+	def _run_shard(self, worker, shard, sender):
+		for connection in connections.all():
+			connection.close()
+			settings_dict = connection.settings_dict
+			in_memory = 'sqlite' in settings_dict['ENGINE'] and not settings_dict['TEST_NAME']
+			if not settings_dict['TEST_MIRROR'] and not in_memory:
+				settings_dict['TEST_NAME'] = '%s_%d' % (
+					settings_dict['TEST_NAME'] or 'test_' + settings_dict['NAME'], worker)
+		os.environ.setdefault(
+			'DJANGO_LIVE_TEST_SERVER_ADDRESS',
+			'localhost:%d-%d' % (8081 + worker * 10, 8090 + worker * 10)
+		)
+
+		stream = StringIO()
+		old_config = self.setup_databases()
+		try:
+			result = unittest.TextTestRunner(
+				stream=stream,
+				verbosity=self.verbosity,
+				failfast=self.failfast,
+				resultclass=TimedTextTestResult,
+			).run(shard)
+		finally:
+			self.teardown_databases(old_config)
+		sender.send(ShardResult(result))
+		sender.close()
+
+	def report(self, shards, results, elapsed):
+		result = unittest.TestResult()
+		timings = []
+		skipped = expected_failures = unexpected_successes = 0
+		for shard, shard_result in zip(shards, results):
+			if shard_result is None:
+				result.errors.append((
+					'worker running %s' % (', '.join(sorted(set(
+						type(test).__name__ for test in _flatten(shard)))),),
+					'The worker process exited without reporting its results\n'
+				))
+				continue
+			result.testsRun += shard_result.testsRun
+			result.failures.extend(shard_result.failures)
+			result.errors.extend(shard_result.errors)
+			skipped += shard_result.skipped
+			expected_failures += shard_result.expectedFailures
+			unexpected_successes += shard_result.unexpectedSuccesses
+			timings.extend(shard_result.timings)
+
+		stream = _WritelnDecorator(sys.stderr)
+		for flavour, problems in (('ERROR', result.errors), ('FAIL', result.failures)):
+			for test, traceback in problems:
+				stream.writeln(SEPARATOR1)
+				stream.writeln('%s: %s' % (flavour, test))
+				stream.writeln(SEPARATOR2)
+				stream.writeln(traceback)
+		stream.writeln(SEPARATOR2)
+		stream.writeln('Ran %d tests in %.3fs across %d processes' % (
+			result.testsRun, elapsed, len(shards)))
+		stream.writeln()
+
+		details = []
+		if result.failures:
+			details.append('failures=%d' % (len(result.failures),))
+		if result.errors:
+			details.append('errors=%d' % (len(result.errors),))
+		if skipped:
+			details.append('skipped=%d' % (skipped,))
+		if expected_failures:
+			details.append('expected failures=%d' % (expected_failures,))
+		if unexpected_successes:
+			details.append('unexpected successes=%d' % (unexpected_successes,))
+		outcome = 'OK' if not (result.failures or result.errors) else 'FAILED'
+		stream.writeln('%s (%s)' % (outcome, ', '.join(details)) if details else outcome)
+
+		self.report_timings(timings)
+		return result
+
+	def report_timings(self, timings):
+		if not self.timings or not timings:
+			return
+		stream = _WritelnDecorator(sys.stderr)
+		stream.writeln()
+		stream.writeln('Slowest tests:')
+		for test, seconds in sorted(timings, key=lambda timing: -timing[1])[:self.timings]:
+			stream.writeln('%8.3fs  %s' % (seconds, test))
+
+
+def _flatten(suite):
+	for test in suite:
+		if isinstance(test, unittest.TestSuite):
+			yield from _flatten(test)
+		else:
+			yield test
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import Executor, Future
+import json
+from unittest.mock import patch
+from django.test import TestCase
+from lists.models import Item, List
+from superlists import asgi
+
+# Runs the app on the test's own thread, so it sees the test's transaction
+class InlineExecutor(Executor):
+	def submit(self, fn, *args, **kwargs):
+		future = Future()
+		future.set_result(fn(*args, **kwargs))
+		return future
+
+
+@patch('superlists.asgi.executor', InlineExecutor())
+class ASGIApplicationTest(TestCase):
+
+	def request(self, method, path, query=b'', body=b'', headers=()):
+		messages = [
+			{'type': 'http.request', 'body': body[:5], 'more_body': True},
+			{'type': 'http.request', 'body': body[5:], 'more_body': False},
+		]
+		sent = []
+
+		@asyncio.coroutine
+		def receive():
+			return messages.pop(0)
+
+		@asyncio.coroutine
+		def send(message):
+			sent.append(message)
+
+		scope = {
+			'type': 'http',
+			'method': method,
+			'path': path,
+			'query_string': query,
+			'headers': [(b'host', b'testserver')] + list(headers),
+			'server': ('testserver', 80),
+		}
+		asyncio.get_event_loop().run_until_complete(asgi.application(scope, receive, send))
+		start, bodies = sent[0], sent[1:]
+		return start, b''.join(message['body'] for message in bodies)
+
+	def test_serves_the_home_page(self):
+		start, body = self.request('GET', '/')
+		self.assertEqual(start['status'], 200)
+		self.assertIn((b'content-type', b'text/html; charset=utf-8'), start['headers'])
+		self.assertIn(b'Enter a to-do item', body)
+
+	def test_passes_query_string_and_body_through(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		Item.objects.create(list=list_, text='item 2')
+
+		start, body = self.request('GET', '/api/lists/%d/items' % (list_.id,), query=b'limit=1')
+		self.assertEqual(len(json.loads(body.decode())['items']), 1)
+
+		start, body = self.request(
+			'POST', '/api/lists/%d/items' % (list_.id,),
+			body=json.dumps({'items': ['item 3']}).encode(),
+			headers=[(b'content-type', b'application/json')],
+		)
+		self.assertEqual(start['status'], 200)
+		self.assertEqual(list_.item_set.count(), 3)
+
+	def test_streams_streaming_responses(self):
+		list_ = List.objects.create()
+		list_.add_items(['item %d' % (i,) for i in range(450)])
+		start, body = self.request('GET', '/api/lists/%d/items/stream' % (list_.id,))
+
+		self.assertEqual(len(json.loads(body.decode())['items']), 450)
+
+	def test_answers_lifespan_events(self):
+		messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+		sent = []
+
+		@asyncio.coroutine
+		def receive():
+			return messages.pop(0)
+
+		@asyncio.coroutine
+		def send(message):
+			sent.append(message['type'])
+
+		asyncio.get_event_loop().run_until_complete(asgi.application({'type': 'lifespan'}, receive, send))
+		self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -0,0 +1,88 @@
+import gzip
+import json
+from unittest.mock import patch
+from django.test import TestCase
+from django.test.utils import override_settings
+from lists.cache import fragments
+from lists.models import List
+from superlists import compression
+from superlists.compression import choose_encoding, strip_whitespace
+
+class StripWhitespaceTest(TestCase):
+
+	def test_indentation_goes_but_preformatted_blocks_stay(self):
+		self.assertEqual(
+			strip_whitespace('<div>\n\t\t<p>a  b</p>\n\t<pre>\n  x\n</pre>\n\t<textarea>\n  y</textarea>\n</div>'),
+			'<div>\n<p>a  b</p>\n<pre>\n  x\n</pre>\n<textarea>\n  y</textarea>\n</div>'
+		)
+
+
+class ChooseEncodingTest(TestCase):
+
+	def test_prefers_brotli_when_available(self):
+		with patch.object(compression, 'brotli', object()):
+			self.assertEqual(choose_encoding('gzip, deflate, br'), 'br')
+		with patch.object(compression, 'brotli', None):
+			self.assertEqual(choose_encoding('gzip, deflate, br'), 'gzip')
+
+	def test_respects_quality_values(self):
+		with patch.object(compression, 'brotli', None):
+			self.assertEqual(choose_encoding('gzip;q=0, identity'), None)
+			self.assertEqual(choose_encoding('*'), 'gzip')
+			self.assertEqual(choose_encoding(''), None)
+
+
+@patch.object(compression, 'brotli', None)
+class CompressionMiddlewareTest(TestCase):
+
+	def setUp(self):
+		fragments.clear()
+		self.list_ = List.objects.create()
+		self.list_.add_items(['item %d' % (i,) for i in range(50)])
+		self.url = '/lists/%d/' % (self.list_.id,)
+
+	def test_gzips_pages_for_clients_that_accept_it(self):
+		plain = self.client.get(self.url)
+		response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		self.assertEqual(response['Vary'], 'Cookie, Accept-Encoding')
+		self.assertEqual(int(response['Content-Length']), len(response.content))
+		self.assertEqual(gzip.decompress(response.content), plain.content)
+		self.assertNotIn(b'\t', plain.content)
+
+	def test_conditional_get_still_works_with_the_encoded_etag(self):
+		response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+		self.assertTrue(response['ETag'].endswith(';gzip"'))
+
+		response = self.client.get(
+			self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(response.status_code, 304)
+		self.assertTrue(response['ETag'].endswith(';gzip"'))
+
+	@override_settings(COMPRESSION_MIN_SIZE=10 ** 6)
+	def test_leaves_small_responses_alone(self):
+		response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+		self.assertFalse(response.has_header('Content-Encoding'))
+		self.assertIn('Accept-Encoding', response['Vary'])
+
+	def test_compresses_streams_on_the_fly(self):
+		response = self.client.get(
+			'/api/lists/%d/items/stream' % (self.list_.id,), HTTP_ACCEPT_ENCODING='gzip')
+
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		data = json.loads(gzip.decompress(b''.join(response.streaming_content)).decode())
+		self.assertEqual(len(data['items']), 50)
+
+	def test_compresses_the_export(self):
+		response = self.client.get('/api/lists/export?format=csv', HTTP_ACCEPT_ENCODING='gzip')
+
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+		self.assertEqual(len(lines), 1 + 1 + 50)
+
+	@override_settings(LIVE_STREAM_SECONDS=0)
+	def test_leaves_event_streams_alone(self):
+		response = self.client.get(
+			'/lists/%d/events?after=0' % (self.list_.id,), HTTP_ACCEPT_ENCODING='gzip')
+		self.assertFalse(response.has_header('Content-Encoding'))
\ No newline at end of file
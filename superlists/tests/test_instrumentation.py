@@ -0,0 +1,37 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+from lists.models import Item, List
+from superlists.instrumentation import span, current_timings
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, SLOW_REQUEST_THRESHOLD_MS=10000)
+class InstrumentationMiddlewareTest(TestCase):
+
+	def test_sampled_requests_report_server_timing(self):
+		list_ = List.objects.create()
+		Item.objects.create(list=list_, text='item 1')
+		response = self.client.get('/lists/%d/' % (list_.id,))
+
+		timing = response['Server-Timing']
+		self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries"')
+		self.assertIn('render;dur=', timing)
+		self.assertIn('view;dur=', timing)
+		self.assertIn('total;dur=', timing)
+
+	@override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0)
+	def test_unsampled_requests_are_left_alone(self):
+		response = self.client.get('/')
+		self.assertFalse(response.has_header('Server-Timing'))
+
+	@override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+	def test_slow_requests_are_logged_with_their_queries(self):
+		list_ = List.objects.create()
+		with self.assertLogs('superlists.instrumentation', 'WARNING') as logs:
+			self.client.get('/lists/%d/' % (list_.id,))
+
+		self.assertIn('Slow request: GET /lists/%d/' % (list_.id,), logs.output[0])
+		self.assertIn('SELECT', logs.output[0])
+
+	def test_spans_outside_a_request_are_ignored(self):
+		self.assertIsNone(current_timings())
+		with span('render'):
+			pass
\ No newline at end of file
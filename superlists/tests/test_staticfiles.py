@@ -0,0 +1,125 @@
+from io import StringIO
+import json
+import os
+import shutil
+import tempfile
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.functional import empty
+from superlists.static import StaticFiles, IMMUTABLE_CACHE_CONTROL, SHORT_CACHE_CONTROL
+from superlists.staticfiles import minify_css, rebase_css_urls, MANIFEST_NAME
+
+class CSSTest(SimpleTestCase):
+
+	def test_minify_drops_comments_and_whitespace_but_keeps_licences(self):
+		self.assertEqual(
+			minify_css('/*! MIT */\n/* note */\na, b {\n\tcolor: red;\n\tmargin: 0;\n}\n'),
+			'/*! MIT */ a,b{color: red;margin: 0}'
+		)
+
+	def test_rebase_makes_urls_relative_to_the_bundle(self):
+		self.assertEqual(
+			rebase_css_urls(
+				"src: url('../fonts/a.eot?#iefix') url(data:x) url(/abs.png)",
+				'bootstrap/css/bootstrap.css', 'bundles/site.css'
+			),
+			"src: url('../bootstrap/fonts/a.eot?#iefix') url(data:x) url(/abs.png)"
+		)
+
+
+class CollectStaticTest(SimpleTestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.root = tempfile.mkdtemp()
+		cls.settings_override = override_settings(STATIC_ROOT=cls.root)
+		cls.settings_override.enable()
+		staticfiles_storage._wrapped = empty # pick up the new STATIC_ROOT
+		call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+		with open(os.path.join(cls.root, MANIFEST_NAME)) as f:
+			cls.manifest = json.load(f)['paths']
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.settings_override.disable()
+		staticfiles_storage._wrapped = empty
+		shutil.rmtree(cls.root)
+
+	def request(self, path, **environ):
+		def app(environ, start_response):
+			start_response('200 OK', [])
+			return [b'from django']
+		handler = StaticFiles(app, root=self.root, prefix='/static/')
+		started = {}
+		def start_response(status, headers):
+			started.update(headers, status=status)
+		environ = dict(environ, PATH_INFO=path, REQUEST_METHOD=environ.get('REQUEST_METHOD', 'GET'))
+		result = handler(environ, start_response)
+		body = b''.join(result)
+		if hasattr(result, 'close'):
+			result.close()
+		return started, body
+
+	def test_bundle_is_built_hashed_and_compressed(self):
+		bundle = self.manifest['bundles/site.css']
+		self.assertRegex(bundle, r'^bundles/site\.[0-9a-f]{12}\.css$')
+		self.assertTrue(os.path.exists(os.path.join(self.root, bundle + '.gz')))
+		with open(os.path.join(self.root, bundle)) as f:
+			css = f.read()
+		self.assertIn('#id_text{margin-top: 2ex}', css)
+		self.assertRegex(css, r'url\("\.\./bootstrap/fonts/glyphicons-halflings-regular\.[0-9a-f]{12}\.woff"\)')
+
+	def test_template_links_the_hashed_bundle_with_the_pipeline_on(self):
+		template = Template("{% load static_bundles %}{% stylesheets 'bundles/site.css' %}")
+		with override_settings(STATIC_PIPELINE=True):
+			html = template.render(Context())
+		self.assertEqual(
+			html,
+			'<link href="/static/%s" rel="stylesheet" media="screen">' % (self.manifest['bundles/site.css'],)
+		)
+
+	def test_template_links_the_sources_with_the_pipeline_off(self):
+		template = Template("{% load static_bundles %}{% stylesheets 'bundles/site.css' %}")
+		with override_settings(STATIC_PIPELINE=False):
+			html = template.render(Context())
+		self.assertEqual(html,
+			'<link href="/static/bootstrap/css/bootstrap.min.css" rel="stylesheet" media="screen">\n'
+			'<link href="/static/base.css" rel="stylesheet" media="screen">'
+		)
+
+	def test_hashed_files_are_cached_forever(self):
+		headers, body = self.request('/static/' + self.manifest['base.css'])
+		self.assertEqual(headers['status'], '200 OK')
+		self.assertEqual(headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+		self.assertEqual(headers['Content-Type'], 'text/css')
+		self.assertIn(b'margin-top', body)
+
+	def test_unhashed_files_are_not(self):
+		headers, _ = self.request('/static/base.css')
+		self.assertEqual(headers['Cache-Control'], SHORT_CACHE_CONTROL)
+
+	def test_serves_gzip_to_clients_that_accept_it(self):
+		path = '/static/' + self.manifest['bundles/site.css']
+		headers, body = self.request(path, HTTP_ACCEPT_ENCODING='gzip, deflate')
+		self.assertEqual(headers['Content-Encoding'], 'gzip')
+		self.assertEqual(headers['Vary'], 'Accept-Encoding')
+		self.assertEqual(int(headers['Content-Length']), len(body))
+
+		headers, _ = self.request(path)
+		self.assertNotIn('Content-Encoding', headers)
+
+	def test_honours_refusals_in_accept_encoding(self):
+		path = '/static/' + self.manifest['bundles/site.css']
+		for refusal in ('gzip;q=0', 'br;q=0, gzip;q=0', '*;q=0'):
+			headers, _ = self.request(path, HTTP_ACCEPT_ENCODING=refusal)
+			self.assertNotIn('Content-Encoding', headers)
+
+	def test_missing_and_escaping_paths_are_not_found(self):
+		self.assertEqual(self.request('/static/nothing.css')[0]['status'], '404 Not Found')
+		self.assertEqual(self.request('/static/../etc/passwd')[0]['status'], '404 Not Found')
+
+	def test_other_paths_go_to_the_app(self):
+		self.assertEqual(self.request('/lists/')[1], b'from django')
\ No newline at end of file
@@ -0,0 +1,69 @@
+from io import StringIO
+import unittest
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from superlists.test_runner import ParallelDiscoverRunner, TimedTextTestResult
+
+# Kept off the module's top level, so discovery doesn't run them for real
+class Cases:
+	class Small(unittest.TestCase):
+		def test_one(self):
+			pass
+
+	class Big(unittest.TestCase):
+		def test_one(self):
+			pass
+
+		def test_two(self):
+			pass
+
+		def test_three(self):
+			self.fail('broken')
+
+	class Medium(unittest.TestCase):
+		def test_one(self):
+			pass
+
+		def test_two(self):
+			pass
+
+def suite_of(*cases):
+	loader = unittest.TestLoader()
+	return unittest.TestSuite(loader.loadTestsFromTestCase(case) for case in cases)
+
+def case_names(shard):
+	return [type(test).__name__ for test in shard]
+
+
+class ParallelDiscoverRunnerTest(SimpleTestCase):
+
+	def test_shards_keep_test_cases_whole_and_balanced(self):
+		runner = ParallelDiscoverRunner(parallel=2, verbosity=0)
+		shards = runner.shard_suite(suite_of(Cases.Small, Cases.Big, Cases.Medium))
+
+		self.assertEqual(
+			[case_names(shard) for shard in shards],
+			[['Big'] * 3, ['Medium'] * 2 + ['Small']]
+		)
+
+	def test_never_more_shards_than_test_cases(self):
+		runner = ParallelDiscoverRunner(parallel=8, verbosity=0)
+		self.assertEqual(len(runner.shard_suite(suite_of(Cases.Small, Cases.Big))), 2)
+
+	def test_results_from_every_worker_are_combined(self):
+		runner = ParallelDiscoverRunner(parallel=2, verbosity=0, timings=0)
+		with patch('sys.stderr', StringIO()) as stderr:
+			result = runner.run_shards(runner.shard_suite(suite_of(Cases.Small, Cases.Big, Cases.Medium)))
+
+		self.assertEqual(result.testsRun, 6)
+		self.assertEqual(len(result.failures), 1)
+		self.assertIn('test_three', result.failures[0][0])
+		self.assertIn('Ran 6 tests', stderr.getvalue())
+
+	def test_timed_result_records_every_test(self):
+		result = TimedTextTestResult(unittest.runner._WritelnDecorator(None), False, 0)
+		suite_of(Cases.Medium).run(result)
+		self.assertEqual(
+			sorted(name.rsplit('.', 1)[1] for name, _ in result.timings),
+			['test_one', 'test_two']
+		)
\ No newline at end of file
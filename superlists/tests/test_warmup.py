@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+from django.conf import settings
+from django.db import connection
+from django.template import loader
+from django.test import TestCase
+from django.test.utils import override_settings
+from superlists.warmup import preload, warm_templates
+
+class WarmTemplatesTest(TestCase):
+
+	def test_precompiles_templates_into_the_cached_loader(self):
+		cached_loaders = (
+			('django.template.loaders.cached.Loader', settings.SOURCE_TEMPLATE_LOADERS),
+		)
+		with override_settings(TEMPLATE_LOADERS=cached_loaders):
+			warm_templates()
+			cached = loader.template_source_loaders[0].template_cache
+
+			self.assertEqual(sorted(cached), sorted(settings.PRECOMPILED_TEMPLATES))
+
+class PreloadTest(TestCase):
+
+	def test_imports_every_view_and_closes_connections(self):
+		with patch('django.db.connections') as connections, patch('superlists.warmup.gc') as gc:
+			connections.all.return_value = [connection]
+			with patch.object(connection, 'close') as close:
+				preload()
+		close.assert_called_once_with()
+		self.assertIn('lists.api', sys.modules)
+		gc.freeze.assert_called_once_with()
+
+	def test_does_without_gc_freeze_before_python_37(self):
+		with patch('superlists.warmup.gc', spec=['collect']) as gc:
+			preload()
+		gc.collect.assert_called_once_with()
+
+
+# A fresh interpreter on the production settings, serving the home page
+class ProductionSettingsTest(TestCase):
+
+	def test_serves_without_test_only_or_unused_apps(self):
+		probe = (
+			'import json, sys\n'
+			'from io import BytesIO\n'
+			'from wsgiref.util import setup_testing_defaults\n'
+			'from superlists.wsgi import application\n'
+			'environ = {"wsgi.input": BytesIO()}\n'
+			'setup_testing_defaults(environ)\n'
+			'status = []\n'
+			'b"".join(application(environ, lambda s, h, e=None: status.append(s)))\n'
+			'print(json.dumps([status[0], sorted(sys.modules)]))\n'
+		)
+		env = dict(os.environ,
+			DJANGO_SETTINGS_MODULE='superlists.settings_production',
+			SUPERLISTS_STATIC_PIPELINE='0',
+			SUPERLISTS_DB_NAME=':memory:')
+		output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', probe], env=env)
+		status, modules = json.loads(output.decode().strip().splitlines()[-1])
+
+		self.assertEqual(status, '200 OK')
+		self.assertIn('lists.views', modules) # preloaded
+		for unused in ('functional_tests', 'django.contrib.admin', 'django.contrib.messages.middleware'):
+			self.assertNotIn(unused, modules)
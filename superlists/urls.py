@@ -1,11 +1,11 @@
 from django.conf.urls import patterns, include, url
 
-from django.contrib import admin
-admin.autodiscover()
+# Views are named by their dotted paths, so nothing is imported until a URL
+# first resolves to them
 
 urlpatterns = patterns('',
     # Examples:
     url(r'^$', 'lists.views.home_page', name='home'),
     url(r'^lists/', include('lists.urls')),
-    #url(r'^admin/', include(admin.site.urls)),
+    url(r'^api/lists/', include('lists.api_urls')),
 )
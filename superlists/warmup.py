@@ -0,0 +1,39 @@
+import gc
+from django.conf import settings
+from django.template.loader import get_template
+
+# Compile the templates we know every worker will need. Only worth doing with
+# the cached loader in place, which keeps the compiled templates around
+def warm_templates():
+	for name in settings.PRECOMPILED_TEMPLATES:
+		get_template(name)
+
+# Everything a worker would otherwise load on its first few requests: the
+# models, every URLconf and the views they name, and the templates. Done in
+# the server's master process before it forks, each worker gets all of that
+# for free and shares it copy-on-write. Connections are closed again so no
+# worker inherits a database handle
+def preload():
+	from django.core.urlresolvers import get_resolver
+	from django.db import connections
+	from django.db.models import get_models
+
+	get_models()
+	_import_views(get_resolver(None))
+	if settings.WARM_TEMPLATES:
+		warm_templates()
+	for connection in connections.all():
+		connection.close()
+
+	gc.collect()
+	# Python 3.7+: move everything so far out of the collector's way, so its
+	# passes in the workers don't write to (and so copy) the shared pages
+	if hasattr(gc, 'freeze'):
+		gc.freeze()
+
+def _import_views(resolver):
+	for pattern in resolver.url_patterns:
+		if hasattr(pattern, 'url_patterns'):
+			_import_views(pattern)
+		else:
+			pattern.callback
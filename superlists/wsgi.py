@@ -12,3 +12,15 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "superlists.settings")
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+from django.conf import settings
+if settings.SERVE_STATIC:
+    from superlists.static import StaticFiles
+    application = StaticFiles(application)
+
+if settings.PRELOAD:
+    from superlists.warmup import preload
+    preload()
+elif settings.WARM_TEMPLATES:
+    from superlists.warmup import warm_templates
+    warm_templates()